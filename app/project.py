@@ -1,6 +1,27 @@
+import csv
+import heapq
+import io
+import json
+import select
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
+from psycopg2.extensions import adapt, register_adapter, connection as pg_connection
 from datetime import datetime, timedelta
 
+try:
+    import numpy as np
+except ImportError:  # only the what-if simulator needs it
+    np = None
+
 DB_CONFIG = {
     "host": "localhost",
     "database": "a1_database",
@@ -9,121 +30,1237 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# Read-only streaming-replication standbys of DB_CONFIG, same keys as DB_CONFIG.
+# Leave empty to send every query to the primary.
+REPLICA_DB_CONFIGS = [
+    # {"host": "localhost", "database": "a1_database", "user": "postgres",
+    #  "password": "postgres", "port": "5433"},
+]
+
+# Each club location is its own database (shard) with the full schema from
+# DDL.sql. Location-local data (rooms, trainers, classes, PT sessions,
+# maintenance) lives only in its location's shard. Accounts are created in
+# the home location and copied to the other shards so foreign keys hold.
+LOCATION_SHARDS = {
+    1: {"name": "Main Club", "primary": DB_CONFIG, "replicas": REPLICA_DB_CONFIGS},
+    # 2: {"name": "Downtown", "primary": {...}, "replicas": []},
+}
+HOME_LOCATION_ID = 1
+
 TIME_FORMAT = "%Y-%m-%d %H:%M"
 
+# Longest PT session or class; matches the duration CHECKs in DDL.sql.
+MAX_BOOKING_MINUTES = 480
+
+
+# Mirrors of the user_role, ticket_priority and ticket_status enum types in
+# DDL.sql. Members compare equal to their plain string values, and are sent
+# to PostgreSQL as those strings.
+class Role(str, Enum):
+    MEMBER = "MEMBER"
+    TRAINER = "TRAINER"
+    ADMIN = "ADMIN"
+
+
+class TicketPriority(str, Enum):
+    # Declared most urgent first; PostgreSQL sorts enum values in this order.
+    CRITICAL = "CRITICAL"
+    HIGH = "HIGH"
+    MEDIUM = "MEDIUM"
+    LOW = "LOW"
+
+
+class TicketStatus(str, Enum):
+    OPEN = "OPEN"
+    IN_PROGRESS = "IN_PROGRESS"
+    CLOSED = "CLOSED"
+
+
+def parse_enum(enum_cls, text, default=None):
+    """Case-insensitive lookup of a user-typed value; None if it is not valid."""
+    text = text.strip().upper().replace(" ", "_")
+    if not text:
+        return default
+    try:
+        return enum_cls(text)
+    except ValueError:
+        return None
+
+
+for _enum_cls in (Role, TicketPriority, TicketStatus):
+    register_adapter(_enum_cls, lambda member: adapt(member.value))
+
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 10
+
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_PROBE_INTERVAL = 2  # seconds a replica's lag/LSN probe is reused
+
+
+_active_location = HOME_LOCATION_ID
+
+
+def set_active_location(location_id):
+    """Send location-local work (availability, booking, classes, maintenance) to this shard."""
+    global _active_location
+    if location_id not in LOCATION_SHARDS:
+        raise ValueError(f"Unknown location: {location_id}")
+    _active_location = location_id
+
+
+def get_active_location():
+    return _active_location
+
+
+def get_connection(location_id=None):
+    """Open a connection to a location's primary (default: the active location)."""
+    if location_id is None:
+        location_id = _active_location
+    return psycopg2.connect(**LOCATION_SHARDS[location_id]["primary"])
+
+
+def get_home_connection():
+    """Open a connection to the home location, where accounts are created."""
+    return get_connection(HOME_LOCATION_ID)
+
+
+# ---------- CONNECTION POOL + PREPARED STATEMENTS ----------
+
+# Hot lookups are prepared once per pooled connection and then run by name
+# with EXECUTE, so the server skips parsing/planning on every call.
+# Each entry is: name -> (parameter types, SQL using $1, $2, ...)
+PREPARED_STATEMENTS = {
+    "member_by_id": (
+        ("int",),
+        "SELECT member_id FROM Member WHERE member_id = %s"
+    ),
+    "trainer_by_id": (
+        ("int",),
+        "SELECT trainer_id FROM Trainer WHERE trainer_id = %s"
+    ),
+    "room_capacities": (
+        ("timestamp", "timestamp"),
+        # Params are (end, start). Rooms with an open ticket taking the whole
+        # room out of service during [start, end) are left out; the NOT EXISTS
+        # probe uses the partial index idx_ticket_out_of_service.
+        """
+        SELECT r.room_id, r.capacity
+        FROM Room r
+        WHERE NOT EXISTS (
+            SELECT 1 FROM MaintenanceTicket t
+            WHERE t.room_id = r.room_id
+              AND t.equipment_no IS NULL
+              AND t.blocks_booking
+              AND t.status <> 'CLOSED'
+              AND t.out_of_service_from < %s
+              AND (t.out_of_service_until IS NULL OR t.out_of_service_until > %s)
+        )
+        """
+    ),
+    "trainer_windows": (
+        (),
+        "SELECT trainer_id, start_time, end_time FROM Trainer"
+    ),
+    # The start-time bounds come from overlap_scan_bounds(); they let
+    # PostgreSQL prune to the monthly partitions that can hold a conflict.
+    "classes_by_room": (
+        ("int", "timestamp", "timestamp"),
+        "SELECT scheduled_at, duration_minutes FROM GroupClass "
+        "WHERE room_id = %s AND scheduled_at > %s AND scheduled_at < %s"
+    ),
+    "classes_by_trainer": (
+        ("int", "timestamp", "timestamp"),
+        "SELECT scheduled_at, duration_minutes FROM GroupClass "
+        "WHERE trainer_id = %s AND scheduled_at > %s AND scheduled_at < %s"
+    ),
+    "registration_count": (
+        ("int", "timestamp"),
+        "SELECT COUNT(*) FROM ClassRegistration WHERE class_id = %s AND scheduled_at = %s"
+    ),
+    "dashboard_latest_health": (
+        ("int",),
+        """
+        SELECT height, weight, bfp, heart_rate, measured_at
+        FROM HealthMetric
+        WHERE member_id = %s
+        ORDER BY measured_at DESC
+        LIMIT 1
+        """
+    ),
+    "dashboard_active_goals": (
+        ("int",),
+        """
+        SELECT goal_type, target_value, start_date, end_date
+        FROM FitnessGoal
+        WHERE member_id = %s
+          AND end_date >= CURRENT_DATE
+        ORDER BY end_date
+        """
+    ),
+    "dashboard_past_class_count": (
+        ("int",),
+        """
+        SELECT COUNT(*)
+        FROM MemberFullScheduleView
+        WHERE member_id = %s
+          AND schedule_type = 'CLASS'
+          AND end_time < NOW()
+        """
+    ),
+    "dashboard_upcoming_schedule": (
+        ("int",),
+        """
+        SELECT schedule_type, start_time, end_time,
+               trainer_id, room_id, class_id, class_name
+        FROM MemberFullScheduleView
+        WHERE member_id = %s
+          AND start_time >= NOW()
+        ORDER BY start_time
+        LIMIT 10
+        """
+    ),
+}
+
+_connection_pools = {}
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_prepared_stats = {}
+
+
+class PreparingConnection(pg_connection):
+    """psycopg2 connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.pool_key = None
+
+
+def _pool_config(location_id, pool_name):
+    shard = LOCATION_SHARDS[location_id]
+    if pool_name == "primary":
+        return shard["primary"]
+    return shard["replicas"][int(pool_name[len("replica"):])]
+
+
+def get_pooled_connection(pool_name="primary", location_id=None):
+    """Borrow a connection from a shared pool (give it back with release_connection).
+
+    pool_name is "primary" or "replica<N>" for the location's Nth replica;
+    location_id defaults to the active location.
+    """
+    if location_id is None:
+        location_id = _active_location
+    pool_key = (location_id, pool_name)
+    with _pool_lock:
+        pool = _connection_pools.get(pool_key)
+        if pool is None:
+            pool = pg_pool.ThreadedConnectionPool(
+                POOL_MIN_CONN, POOL_MAX_CONN,
+                connection_factory=PreparingConnection,
+                **_pool_config(location_id, pool_name)
+            )
+            _connection_pools[pool_key] = pool
+    con = pool.getconn()
+    con.pool_key = pool_key
+    return con
+
+
+def release_connection(con):
+    """Return a pooled connection. Any open transaction is rolled back by the pool.
+
+    Safe to call on None or on a connection that was already returned, so
+    error handlers can always call it.
+    """
+    if con is None:
+        return
+    pool = _connection_pools.get(getattr(con, "pool_key", None))
+    if pool is None:
+        return
+    try:
+        pool.putconn(con)
+    except pg_pool.PoolError:
+        pass
+
+
+def _record_prepared_stat(name, hit, prepare_ms=0.0, plan_ms=0.0):
+    with _stats_lock:
+        stat = _prepared_stats.setdefault(
+            name, {"hits": 0, "misses": 0, "prepare_ms": 0.0, "plan_ms": 0.0}
+        )
+        if hit:
+            stat["hits"] += 1
+        else:
+            stat["misses"] += 1
+            stat["prepare_ms"] += prepare_ms
+            stat["plan_ms"] += plan_ms
+
+
+def _measure_planning_ms(cur, sql, params):
+    """Server-side planning time of sql run as an ad-hoc query (nothing is executed)."""
+    cur.execute(f"EXPLAIN (SUMMARY ON) {sql}", params)
+    for (line,) in cur.fetchall():
+        if line.startswith("Planning Time:"):
+            return float(line.split(":")[1].split()[0])
+    return 0.0
+
+
+def execute_prepared(cur, name, params=()):
+    """Run a statement from PREPARED_STATEMENTS by handle.
+
+    The statement is PREPAREd the first time it is used on this connection;
+    after that only EXECUTE is sent. Plain (non-pooled) connections do not
+    track what they prepared, so the SQL is just executed directly.
+    """
+    param_types, sql = PREPARED_STATEMENTS[name]
+    prepared = getattr(cur.connection, "prepared", None)
+
+    if prepared is None:
+        # Not a pooled connection: nothing to reuse, run it as a normal query
+        cur.execute(sql, params)
+        return
+
+    if name in prepared:
+        _record_prepared_stat(name, hit=True)
+    else:
+        # Sampled once per connection, when the statement is first prepared
+        plan_ms = _measure_planning_ms(cur, sql, params)
+        type_list = f" ({', '.join(param_types)})" if param_types else ""
+        numbered = sql
+        for i in range(1, len(param_types) + 1):
+            numbered = numbered.replace("%s", f"${i}", 1)
+        started = time.perf_counter()
+        cur.execute(f"PREPARE {name}{type_list} AS {numbered};")
+        _record_prepared_stat(name, hit=False,
+                              prepare_ms=(time.perf_counter() - started) * 1000,
+                              plan_ms=plan_ms)
+        prepared.add(name)
+
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders});", params)
+    else:
+        cur.execute(f"EXECUTE {name};")
+
+
+def get_prepared_statement_stats():
+    """Return {name: {...}} with hit rate, time spent in PREPARE and planning time saved.
+
+    avg_plan_ms is the planning time EXPLAIN (SUMMARY) reported for the
+    statement as an ad-hoc query, sampled each time it was prepared.
+    est_plan_saved_ms counts one such plan per hit; it is an upper bound,
+    since PostgreSQL still plans each of the first few executions of a
+    prepared statement before it settles on a generic plan.
+    """
+    stats = {}
+    with _stats_lock:
+        for name, stat in _prepared_stats.items():
+            calls = stat["hits"] + stat["misses"]
+            avg_prepare_ms = stat["prepare_ms"] / stat["misses"] if stat["misses"] else 0.0
+            avg_plan_ms = stat["plan_ms"] / stat["misses"] if stat["misses"] else 0.0
+            stats[name] = {
+                "calls": calls,
+                "hits": stat["hits"],
+                "misses": stat["misses"],
+                "hit_rate": stat["hits"] / calls if calls else 0.0,
+                "prepare_ms": stat["prepare_ms"],
+                "avg_prepare_ms": avg_prepare_ms,
+                "avg_plan_ms": avg_plan_ms,
+                "est_plan_saved_ms": stat["hits"] * avg_plan_ms,
+            }
+    return stats
+
+
+def admin_prepared_statement_stats(user):
+    print("\n=== Prepared Statement Statistics ===")
+    stats = get_prepared_statement_stats()
+    if not stats:
+        print("No prepared statements have been executed yet.")
+        return
+
+    total_calls = total_hits = 0
+    total_prepare = total_saved = 0.0
+    for name in sorted(stats):
+        st = stats[name]
+        total_calls += st["calls"]
+        total_hits += st["hits"]
+        total_prepare += st["prepare_ms"]
+        total_saved += st["est_plan_saved_ms"]
+        print(
+            f"- {name}: {st['calls']} calls, hit rate {st['hit_rate']:.1%}, "
+            f"avg PREPARE {st['avg_prepare_ms']:.2f} ms, avg planning {st['avg_plan_ms']:.3f} ms, "
+            f"planning saved up to {st['est_plan_saved_ms']:.1f} ms"
+        )
+    hit_rate = total_hits / total_calls if total_calls else 0.0
+    print(f"Total: {total_calls} calls, hit rate {hit_rate:.1%}, "
+          f"time in PREPARE {total_prepare:.1f} ms, planning saved up to {total_saved:.1f} ms")
+
+
+# ---------- READ REPLICA ROUTING ----------
+
+# Read-only screens (dashboards, schedules, listings, availability lookups)
+# go to a replica from REPLICA_DB_CONFIGS when one is close enough to the
+# primary. After a user commits a write we remember the primary's WAL
+# position, and that user's reads only use a replica that has replayed at
+# least that far, so they always see their own bookings.
+
+_replica_lock = threading.Lock()
+_replica_state = {}      # (location, pool name) -> {"probed_at", "ok", "lag", "replay_lsn"}
+_write_lsns = {}         # (location, user_id or None) -> LSN of last commit
+_replica_turn = {}       # location -> next replica index
+
+
+def _lsn_to_int(lsn):
+    hi, lo = lsn.split("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+
+def _probe_replica(location_id, pool_name):
+    """Measure a replica's replay position and lag, caching the result briefly."""
+    with _replica_lock:
+        state = _replica_state.get((location_id, pool_name))
+        if state and time.monotonic() - state["probed_at"] < REPLICA_PROBE_INTERVAL:
+            return state
+
+    state = {"probed_at": time.monotonic(), "ok": False, "lag": None, "replay_lsn": 0}
+    con = None
+    try:
+        con = get_pooled_connection(pool_name, location_id)
+        cur = con.cursor()
+        # Having replayed everything received only means "no lag" while the
+        # WAL receiver is streaming; a disconnected standby also has nothing
+        # left to replay. Otherwise lag is the age of the last replayed commit
+        # (NULL, so unusable, if there is none).
+        cur.execute(
+            """
+            SELECT pg_is_in_recovery(),
+                   pg_last_wal_replay_lsn()::text,
+                   CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver
+                                         WHERE status = 'streaming')
+                        THEN 0
+                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                   END;
+            """
+        )
+        in_recovery, replay_lsn, lag = cur.fetchone()
+        cur.close()
+        release_connection(con)
+        if in_recovery and replay_lsn is not None and lag is not None:
+            state.update(ok=True, lag=float(lag), replay_lsn=_lsn_to_int(replay_lsn))
+    except Exception as e:
+        release_connection(con)
+        print(f"Replica {pool_name} of location {location_id} unavailable:", e)
+
+    with _replica_lock:
+        _replica_state[(location_id, pool_name)] = state
+    return state
+
+
+def remember_write(cur, user_id=None, location_id=None):
+    """Record the primary's WAL position after a commit made for user_id.
+
+    Call on the primary connection right after con.commit(); location_id is
+    the location that connection belongs to (default: the active one). Does
+    nothing when that location has no replicas.
+    """
+    if location_id is None:
+        location_id = _active_location
+    if not LOCATION_SHARDS[location_id]["replicas"]:
+        return
+    try:
+        cur.execute("SELECT pg_current_wal_lsn()::text;")
+        lsn = _lsn_to_int(cur.fetchone()[0])
+        cur.connection.commit()
+        key = (location_id, user_id)
+        with _replica_lock:
+            _write_lsns[key] = max(lsn, _write_lsns.get(key, 0))
+    except Exception as e:
+        print("Error recording write position:", e)
+
+
+def required_write_lsn(user_id=None, location_id=None):
+    """WAL position a replica must have replayed to show user_id's own writes (0 if none)."""
+    if location_id is None:
+        location_id = _active_location
+    with _replica_lock:
+        return _write_lsns.get((location_id, user_id), 0)
+
+
+def get_read_connection(user_id=None, location_id=None):
+    """Borrow a pooled connection for read-only work.
+
+    Picks the next replica of the location (round robin) whose lag is under
+    REPLICA_MAX_LAG_SECONDS and that has replayed this user's last write,
+    otherwise the location's primary. Give it back with release_connection().
+    """
+    if location_id is None:
+        location_id = _active_location
+    replicas = LOCATION_SHARDS[location_id]["replicas"]
+    if not replicas:
+        return get_pooled_connection("primary", location_id)
+
+    with _replica_lock:
+        required_lsn = _write_lsns.get((location_id, user_id), 0)
+        start = _replica_turn.get(location_id, 0)
+        _replica_turn[location_id] = (start + 1) % len(replicas)
+
+    for i in range(len(replicas)):
+        pool_name = f"replica{(start + i) % len(replicas)}"
+        state = _probe_replica(location_id, pool_name)
+        if state["ok"] and state["replay_lsn"] < required_lsn:
+            # cached position may just be old; look again before giving up on it
+            with _replica_lock:
+                _replica_state.pop((location_id, pool_name), None)
+            state = _probe_replica(location_id, pool_name)
+        if state["ok"] and state["lag"] <= REPLICA_MAX_LAG_SECONDS \
+                and state["replay_lsn"] >= required_lsn:
+            return get_pooled_connection(pool_name, location_id)
+
+    return get_pooled_connection("primary", location_id)
+
+
+# ---------- LOCATION SHARDS ----------
+
+def fan_out_query(sql, params=None, sort_key=None, user_id=None):
+    """Run the same read-only query on every location in parallel.
+
+    Returns a list of (location_id, row). If each shard returns its rows
+    already ordered by sort_key(row), the per-shard lists are merged in that
+    order without re-sorting everything.
+    """
+    def run(location_id):
+        con = None
+        try:
+            con = get_read_connection(user_id, location_id)
+            cur = con.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
+            release_connection(con)
+            return [(location_id, row) for row in rows]
+        except Exception:
+            release_connection(con)
+            raise
+
+    location_ids = list(LOCATION_SHARDS)
+    if len(location_ids) == 1:
+        return run(location_ids[0])
+
+    with ThreadPoolExecutor(max_workers=len(location_ids)) as executor:
+        results = list(executor.map(run, location_ids))
+
+    if sort_key is None:
+        return [item for rows in results for item in rows]
+    return list(heapq.merge(*results, key=lambda item: sort_key(item[1])))
+
+
+def sync_accounts_to_shards(user_ids):
+    """Copy UserAccount and Member rows from the home location to every other shard.
+
+    Upserts by user_id (keeping the home shard's ids), so it is safe to call
+    again after a profile change. Does nothing with a single location.
+    """
+    others = [loc for loc in LOCATION_SHARDS if loc != HOME_LOCATION_ID]
+    if not others or not user_ids:
+        return
+
+    con = get_home_connection()
+    cur = con.cursor()
+    cur.execute(
+        "SELECT user_id, email, password, role_type, is_active "
+        "FROM UserAccount WHERE user_id = ANY(%s);",
+        (list(user_ids),)
+    )
+    accounts = cur.fetchall()
+    cur.execute(
+        "SELECT member_id, name, dob, gender, phone, address, registration_date "
+        "FROM Member WHERE member_id = ANY(%s);",
+        (list(user_ids),)
+    )
+    members = cur.fetchall()
+    cur.close()
+    con.close()
+
+    for location_id in others:
+        con = get_connection(location_id)
+        cur = con.cursor()
+        if accounts:
+            execute_values(
+                cur,
+                "INSERT INTO UserAccount (user_id, email, password, role_type, is_active) "
+                "OVERRIDING SYSTEM VALUE VALUES %s "
+                "ON CONFLICT (user_id) DO UPDATE SET email = EXCLUDED.email, "
+                "password = EXCLUDED.password, role_type = EXCLUDED.role_type, "
+                "is_active = EXCLUDED.is_active;",
+                accounts
+            )
+        if members:
+            execute_values(
+                cur,
+                "INSERT INTO Member (member_id, name, dob, gender, phone, address, registration_date) "
+                "VALUES %s "
+                "ON CONFLICT (member_id) DO UPDATE SET name = EXCLUDED.name, dob = EXCLUDED.dob, "
+                "gender = EXCLUDED.gender, phone = EXCLUDED.phone, address = EXCLUDED.address;",
+                members
+            )
+        con.commit()
+        cur.close()
+        con.close()
+
+
+def choose_location():
+    """Let the user pick which club they are working in (skipped with one location)."""
+    if len(LOCATION_SHARDS) == 1:
+        set_active_location(HOME_LOCATION_ID)
+        return
+
+    print("\nLocations:")
+    for location_id, shard in LOCATION_SHARDS.items():
+        print(f"  {location_id}. {shard['name']}")
+    loc_str = input(f"Choose location (default {HOME_LOCATION_ID}): ").strip()
+    if loc_str.isdigit() and int(loc_str) in LOCATION_SHARDS:
+        set_active_location(int(loc_str))
+    else:
+        set_active_location(HOME_LOCATION_ID)
+    print("Working in", LOCATION_SHARDS[_active_location]["name"])
+
+
+def member_global_schedule(member_id, limit=10):
+    """Upcoming PT sessions and classes for a member across every location, soonest first."""
+    rows = fan_out_query(
+        """
+        SELECT schedule_type, start_time, end_time, trainer_id, room_id, class_id, class_name
+        FROM MemberFullScheduleView
+        WHERE member_id = %s
+          AND start_time >= NOW()
+        ORDER BY start_time
+        LIMIT %s;
+        """,
+        (member_id, limit),
+        sort_key=lambda row: row[1],
+        user_id=member_id
+    )
+    return rows[:limit]
+
+
+def member_global_past_class_count(member_id):
+    rows = fan_out_query(
+        """
+        SELECT COUNT(*)
+        FROM MemberFullScheduleView
+        WHERE member_id = %s
+          AND schedule_type = 'CLASS'
+          AND end_time < NOW();
+        """,
+        (member_id,),
+        user_id=member_id
+    )
+    return sum(row[0] for _loc, row in rows)
+
+
+def global_club_summary():
+    """Per-location counts of upcoming bookings and open tickets, gathered in parallel."""
+    return fan_out_query(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM Room),
+            (SELECT COUNT(*) FROM Trainer),
+            (SELECT COUNT(*) FROM PTSession WHERE session_at >= NOW()),
+            (SELECT COUNT(*) FROM GroupClass WHERE scheduled_at >= NOW()),
+            (SELECT COUNT(*) FROM ClassRegistration WHERE scheduled_at >= NOW()),
+            (SELECT COUNT(*) FROM MaintenanceTicket WHERE status <> 'CLOSED');
+        """
+    )
+
+
+def admin_global_summary(user):
+    print("\n=== All Locations Summary ===")
+    try:
+        rows = global_club_summary()
+    except Exception as e:
+        print("Error loading summary:", e)
+        return
+
+    totals = [0] * 6
+    for location_id, row in rows:
+        rooms, trainers, pt, classes, regs, tickets = row
+        totals = [t + v for t, v in zip(totals, row)]
+        print(
+            f"- {LOCATION_SHARDS[location_id]['name']}: {rooms} rooms, {trainers} trainers, "
+            f"{pt} upcoming PT sessions, {classes} upcoming classes ({regs} registrations), "
+            f"{tickets} open tickets"
+        )
+    if len(rows) > 1:
+        print(
+            f"Total: {totals[0]} rooms, {totals[1]} trainers, {totals[2]} upcoming PT sessions, "
+            f"{totals[3]} upcoming classes ({totals[4]} registrations), {totals[5]} open tickets"
+        )
+
+
+# ---------- BOOKING EVENT OUTBOX ----------
+
+# Every booking/class/ticket write also inserts an OutboxEvent row in the
+# same transaction, so downstream systems (reminders, billing, analytics)
+# can follow changes without diffing tables. Consumers read in
+# (tx_id, event_id) order and only see events from transactions older than
+# every transaction still running, so an event can never show up behind a
+# consumer's checkpoint after it has moved past.
+
+OUTBOX_BATCH_SIZE = 500
+
+
+def record_event(cur, aggregate_type, aggregate_id, event_type, payload):
+    """Queue a change event; it commits or rolls back with the caller's transaction."""
+    cur.execute(
+        "INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload) "
+        "VALUES (%s, %s, %s, %s);",
+        (aggregate_type, aggregate_id, event_type, json.dumps(payload, default=str))
+    )
+
+
+def consume_outbox(consumer_name, handler, batch_size=OUTBOX_BATCH_SIZE,
+                   max_batches=None, poll_seconds=None, location_id=None):
+    """Deliver outbox events to handler(events) in order, at least once.
+
+    events is a list of dicts (event_id, aggregate_type, aggregate_id,
+    event_type, payload, created_at). The consumer's checkpoint only moves
+    after handler returns, so if it raises (or the process dies) the same
+    batch is delivered again next time. Consumers with the same name take
+    turns through a row lock on their checkpoint.
+
+    Stops when caught up, unless poll_seconds is given, in which case it
+    sleeps and polls again. Returns the number of events delivered.
+    """
+    delivered = 0
+    batches = 0
+    con = get_connection(location_id)
+    cur = con.cursor()
+    try:
+        while max_batches is None or batches < max_batches:
+            cur.execute(
+                "INSERT INTO OutboxCheckpoint (consumer_name) VALUES (%s) "
+                "ON CONFLICT (consumer_name) DO NOTHING;",
+                (consumer_name,)
+            )
+            cur.execute(
+                "SELECT last_tx_id, last_event_id FROM OutboxCheckpoint "
+                "WHERE consumer_name = %s FOR UPDATE;",
+                (consumer_name,)
+            )
+            last_tx_id, last_event_id = cur.fetchone()
+
+            cur.execute(
+                """
+                SELECT event_id, tx_id, aggregate_type, aggregate_id, event_type, payload, created_at
+                FROM OutboxEvent
+                WHERE (tx_id, event_id) > (%s, %s)
+                  AND tx_id < txid_snapshot_xmin(txid_current_snapshot())
+                ORDER BY tx_id, event_id
+                LIMIT %s;
+                """,
+                (last_tx_id, last_event_id, batch_size)
+            )
+            rows = cur.fetchall()
+
+            if not rows:
+                con.commit()
+                if poll_seconds is None:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            events = [
+                {"event_id": r[0], "aggregate_type": r[2], "aggregate_id": r[3],
+                 "event_type": r[4], "payload": r[5], "created_at": r[6]}
+                for r in rows
+            ]
+            try:
+                handler(events)
+            except Exception:
+                con.rollback()
+                raise
+
+            cur.execute(
+                "UPDATE OutboxCheckpoint "
+                "SET last_tx_id = %s, last_event_id = %s, updated_at = NOW() "
+                "WHERE consumer_name = %s;",
+                (rows[-1][1], rows[-1][0], consumer_name)
+            )
+            con.commit()
+            delivered += len(events)
+            batches += 1
+    finally:
+        cur.close()
+        con.close()
+    return delivered
+
+
+def purge_outbox(keep_days=30, location_id=None):
+    """Delete events older than keep_days that every consumer has already passed."""
+    con = get_connection(location_id)
+    cur = con.cursor()
+    cur.execute(
+        """
+        DELETE FROM OutboxEvent e
+        WHERE e.created_at < NOW() - (%s * INTERVAL '1 day')
+          AND NOT EXISTS (
+              SELECT 1 FROM OutboxCheckpoint c
+              WHERE (c.last_tx_id, c.last_event_id) < (e.tx_id, e.event_id)
+          );
+        """,
+        (keep_days,)
+    )
+    deleted = cur.rowcount
+    con.commit()
+    cur.close()
+    con.close()
+    return deleted
+
+
+# ---------- SESSION REMINDERS ----------
+
+# A single worker ticks every REMINDER_INTERVAL_SECONDS and reminds members of
+# PT sessions and classes starting within the next REMINDER_LEAD_MINUTES.
+# Each tick is a range scan on PTSession(session_at) / GroupClass(scheduled_at)
+# anti-joined against ReminderLedger, and the ledger rows are written in the
+# same transaction as the batch is handed to the sender: if sending fails the
+# rows roll back and the batch is retried on the next tick, and a booking is
+# never reminded twice for the same start time. Rescheduling a booking gives
+# it a new start time, so it gets a fresh reminder.
+#
+#   python project.py reminders [outfile] [location_id]
+
+REMINDER_LEAD_MINUTES = 120
+REMINDER_INTERVAL_SECONDS = 60
+REMINDER_BATCH_SIZE = 1000
+
+DUE_REMINDERS_SQL = """
+WITH due AS (
+    SELECT 'PT' AS booking_kind, p.session_id AS booking_id, p.member_id,
+           p.session_at AS starts_at, p.duration_minutes, p.room_id,
+           p.trainer_id, NULL::text AS class_name
+    FROM PTSession p
+    WHERE p.session_at >= %(now)s AND p.session_at < %(until)s
+      AND NOT EXISTS (
+          SELECT 1 FROM ReminderLedger l
+          WHERE l.booking_kind = 'PT' AND l.booking_id = p.session_id
+            AND l.member_id = p.member_id AND l.starts_at = p.session_at
+      )
+    UNION ALL
+    SELECT 'CLASS', g.class_id, cr.member_id,
+           g.scheduled_at, g.duration_minutes, g.room_id,
+           g.trainer_id, g.class_name
+    FROM GroupClass g
+    JOIN ClassRegistration cr ON cr.class_id = g.class_id AND cr.scheduled_at = g.scheduled_at
+    WHERE g.scheduled_at >= %(now)s AND g.scheduled_at < %(until)s
+      AND NOT EXISTS (
+          SELECT 1 FROM ReminderLedger l
+          WHERE l.booking_kind = 'CLASS' AND l.booking_id = g.class_id
+            AND l.member_id = cr.member_id AND l.starts_at = g.scheduled_at
+      )
+    ORDER BY 4
+    LIMIT %(batch_size)s
+),
+claimed AS (
+    INSERT INTO ReminderLedger (booking_kind, booking_id, member_id, starts_at)
+    SELECT booking_kind, booking_id, member_id, starts_at FROM due
+    ON CONFLICT DO NOTHING
+    RETURNING booking_kind, booking_id, member_id, starts_at
+)
+SELECT d.booking_kind, d.booking_id, d.member_id, m.name, u.email,
+       d.starts_at, d.duration_minutes, d.room_id, r.name,
+       d.trainer_id, t.name, d.class_name
+FROM claimed c
+JOIN due d USING (booking_kind, booking_id, member_id, starts_at)
+JOIN Member m ON m.member_id = d.member_id
+JOIN UserAccount u ON u.user_id = d.member_id
+JOIN Room r ON r.room_id = d.room_id
+JOIN Trainer t ON t.trainer_id = d.trainer_id
+ORDER BY d.starts_at;
+"""
+
+
+class FileReminderSender:
+    """Appends each reminder as a JSON line to a local file (for testing).
+
+    Any object with a send(reminders) method can be used as a sender; it
+    should raise if the batch could not be delivered.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, reminders):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for reminder in reminders:
+                f.write(json.dumps(reminder, default=str) + "\n")
+
 
-def get_connection():
-    return psycopg2.connect(**DB_CONFIG)
+def dispatch_due_reminders(sender, now=None, lead_minutes=REMINDER_LEAD_MINUTES,
+                           batch_size=REMINDER_BATCH_SIZE, location_id=None):
+    """Send every reminder due in [now, now + lead_minutes). Returns the count sent."""
+    now = now or datetime.now()
+    params = {"now": now, "until": now + timedelta(minutes=lead_minutes),
+              "batch_size": batch_size}
+    sent = 0
+
+    con = get_connection(location_id)
+    cur = con.cursor()
+    try:
+        while True:
+            cur.execute(DUE_REMINDERS_SQL, params)
+            rows = cur.fetchall()
+            if not rows:
+                con.commit()
+                break
+
+            reminders = [
+                {"kind": r[0], "booking_id": r[1], "member_id": r[2],
+                 "member_name": r[3], "email": r[4], "starts_at": r[5],
+                 "duration_minutes": r[6], "room_id": r[7], "room_name": r[8],
+                 "trainer_id": r[9], "trainer_name": r[10], "class_name": r[11]}
+                for r in rows
+            ]
+            try:
+                sender.send(reminders)
+            except Exception:
+                con.rollback()
+                raise
+            con.commit()
+            sent += len(reminders)
+    finally:
+        cur.close()
+        con.close()
+    return sent
+
+
+def purge_reminder_ledger(keep_days=7, location_id=None):
+    """Forget reminders for bookings that started more than keep_days ago."""
+    con = get_connection(location_id)
+    cur = con.cursor()
+    cur.execute(
+        "DELETE FROM ReminderLedger WHERE starts_at < NOW() - (%s * INTERVAL '1 day');",
+        (keep_days,)
+    )
+    deleted = cur.rowcount
+    con.commit()
+    cur.close()
+    con.close()
+    return deleted
+
+
+def run_reminder_worker(sender, interval=REMINDER_INTERVAL_SECONDS,
+                        lead_minutes=REMINDER_LEAD_MINUTES, location_id=None):
+    print(f"Reminder worker running every {interval}s, {lead_minutes} min ahead (Ctrl+C to stop)")
+    last_purge = None
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                sent = dispatch_due_reminders(sender, lead_minutes=lead_minutes,
+                                              location_id=location_id)
+                if sent:
+                    print(f"{datetime.now().strftime(TIME_FORMAT)}: sent {sent} reminders")
+                if last_purge != datetime.now().date():
+                    purge_reminder_ledger(location_id=location_id)
+                    last_purge = datetime.now().date()
+            except Exception as e:
+                print("Reminder batch failed, will retry:", e)
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
 
 
 # ---------- SMALL HELPERS ----------
 
 def get_member_id(user_id):
+    con = None
     try:
-        con = get_connection()
+        con = get_pooled_connection()
         cur = con.cursor()
-        cur.execute("SELECT member_id FROM Member WHERE member_id = %s;", (user_id,))
+        execute_prepared(cur, "member_by_id", (user_id,))
         row = cur.fetchone()
         cur.close()
-        con.close()
+        release_connection(con)
         if row:
             return row[0]
     except Exception as e:
+        release_connection(con)
         print("Error getting member id:", e)
     return None
 
 
 def get_trainer_id(user_id):
+    con = None
     try:
-        con = get_connection()
+        con = get_pooled_connection()
         cur = con.cursor()
-        cur.execute("SELECT trainer_id FROM Trainer WHERE trainer_id = %s;", (user_id,))
+        execute_prepared(cur, "trainer_by_id", (user_id,))
         row = cur.fetchone()
         cur.close()
-        con.close()
+        release_connection(con)
         if row:
             return row[0]
     except Exception as e:
+        release_connection(con)
         print("Error getting trainer id:", e)
     return None
 
 
+def overlap_scan_bounds(new_start, new_end):
+    """Exclusive (low, high) start-time bounds for bookings that can overlap [new_start, new_end).
+
+    A booking lasts at most MAX_BOOKING_MINUTES (enforced by a CHECK in
+    DDL.sql), so anything starting earlier than that before new_start has
+    already ended. Filtering on these bounds keeps conflict checks on the
+    current partitions instead of the whole booking history.
+    """
+    return new_start - timedelta(minutes=MAX_BOOKING_MINUTES), new_end
+
+
 def times_overlap(start1, end1, start2, end2):
     return start1 < end2 and start2 < end1
 
 
-def get_available_rooms(new_start, duration_minutes):
+def occupancy_segments(window_start, window_end, *interval_lists):
+    """Sweep-line occupancy of [window_start, window_end).
+
+    Each interval list holds (start, end) pairs. Returns consecutive
+    (seg_start, seg_end, counts) pieces covering the window, where counts[i]
+    is how many intervals of list i are in progress throughout the piece;
+    neighbouring pieces always differ in counts.
+    An interval ending at t and one starting at t do not overlap.
+    """
+    events = []
+    for i, intervals in enumerate(interval_lists):
+        for start, end in intervals:
+            start, end = max(start, window_start), min(end, window_end)
+            if start < end:
+                events.append((start, 1, i))
+                events.append((end, -1, i))
+    events.sort(key=lambda ev: (ev[0], ev[1]))  # ends before starts at the same instant
+
+    counts = [0] * len(interval_lists)
+    segments = []
+    prev = window_start
+    for t, delta, i in events + [(window_end, 0, 0)]:
+        if t > prev:
+            if segments and segments[-1][2] == tuple(counts):
+                segments[-1] = (segments[-1][0], t, segments[-1][2])
+            else:
+                segments.append((prev, t, tuple(counts)))
+            prev = t
+        counts[i] += delta
+    return segments
+
+
+def peak_occupancy(intervals, window_start, window_end):
+    """Most intervals in progress at the same moment inside the window."""
+    return max((c[0] for _s, _e, c in occupancy_segments(window_start, window_end, intervals)),
+               default=0)
+
+
+# The occupancy index (RoomDayOccupancy / TrainerDayOccupancy in DDL.sql)
+# counts, per resource and day, the bookings covering each SLOT_MINUTES
+# slot. Slots are numbered from SLOT_EPOCH, so a time window is a range of
+# slot numbers and a day is SLOTS_PER_DAY of them. Both bookings and the
+# window asked about are rounded out to whole slots: a free answer is always
+# right, and a booking sharing only part of a slot with the window counts
+# as a conflict.
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOT_EPOCH = datetime(2000, 1, 1)
+
+OCCUPANCY_TABLES = {
+    "room": ("RoomDayOccupancy", "room_id", ("pt_slots", "class_slots")),
+    "trainer": ("TrainerDayOccupancy", "trainer_id", ("busy_slots",)),
+}
+
+
+def slot_range(start, end):
+    """Slot numbers covering [start, end), rounded out to whole slots."""
+    slot_seconds = SLOT_MINUTES * 60
+    first = int((start - SLOT_EPOCH).total_seconds() // slot_seconds)
+    last = -int(-(end - SLOT_EPOCH).total_seconds() // slot_seconds)
+    return range(first, last)
+
+
+def load_occupancy(cur, resource, new_start, new_end, ids=None):
+    """Per-slot booking counts over [new_start, new_end) for rooms or trainers.
+
+    Returns {id: {column: [count for each slot of slot_range(...)]}}; ids
+    limits it to some resources. Resources with nothing booked on those days
+    are left out. One indexed query reads just the needed array slices.
+    """
+    table, key, columns = OCCUPANCY_TABLES[resource]
+    slots = slot_range(new_start, new_end)
+
+    # One (day, first, last) piece per day the window touches; array
+    # positions are 1-based and inclusive.
+    pieces = []
+    offsets = []
+    for slot in slots:
+        day_no, pos = divmod(slot, SLOTS_PER_DAY)
+        if pos == 0 or not pieces:
+            pieces.append([(SLOT_EPOCH + timedelta(days=day_no)).date(), pos + 1, pos + 1])
+            offsets.append(slot - slots.start)
+        else:
+            pieces[-1][2] = pos + 1
+
+    slices = ", ".join(f"o.{c}[w.first_slot:w.last_slot]" for c in columns)
+    id_filter = f"AND o.{key} = ANY(%(ids)s)" if ids is not None else ""
+    cur.execute(
+        f"""
+        SELECT o.{key}, w.piece, {slices}
+        FROM unnest(%(days)s::date[], %(firsts)s::int[], %(lasts)s::int[])
+             WITH ORDINALITY AS w(day, first_slot, last_slot, piece)
+        JOIN {table} o ON o.day = w.day {id_filter};
+        """,
+        {"days": [p[0] for p in pieces], "firsts": [p[1] for p in pieces],
+         "lasts": [p[2] for p in pieces], "ids": list(ids) if ids is not None else None}
+    )
+
+    occupancy = {}
+    for row in cur.fetchall():
+        counts = occupancy.setdefault(row[0], {c: [0] * len(slots) for c in columns})
+        offset = offsets[row[1] - 1]
+        for column, values in zip(columns, row[2:]):
+            counts[column][offset:offset + len(values)] = values
+    return occupancy
+
+
+def release_slots(counts, window_start, window_end, booking_start, booking_end):
+    """Take one booking's slots off a load_occupancy() count list (e.g. the
+    class being moved, so it does not conflict with itself)."""
+    window = slot_range(window_start, window_end)
+    for slot in slot_range(booking_start, booking_end):
+        if window.start <= slot < window.stop:
+            counts[slot - window.start] -= 1
+
+
+# Many members asking for the same popular slot at once would each scan
+# every room and trainer. Identical lookups that overlap in time share one
+# computation instead: the first caller runs it, the others wait for its
+# result. Only replica (menu) reads are shared; use_primary lookups made
+# as a final check always run fresh, since a shared result could predate a
+# booking they must see. The key includes the caller's required_write_lsn(),
+# so a user who just booked only shares a lookup that was made from a
+# connection that already shows that booking. The transactional check in
+# check_trainer_and_room_availability() is what keeps bookings correct.
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(key, compute):
+    """Run compute() once for all concurrent callers with the same key."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if leader:
+        try:
+            flight.result = compute()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with _flights_lock:
+                del _flights[key]
+            flight.done.set()
+    else:
+        flight.done.wait()
+
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
+
+
+def get_available_rooms(new_start, duration_minutes, user_id=None, use_primary=False):
+    """Return a list of room_ids free at that time.
+       Reads go to a replica unless use_primary is set (use it for the check
+       right before a write). Concurrent identical replica lookups are shared.
+    """
+    if use_primary:
+        return _compute_available_rooms(new_start, duration_minutes, user_id, True)
+    key = ("rooms", _active_location, new_start, duration_minutes, required_write_lsn(user_id))
+    return list(single_flight(
+        key, lambda: _compute_available_rooms(new_start, duration_minutes, user_id)
+    ))
+
+
+def get_available_trainers(new_start, duration_minutes, user_id=None, use_primary=False):
+    """Return a list of trainer_ids available at that time.
+       Trainer availability (start_time/end_time), PT sessions, and group classes
+       are checked for conflicts. Reads go to a replica unless use_primary is set.
+       Concurrent identical replica lookups are shared.
+    """
+    if use_primary:
+        return _compute_available_trainers(new_start, duration_minutes, user_id, True)
+    key = ("trainers", _active_location, new_start, duration_minutes, required_write_lsn(user_id))
+    return list(single_flight(
+        key, lambda: _compute_available_trainers(new_start, duration_minutes, user_id)
+    ))
+
+
+def _compute_available_rooms(new_start, duration_minutes, user_id=None, use_primary=False):
     new_end = new_start + timedelta(minutes=duration_minutes)
     available = []
 
+    con = None
     try:
-        con = get_connection()
+        con = get_pooled_connection() if use_primary else get_read_connection(user_id)
         cur = con.cursor()
 
-        # Get all rooms and their capacities
-        cur.execute("SELECT room_id, capacity FROM Room;")
+        # Get all rooms that are in service at that time, with their capacities
+        execute_prepared(cur, "room_capacities", (new_end, new_start))
         rooms = cur.fetchall()
+        occupancy = load_occupancy(cur, "room", new_start, new_end)
 
         for room_id, capacity in rooms:
-            # Count overlapping PT sessions in this room
-            cur.execute(
-                "SELECT session_at, duration_minutes "
-                "FROM PTSession WHERE room_id = %s;",
-                (room_id,)
-            )
-            pt_sessions = cur.fetchall()
-
-            concurrent_pt = 0
-            for s_at, dur in pt_sessions:
-                s_end = s_at + timedelta(minutes=dur)
-                if times_overlap(new_start, new_end, s_at, s_end):
-                    concurrent_pt += 1
-
-            # If concurrent PT sessions already at capacity, room not available
-            if concurrent_pt >= capacity:
+            counts = occupancy.get(room_id)
+            if counts is None:
+                available.append(room_id)
                 continue
 
-            # Check group classes in the room (block the room if time overlaps)
-            cur.execute(
-                "SELECT scheduled_at, duration_minutes "
-                "FROM GroupClass WHERE room_id = %s;",
-                (room_id,)
-            )
-            gc_list = cur.fetchall()
-            blocked_by_class = False
-            for gc_start, gc_dur in gc_list:
-                gc_end = gc_start + timedelta(minutes=gc_dur)
-                if times_overlap(new_start, new_end, gc_start, gc_end):
-                    blocked_by_class = True
-                    break
-
-            if blocked_by_class:
+            # Full of PT sessions at some point, or a group class (which
+            # blocks the whole room) overlaps the window
+            if max(counts["pt_slots"]) >= capacity or max(counts["class_slots"]) > 0:
                 continue
 
             available.append(room_id)
 
         cur.close()
-        con.close()
+        release_connection(con)
     except Exception as e:
+        release_connection(con)
         print("Error getting available rooms:", e)
 
     return available
 
 
-def get_available_trainers(new_start, duration_minutes):
-    """Return a list of trainer_ids available at that time.
-       Trainer availability (start_time/end_time), PT sessions, and group classes
-       are checked for conflicts.
-    """
+def _compute_available_trainers(new_start, duration_minutes, user_id=None, use_primary=False):
     new_end = new_start + timedelta(minutes=duration_minutes)
     available = []
 
+    con = None
     try:
-        con = get_connection()
+        con = get_pooled_connection() if use_primary else get_read_connection(user_id)
         cur = con.cursor()
 
-        cur.execute("SELECT trainer_id, start_time, end_time FROM Trainer;")
+        execute_prepared(cur, "trainer_windows")
         trainers = cur.fetchall()
+        occupancy = load_occupancy(cur, "trainer", new_start, new_end)
 
         for trainer_id, avail_start, avail_end in trainers:
             # Check trainer availability window (time of day)
@@ -132,69 +1269,592 @@ def get_available_trainers(new_start, duration_minutes):
                         new_end.time() <= avail_end.time()):
                     continue
 
-            # Check trainer's PT sessions
-            cur.execute(
-                "SELECT session_at, duration_minutes "
-                "FROM PTSession WHERE trainer_id = %s;",
-                (trainer_id,)
-            )
-            pt_sessions = cur.fetchall()
-            conflict = False
-            for s_at, dur in pt_sessions:
-                s_end = s_at + timedelta(minutes=dur)
-                if times_overlap(new_start, new_end, s_at, s_end):
-                    conflict = True
-                    break
-
-            if conflict:
-                continue
-
-            # Check trainer's group classes
-            cur.execute(
-                "SELECT scheduled_at, duration_minutes "
-                "FROM GroupClass WHERE trainer_id = %s;",
-                (trainer_id,)
-            )
-            gc_list = cur.fetchall()
-            conflict = False
-            for gc_start, gc_dur in gc_list:
-                gc_end = gc_start + timedelta(minutes=gc_dur)
-                if times_overlap(new_start, new_end, gc_start, gc_end):
-                    conflict = True
-                    break
-
-            if conflict:
+            # Any PT session or group class in the window
+            counts = occupancy.get(trainer_id)
+            if counts is not None and max(counts["busy_slots"]) > 0:
                 continue
 
             available.append(trainer_id)
 
         cur.close()
-        con.close()
+        release_connection(con)
     except Exception as e:
+        release_connection(con)
         print("Error getting available trainers:", e)
 
     return available
 
 
-def check_trainer_and_room_availability(trainer_id, room_id, new_start, duration_minutes):
-    """Simple wrapper that reuses the two helper lists."""
-    rooms = get_available_rooms(new_start, duration_minutes)
-    if room_id not in rooms:
+BOOKING_LOCK_ROOM = 1
+BOOKING_LOCK_TRAINER = 2
+
+
+def _lock_ids(ids):
+    if ids is None:
+        return []
+    if isinstance(ids, int):
+        return [ids]
+    return sorted(set(ids))
+
+
+def lock_booking_resources(cur, room_id=None, trainer_id=None):
+    """Take transaction-level advisory locks on rooms and/or trainers.
+
+    room_id and trainer_id are single ids or collections of ids (for bulk
+    writers). Bookings that touch the same room or trainer then run their
+    final check and write one at a time. Rooms are always locked before
+    trainers, each in ascending id order, so two writers cannot deadlock
+    as long as each takes all its locks in one call. Released at commit or
+    rollback.
+    """
+    for lock_class, ids in ((BOOKING_LOCK_ROOM, room_id), (BOOKING_LOCK_TRAINER, trainer_id)):
+        for lock_id in _lock_ids(ids):
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s);", (lock_class, lock_id))
+
+
+def check_trainer_and_room_availability(cur, trainer_id, room_id, new_start, duration_minutes,
+                                        exclude_session_id=None):
+    """Final check of one trainer and room, in the transaction that books them.
+
+    Locks both with lock_booking_resources() first, so any booking committed
+    before ours is seen and none can slip in until we commit. Only the
+    chosen pair is checked; the full availability lists were already
+    computed for the menu. exclude_session_id skips the session being
+    rescheduled.
+    """
+    new_end = new_start + timedelta(minutes=duration_minutes)
+    scan_from, scan_to = overlap_scan_bounds(new_start, new_end)
+    lock_booking_resources(cur, room_id, trainer_id)
+
+    execute_prepared(cur, "room_capacities", (new_end, new_start))
+    capacity = dict(cur.fetchall()).get(room_id)
+    room_ok = capacity is not None
+    if room_ok:
+        cur.execute(
+            "SELECT session_at, duration_minutes FROM PTSession "
+            "WHERE room_id = %s AND session_id IS DISTINCT FROM %s "
+            "AND session_at > %s AND session_at < %s;",
+            (room_id, exclude_session_id, scan_from, scan_to)
+        )
+        pt_sessions = [(s_at, s_at + timedelta(minutes=dur)) for s_at, dur in cur.fetchall()]
+        room_ok = peak_occupancy(pt_sessions, new_start, new_end) < capacity
+    if room_ok:
+        execute_prepared(cur, "classes_by_room", (room_id, scan_from, scan_to))
+        room_ok = not any(
+            times_overlap(new_start, new_end, gc_start, gc_start + timedelta(minutes=gc_dur))
+            for gc_start, gc_dur in cur.fetchall()
+        )
+    if not room_ok:
         print("Selected room is no longer available.")
         return False
 
-    trainers = get_available_trainers(new_start, duration_minutes)
-    if trainer_id not in trainers:
+    cur.execute("SELECT start_time, end_time FROM Trainer WHERE trainer_id = %s;", (trainer_id,))
+    row = cur.fetchone()
+    trainer_ok = row is not None
+    if trainer_ok and row[0] and row[1]:
+        trainer_ok = new_start.time() >= row[0].time() and new_end.time() <= row[1].time()
+    if trainer_ok:
+        cur.execute(
+            "SELECT session_at, duration_minutes FROM PTSession "
+            "WHERE trainer_id = %s AND session_id IS DISTINCT FROM %s "
+            "AND session_at > %s AND session_at < %s;",
+            (trainer_id, exclude_session_id, scan_from, scan_to)
+        )
+        bookings = cur.fetchall()
+        execute_prepared(cur, "classes_by_trainer", (trainer_id, scan_from, scan_to))
+        bookings += cur.fetchall()
+        trainer_ok = not any(
+            times_overlap(new_start, new_end, b_start, b_start + timedelta(minutes=b_dur))
+            for b_start, b_dur in bookings
+        )
+    if not trainer_ok:
         print("Selected trainer is no longer available.")
         return False
 
     return True
 
 
-# ---------- REGISTRATION ----------
+# ---------- SEARCH ----------
 
-def register_member():
-    print("\n=== Register Member ===")
+# Front desk lookups by name, email or phone instead of raw ids. Matching
+# uses pg_trgm word similarity (the "<%" operator), which is served by the
+# GIN trigram indexes in DDL.sql and tolerates typos and partial words, so
+# "jon sm" finds "John Smith". Each branch of a query below is a separate
+# index probe; results are ranked by their best similarity score.
+
+SEARCH_LIMIT = 10
+
+SEARCH_SQL = {
+    "member": """
+        WITH hits AS (
+            SELECT member_id AS id FROM Member WHERE %(term)s <%% name
+            UNION
+            SELECT member_id FROM Member WHERE %(term)s <%% phone
+            UNION
+            SELECT user_id FROM UserAccount WHERE %(term)s <%% email AND role_type = 'MEMBER'
+        )
+        SELECT m.member_id,
+               m.name || ' <' || u.email || '>' || COALESCE(' ' || m.phone, ''),
+               GREATEST(word_similarity(%(term)s, m.name), word_similarity(%(term)s, u.email),
+                        COALESCE(word_similarity(%(term)s, m.phone), 0)) AS score
+        FROM hits h
+        JOIN Member m ON m.member_id = h.id
+        JOIN UserAccount u ON u.user_id = m.member_id
+        ORDER BY score DESC, m.name, m.member_id
+        LIMIT %(limit)s
+    """,
+    "trainer": """
+        WITH hits AS (
+            SELECT trainer_id AS id FROM Trainer WHERE %(term)s <%% name
+            UNION
+            SELECT user_id FROM UserAccount WHERE %(term)s <%% email AND role_type = 'TRAINER'
+        )
+        SELECT t.trainer_id, t.name || ' <' || u.email || '>',
+               GREATEST(word_similarity(%(term)s, t.name), word_similarity(%(term)s, u.email)) AS score
+        FROM hits h
+        JOIN Trainer t ON t.trainer_id = h.id
+        JOIN UserAccount u ON u.user_id = t.trainer_id
+        ORDER BY score DESC, t.name, t.trainer_id
+        LIMIT %(limit)s
+    """,
+    # Few rooms; no index needed
+    "room": """
+        SELECT room_id, name || ' (capacity ' || capacity || ')',
+               word_similarity(%(term)s, name) AS score
+        FROM Room
+        WHERE %(term)s <%% name
+        ORDER BY score DESC, name, room_id
+        LIMIT %(limit)s
+    """,
+    # Upcoming classes by class name, soonest first among equally good matches
+    "class": """
+        SELECT g.class_id,
+               g.class_name || ', ' || to_char(g.scheduled_at, 'YYYY-MM-DD HH24:MI') ||
+               ' with ' || t.name || ' in ' || COALESCE(r.name, 'no room'),
+               word_similarity(%(term)s, g.class_name) AS score
+        FROM GroupClass g
+        JOIN Trainer t ON t.trainer_id = g.trainer_id
+        LEFT JOIN Room r ON r.room_id = g.room_id
+        WHERE %(term)s <%% g.class_name AND g.scheduled_at >= %(now)s
+        ORDER BY score DESC, g.scheduled_at, g.class_id
+        LIMIT %(limit)s
+    """,
+    # Upcoming PT sessions of the members and trainers whose names match
+    "session": """
+        WITH people AS (
+            SELECT member_id AS id, 'member' AS role, word_similarity(%(term)s, name) AS score
+            FROM Member WHERE %(term)s <%% name
+            UNION ALL
+            SELECT trainer_id, 'trainer', word_similarity(%(term)s, name)
+            FROM Trainer WHERE %(term)s <%% name
+        ),
+        sessions AS (
+            SELECT p.session_id, p.session_at, pe.score
+            FROM people pe
+            JOIN PTSession p ON p.member_id = pe.id AND p.session_at >= %(now)s
+            WHERE pe.role = 'member'
+            UNION ALL
+            SELECT p.session_id, p.session_at, pe.score
+            FROM people pe
+            JOIN PTSession p ON p.trainer_id = pe.id AND p.session_at >= %(now)s
+            WHERE pe.role = 'trainer'
+        )
+        SELECT s.session_id,
+               to_char(p.session_at, 'YYYY-MM-DD HH24:MI') || ' ' || m.name ||
+               ' with ' || t.name || ' in ' || COALESCE(r.name, 'no room'),
+               MAX(s.score) AS score
+        FROM sessions s
+        JOIN PTSession p ON p.session_id = s.session_id AND p.session_at = s.session_at
+        JOIN Member m ON m.member_id = p.member_id
+        JOIN Trainer t ON t.trainer_id = p.trainer_id
+        LEFT JOIN Room r ON r.room_id = p.room_id
+        GROUP BY s.session_id, p.session_at, m.name, t.name, r.name
+        ORDER BY score DESC, p.session_at, s.session_id
+        LIMIT %(limit)s
+    """,
+}
+
+# Does a typed number name an existing row? If not it is searched for, so a
+# phone number works at an ID prompt.
+ID_EXISTS_SQL = {
+    "member": "SELECT 1 FROM Member WHERE member_id = %s;",
+    "trainer": "SELECT 1 FROM Trainer WHERE trainer_id = %s;",
+    "room": "SELECT 1 FROM Room WHERE room_id = %s;",
+    "class": "SELECT 1 FROM GroupClass WHERE class_id = %s;",
+    "session": "SELECT 1 FROM PTSession WHERE session_id = %s;",
+}
+
+MAX_ID = 2 ** 31 - 1
+
+
+def search_by_name(kind, term, limit=SEARCH_LIMIT, user_id=None):
+    """Ranked (id, label) matches for a member, trainer, room, class or session search."""
+    con = None
+    try:
+        con = get_read_connection(user_id)
+        cur = con.cursor()
+        cur.execute(SEARCH_SQL[kind], {"term": term, "limit": limit, "now": datetime.now()})
+        matches = [(row[0], row[1]) for row in cur.fetchall()]
+        cur.close()
+        return matches
+    finally:
+        release_connection(con)
+
+
+def id_exists(kind, id_value):
+    con = None
+    try:
+        con = get_read_connection()
+        cur = con.cursor()
+        cur.execute(ID_EXISTS_SQL[kind], (id_value,))
+        found = cur.fetchone() is not None
+        cur.close()
+        return found
+    finally:
+        release_connection(con)
+
+
+def resolve_id(kind, text):
+    """Turn what was typed at an ID prompt into an id.
+
+    "#123" is always id 123. Plain digits are taken as the id when that row
+    exists; otherwise they, like anything else, are searched for (a phone
+    number, say) and the matches are listed to pick from. Returns None if
+    nothing was chosen.
+    """
+    text = text.strip()
+    if text.startswith("#") and text[1:].isdigit():
+        return int(text[1:])
+    try:
+        if text.isdigit() and int(text) <= MAX_ID and id_exists(kind, int(text)):
+            return int(text)
+        if len(text) < 2:
+            return None
+        matches = search_by_name(kind, text)
+    except psycopg2.Error as e:
+        print("Error searching:", e)
+        return None
+    if not matches:
+        print(f"No {kind} matches '{text}'.")
+        return None
+
+    for i, (match_id, label) in enumerate(matches, start=1):
+        print(f"  {i}. [{match_id}] {label}")
+    pick = input("Pick a number (Enter to cancel): ").strip()
+    if not pick.isdigit() or not 1 <= int(pick) <= len(matches):
+        return None
+    return matches[int(pick) - 1][0]
+
+
+def admin_find_people(user):
+    print("\n=== Find Member or Trainer ===")
+    while True:
+        term = input("Name, email or phone (Enter to go back): ").strip()
+        if not term:
+            break
+        try:
+            started = time.perf_counter()
+            members = search_by_name("member", term, user_id=user["user_id"])
+            trainers = search_by_name("trainer", term, user_id=user["user_id"])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        except psycopg2.Error as e:
+            print("Error searching:", e)
+            continue
+        for label, matches in (("Members", members), ("Trainers", trainers)):
+            if matches:
+                print(label + ":")
+                for match_id, text in matches:
+                    print(f"  [{match_id}] {text}")
+        if not members and not trainers:
+            print("No matches.")
+        print(f"({elapsed_ms:.0f} ms)")
+
+
+# ---------- WHAT-IF INTERVAL ENGINE ----------
+
+# Capacity planning: replay a period's bookings against alternative room or
+# trainer setups (some closed, their bookings moved elsewhere) many times.
+# IntervalEngine keeps each resource's bookings as sorted datetime64 arrays
+# and answers overlap, conflict-count and load queries with searchsorted over
+# start/end arrays and cumulative weight sums, instead of the times_overlap()
+# loops used for single interactive bookings. NumPy is only needed here.
+#
+#   python project.py simulate [room|trainer] [runs] [synthetic_bookings]
+
+SIM_DAYS = 91
+SIM_RUNS = 1000
+SIM_SCALAR_RUNS = 3
+
+SIM_BOOKINGS_SQL = """
+SELECT room_id, trainer_id, session_at, duration_minutes, FALSE AS is_class
+FROM PTSession
+WHERE session_at >= %(start)s AND session_at < %(end)s
+UNION ALL
+SELECT room_id, trainer_id, scheduled_at, duration_minutes, TRUE
+FROM GroupClass
+WHERE scheduled_at >= %(start)s AND scheduled_at < %(end)s;
+"""
+
+
+class IntervalEngine:
+    """Half-open [start, end) intervals grouped by resource, at minute resolution.
+
+    Each interval has an integer weight (default 1): the load on a resource
+    at time t is the summed weight of its intervals covering t.
+    """
+
+    def __init__(self, resources, starts, ends, weights=None):
+        resources = np.asarray(resources)
+        starts = np.asarray(starts, dtype="datetime64[m]")
+        ends = np.asarray(ends, dtype="datetime64[m]")
+        if weights is None:
+            weights = np.ones(len(starts), dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.int64)
+
+        # resource -> (starts, ends in start order, cumulative start weights,
+        #              ends sorted, cumulative end weights)
+        self._by_resource = {}
+        if len(starts) == 0:
+            return
+
+        order = np.lexsort((starts, resources))
+        resources, starts, ends, weights = (
+            resources[order], starts[order], ends[order], weights[order]
+        )
+        cuts = np.flatnonzero(resources[1:] != resources[:-1]) + 1
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(resources)]):
+            s, e, w = starts[lo:hi], ends[lo:hi], weights[lo:hi]
+            end_order = np.argsort(e, kind="stable")
+            self._by_resource[resources[lo].item()] = (
+                s,
+                e,
+                np.concatenate(([0], np.cumsum(w))),
+                e[end_order],
+                np.concatenate(([0], np.cumsum(w[end_order]))),
+            )
+
+    def resources(self):
+        return list(self._by_resource)
+
+    def intervals(self, resource):
+        """(starts, ends) of a resource's intervals, in start order."""
+        data = self._by_resource.get(resource)
+        if data is None:
+            empty = np.array([], dtype="datetime64[m]")
+            return empty, empty
+        return data[0], data[1]
+
+    def count_overlapping(self, resource, query_starts, query_ends):
+        """For each query interval, how many of the resource's intervals overlap it."""
+        query_starts = np.asarray(query_starts, dtype="datetime64[m]")
+        query_ends = np.asarray(query_ends, dtype="datetime64[m]")
+        data = self._by_resource.get(resource)
+        if data is None:
+            return np.zeros(query_starts.shape, dtype=np.int64)
+        starts, _ends, _sw, ends_sorted, _ew = data
+        # started before the query ends, minus those that ended before it started
+        return (np.searchsorted(starts, query_ends, side="left")
+                - np.searchsorted(ends_sorted, query_starts, side="right"))
+
+    def overlaps(self, resource, start, end):
+        return bool(self.count_overlapping(resource, [start], [end])[0] > 0)
+
+    def load_at(self, resource, times):
+        """Summed weight of the resource's intervals covering each time."""
+        times = np.asarray(times, dtype="datetime64[m]")
+        data = self._by_resource.get(resource)
+        if data is None:
+            return np.zeros(times.shape, dtype=np.int64)
+        starts, _ends, start_weight, ends_sorted, end_weight = data
+        return (start_weight[np.searchsorted(starts, times, side="right")]
+                - end_weight[np.searchsorted(ends_sorted, times, side="right")])
+
+    def peak_concurrency(self, resource, window_start=None, window_end=None):
+        """Highest load on the resource, optionally within [window_start, window_end).
+
+        Load only rises at interval starts, so checking the window start and
+        every start inside the window is enough.
+        """
+        starts = self.intervals(resource)[0]
+        if window_start is not None:
+            ws = np.datetime64(window_start, "m")
+            we = np.datetime64(window_end, "m")
+            starts = np.concatenate(([ws], starts[(starts > ws) & (starts < we)]))
+        if len(starts) == 0:
+            return 0
+        return int(self.load_at(resource, starts).max())
+
+    def overbooked_starts(self, resource, capacity):
+        """Number of the resource's interval starts at which its load exceeds capacity."""
+        starts = self.intervals(resource)[0]
+        if len(starts) == 0:
+            return 0
+        return int(np.count_nonzero(self.load_at(resource, starts) > capacity))
+
+
+def load_simulation_bookings(start, end, location_id=None):
+    """Bookings starting in [start, end) as NumPy arrays, plus room capacities and trainer ids."""
+    con = get_read_connection(location_id=location_id)
+    try:
+        cur = con.cursor()
+        cur.execute(SIM_BOOKINGS_SQL, {"start": start, "end": end})
+        rows = cur.fetchall()
+        cur.execute("SELECT room_id, capacity FROM Room;")
+        room_capacity = dict(cur.fetchall())
+        cur.execute("SELECT trainer_id FROM Trainer;")
+        trainer_ids = [r[0] for r in cur.fetchall()]
+        cur.close()
+    finally:
+        release_connection(con)
+
+    starts = np.array([r[2] for r in rows], dtype="datetime64[m]")
+    bookings = {
+        "room": np.array([r[0] for r in rows], dtype=np.int64),
+        "trainer": np.array([r[1] for r in rows], dtype=np.int64),
+        "start": starts,
+        "end": starts + np.array([r[3] for r in rows], dtype=np.int64).astype("timedelta64[m]"),
+        "is_class": np.array([r[4] for r in rows], dtype=bool),
+    }
+    return bookings, room_capacity, trainer_ids
+
+
+def synthetic_bookings(count, rooms=10, trainers=20, days=SIM_DAYS, seed=0):
+    """Random bookings for benchmarking without a populated database."""
+    rng = np.random.default_rng(seed)
+    base = np.datetime64(datetime.now().date(), "m")
+    starts = (base
+              + (rng.integers(0, days, count) * 1440
+                 + rng.integers(6 * 4, 21 * 4, count) * 15).astype("timedelta64[m]"))
+    durations = rng.choice([30, 45, 60, 90], count)
+    bookings = {
+        "room": rng.integers(1, rooms + 1, count),
+        "trainer": rng.integers(1, trainers + 1, count),
+        "start": starts,
+        "end": starts + durations.astype("timedelta64[m]"),
+        "is_class": rng.random(count) < 0.1,
+    }
+    room_capacity = {r: int(c) for r, c in zip(range(1, rooms + 1), rng.integers(2, 8, rooms))}
+    return bookings, room_capacity, list(range(1, trainers + 1))
+
+
+def _closure_scenario(bookings, kind, resource_ids, close_count, seed):
+    """Close close_count random rooms/trainers and move their bookings to random open ones."""
+    rng = np.random.default_rng(seed)
+    resource_ids = np.asarray(resource_ids)
+    closed = rng.choice(resource_ids, size=close_count, replace=False)
+    open_ids = np.setdiff1d(resource_ids, closed)
+    assigned = bookings[kind].copy()
+    moved = np.isin(assigned, closed)
+    assigned[moved] = rng.choice(open_ids, size=int(moved.sum()))
+    return closed, assigned
+
+
+def _scenario_weights(bookings, kind, assigned, room_capacity):
+    """A PT session takes one place; a class takes the whole room. Trainers do one thing at a time."""
+    if kind == "trainer":
+        return np.ones(len(assigned), dtype=np.int64), {}
+    room_ids = np.array(sorted(room_capacity))
+    capacities = np.array([room_capacity[r] for r in room_ids], dtype=np.int64)
+    class_weight = capacities[np.searchsorted(room_ids, assigned)]
+    return np.where(bookings["is_class"], class_weight, 1), room_capacity
+
+
+def _overbooked_vectorized(assigned, starts, ends, weights, capacity):
+    engine = IntervalEngine(assigned, starts, ends, weights)
+    return sum(engine.overbooked_starts(r, capacity.get(r, 1)) for r in engine.resources())
+
+
+def _overbooked_scalar(assigned, starts, ends, weights, capacity):
+    """Same answer as _overbooked_vectorized(), using times_overlap() loops."""
+    by_resource = {}
+    for r, s, e, w in zip(assigned.tolist(), starts.tolist(), ends.tolist(), weights.tolist()):
+        by_resource.setdefault(r, []).append((s, e, w))
+
+    overbooked = 0
+    one_minute = timedelta(minutes=1)
+    for r, items in by_resource.items():
+        for s, _e, _w in items:
+            load = 0
+            for s2, e2, w2 in items:
+                if times_overlap(s, s + one_minute, s2, e2):
+                    load += w2
+            if load > capacity.get(r, 1):
+                overbooked += 1
+    return overbooked
+
+
+def simulate_closures(bookings, room_capacity, trainer_ids, kind="room", close_count=1,
+                      runs=SIM_RUNS, seed=0, scalar_runs=SIM_SCALAR_RUNS):
+    """Replay bookings with close_count random rooms/trainers closed, runs times.
+
+    Returns a dict with the per-run overbooked-start counts and timings of
+    the vectorized engine against the scalar times_overlap() path (run on
+    the first scalar_runs scenarios, which must give the same counts).
+    """
+    resource_ids = sorted(room_capacity) if kind == "room" else sorted(trainer_ids)
+    if close_count >= len(resource_ids):
+        raise ValueError(f"Cannot close {close_count} of {len(resource_ids)} {kind}s")
+
+    results = []
+    started = time.perf_counter()
+    for run in range(runs):
+        _closed, assigned = _closure_scenario(bookings, kind, resource_ids, close_count, seed + run)
+        weights, capacity = _scenario_weights(bookings, kind, assigned, room_capacity)
+        results.append(_overbooked_vectorized(
+            assigned, bookings["start"], bookings["end"], weights, capacity
+        ))
+    vector_seconds = time.perf_counter() - started
+
+    scalar_results = []
+    started = time.perf_counter()
+    for run in range(min(scalar_runs, runs)):
+        _closed, assigned = _closure_scenario(bookings, kind, resource_ids, close_count, seed + run)
+        weights, capacity = _scenario_weights(bookings, kind, assigned, room_capacity)
+        scalar_results.append(_overbooked_scalar(
+            assigned, bookings["start"].astype(datetime), bookings["end"].astype(datetime),
+            weights, capacity
+        ))
+    scalar_seconds = time.perf_counter() - started
+
+    return {
+        "overbooked": results,
+        "vector_ms_per_run": vector_seconds * 1000 / max(runs, 1),
+        "scalar_ms_per_run": scalar_seconds * 1000 / max(len(scalar_results), 1),
+        "scalar_matches": scalar_results == results[:len(scalar_results)],
+    }
+
+
+def run_schedule_simulation(kind="room", runs=SIM_RUNS, close_count=1, synthetic=None,
+                            days=SIM_DAYS, location_id=None):
+    if np is None:
+        print("The simulator needs NumPy: pip install numpy")
+        return
+
+    if synthetic:
+        bookings, room_capacity, trainer_ids = synthetic_bookings(synthetic, days=days)
+        source = f"{synthetic} synthetic bookings"
+    else:
+        end = datetime.combine(datetime.now().date(), datetime.min.time())
+        start = end - timedelta(days=days)
+        bookings, room_capacity, trainer_ids = load_simulation_bookings(start, end, location_id)
+        source = f"{len(bookings['start'])} bookings from {start:%Y-%m-%d} to {end:%Y-%m-%d}"
+
+    print(f"Replaying {source}, {runs} runs, {close_count} {kind}(s) closed per run")
+    stats = simulate_closures(bookings, room_capacity, trainer_ids, kind, close_count, runs)
+
+    overbooked = np.array(stats["overbooked"])
+    print(f"Overbooked starts per run: mean {overbooked.mean():.1f}, max {overbooked.max()}, "
+          f"runs with any overbooking {np.count_nonzero(overbooked) / len(overbooked):.0%}")
+    speedup = stats["scalar_ms_per_run"] / max(stats["vector_ms_per_run"], 1e-9)
+    print(f"Vectorized: {stats['vector_ms_per_run']:.2f} ms/run, "
+          f"scalar times_overlap(): {stats['scalar_ms_per_run']:.2f} ms/run ({speedup:.0f}x)")
+    print("Scalar results match:", "yes" if stats["scalar_matches"] else "NO")
+
+
+# ---------- REGISTRATION ----------
+
+def register_member():
+    print("\n=== Register Member ===")
     email = input("Email: ").strip()
     password = input("Password: ").strip()
     name = input("Full name: ").strip()
@@ -204,13 +1864,13 @@ def register_member():
     address = input("Address (optional): ").strip() or None
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
             "INSERT INTO UserAccount (email, password, role_type) "
-            "VALUES (%s, %s, 'MEMBER') RETURNING user_id;",
-            (email, password)
+            "VALUES (%s, %s, %s) RETURNING user_id;",
+            (email, password, Role.MEMBER)
         )
         user_id = cur.fetchone()[0]
 
@@ -223,6 +1883,7 @@ def register_member():
         con.commit()
         cur.close()
         con.close()
+        sync_accounts_to_shards([user_id])
         print("Member registered.")
     except Exception as e:
         print("Error registering member:", e)
@@ -249,26 +1910,51 @@ def register_trainer():
         print("Availability start time must be before end time.")
         return
 
+    # The trainer record lives in the location they work at
+    location_id = HOME_LOCATION_ID
+    if len(LOCATION_SHARDS) > 1:
+        for loc_id, shard in LOCATION_SHARDS.items():
+            print(f"  {loc_id}. {shard['name']}")
+        loc_str = input("Location the trainer works at: ").strip()
+        if not loc_str.isdigit() or int(loc_str) not in LOCATION_SHARDS:
+            print("Invalid location.")
+            return
+        location_id = int(loc_str)
+
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
             "INSERT INTO UserAccount (email, password, role_type) "
-            "VALUES (%s, %s, 'TRAINER') RETURNING user_id;",
-            (email, password)
+            "VALUES (%s, %s, %s) RETURNING user_id;",
+            (email, password, Role.TRAINER)
         )
         user_id = cur.fetchone()[0]
 
-        cur.execute(
-            "INSERT INTO Trainer (trainer_id, name, start_time, end_time) "
-            "VALUES (%s, %s, %s, %s);",
-            (user_id, name, start_time, end_time)
-        )
+        if location_id == HOME_LOCATION_ID:
+            cur.execute(
+                "INSERT INTO Trainer (trainer_id, name, start_time, end_time) "
+                "VALUES (%s, %s, %s, %s);",
+                (user_id, name, start_time, end_time)
+            )
 
         con.commit()
         cur.close()
         con.close()
+        sync_accounts_to_shards([user_id])
+
+        if location_id != HOME_LOCATION_ID:
+            con = get_connection(location_id)
+            cur = con.cursor()
+            cur.execute(
+                "INSERT INTO Trainer (trainer_id, name, start_time, end_time) "
+                "VALUES (%s, %s, %s, %s);",
+                (user_id, name, start_time, end_time)
+            )
+            con.commit()
+            cur.close()
+            con.close()
         print("Trainer registered with availability set.")
     except Exception as e:
         print("Error registering trainer:", e)
@@ -279,18 +1965,20 @@ def register_admin():
     password = input("Password: ").strip()
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
             "INSERT INTO UserAccount (email, password, role_type) "
-            "VALUES (%s, %s, 'ADMIN');",
-            (email, password)
+            "VALUES (%s, %s, %s) RETURNING user_id;",
+            (email, password, Role.ADMIN)
         )
+        user_id = cur.fetchone()[0]
 
         con.commit()
         cur.close()
         con.close()
+        sync_accounts_to_shards([user_id])
         print("Admin registered.")
     except Exception as e:
         print("Error registering admin:", e)
@@ -304,7 +1992,7 @@ def authenticate_user():
     password = input("Password: ").strip()
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
@@ -330,12 +2018,163 @@ def authenticate_user():
         print("Account inactive.")
         return None
 
-    print("Logged in as", role_type)
+    role_type = Role(role_type)
+    print("Logged in as", role_type.value)
     return {"user_id": user_id, "role_type": role_type}
 
 
 # ---------- TRAINER: SET AVAILABILITY ----------
 
+# Only the time of day of Trainer.start_time/end_time is used by the
+# availability checks, so a booking is orphaned when it starts before the
+# new start time or ends after the new end time of day.
+ORPHANED_BOOKINGS_SQL = """
+SELECT 'PT session', session_id, session_at, duration_minutes
+FROM PTSession
+WHERE trainer_id = %(trainer_id)s AND session_at >= %(now)s
+  AND (session_at::time < %(start)s
+       OR (session_at + make_interval(mins => duration_minutes))::time > %(end)s)
+UNION ALL
+SELECT 'class', class_id, scheduled_at, duration_minutes
+FROM GroupClass
+WHERE trainer_id = %(trainer_id)s AND scheduled_at >= %(now)s
+  AND (scheduled_at::time < %(start)s
+       OR (scheduled_at + make_interval(mins => duration_minutes))::time > %(end)s)
+ORDER BY 3, 1, 2;
+"""
+
+# Every (orphan, free trainer) pair in one query: same window and conflict
+# rules as get_available_trainers(), run for all orphans at once.
+REASSIGN_CANDIDATES_SQL = """
+WITH orphan AS (
+    SELECT o.kind, o.booking_id, o.starts_at,
+           o.starts_at + make_interval(mins => o.duration_minutes) AS ends_at
+    FROM unnest(%(kinds)s::text[], %(ids)s::int[], %(starts)s::timestamp[], %(mins)s::int[])
+         AS o(kind, booking_id, starts_at, duration_minutes)
+)
+SELECT o.kind, o.booking_id, t.trainer_id
+FROM orphan o
+JOIN Trainer t ON t.trainer_id <> %(trainer_id)s
+ AND (t.start_time IS NULL OR t.end_time IS NULL
+      OR (o.starts_at::time >= t.start_time::time AND o.ends_at::time <= t.end_time::time))
+WHERE NOT EXISTS (
+    SELECT 1 FROM PTSession p
+    WHERE p.trainer_id = t.trainer_id
+      AND p.session_at > %(scan_from)s AND p.session_at < %(scan_to)s
+      AND p.session_at > o.starts_at - make_interval(mins => %(max_minutes)s)
+      AND p.session_at < o.ends_at
+      AND p.session_at + make_interval(mins => p.duration_minutes) > o.starts_at
+)
+AND NOT EXISTS (
+    SELECT 1 FROM GroupClass g
+    WHERE g.trainer_id = t.trainer_id
+      AND g.scheduled_at > %(scan_from)s AND g.scheduled_at < %(scan_to)s
+      AND g.scheduled_at > o.starts_at - make_interval(mins => %(max_minutes)s)
+      AND g.scheduled_at < o.ends_at
+      AND g.scheduled_at + make_interval(mins => g.duration_minutes) > o.starts_at
+)
+ORDER BY o.starts_at, o.kind, o.booking_id, t.trainer_id;
+"""
+
+
+def find_orphaned_bookings(cur, trainer_id, new_start, new_end):
+    """Future bookings of trainer_id that fall outside a new availability window.
+
+    Rows are (kind, booking_id, starts_at, duration_minutes) with kind
+    'PT session' or 'class'; read through the (trainer_id, start) indexes.
+    """
+    cur.execute(ORPHANED_BOOKINGS_SQL, {
+        "trainer_id": trainer_id, "now": datetime.now(),
+        "start": new_start.time(), "end": new_end.time(),
+    })
+    return cur.fetchall()
+
+
+def reassignment_candidates(cur, trainer_id, orphans):
+    """Map (kind, booking_id) -> [trainer_id, ...] of other trainers free for each orphan."""
+    if not orphans:
+        return {}
+    scan_from, scan_to = overlap_scan_bounds(
+        min(o[2] for o in orphans),
+        max(o[2] + timedelta(minutes=o[3]) for o in orphans)
+    )
+    cur.execute(REASSIGN_CANDIDATES_SQL, {
+        "trainer_id": trainer_id,
+        "kinds": [o[0] for o in orphans], "ids": [o[1] for o in orphans],
+        "starts": [o[2] for o in orphans], "mins": [o[3] for o in orphans],
+        "scan_from": scan_from, "scan_to": scan_to, "max_minutes": MAX_BOOKING_MINUTES,
+    })
+    candidates = {}
+    for kind, b_id, candidate in cur.fetchall():
+        candidates.setdefault((kind, b_id), []).append(candidate)
+    return candidates
+
+
+def plan_trainer_reassignment(cur, trainer_id, orphans, locked):
+    """Pick another free trainer for each orphaned booking.
+
+    Only trainers in locked (already locked with lock_booking_resources()
+    in this transaction) are used, so their bookings cannot change before
+    apply_trainer_reassignment() runs in the same transaction. Candidates
+    for all orphans come from one query; they are then handed out in start
+    order so no trainer gets two overlapping orphans. Returns
+    (plan, unplaced): plan maps (kind, booking_id) -> new trainer_id.
+    """
+    if not orphans:
+        return {}, []
+
+    windows = {
+        (kind, b_id): (s_at, s_at + timedelta(minutes=dur))
+        for kind, b_id, s_at, dur in orphans
+    }
+    candidates = reassignment_candidates(cur, trainer_id, orphans)
+
+    plan = {}
+    taken = {}
+    unplaced = []
+    for kind, b_id, _s_at, _dur in orphans:
+        start, end = windows[(kind, b_id)]
+        for candidate in candidates.get((kind, b_id), []):
+            if candidate not in locked:
+                continue
+            if any(times_overlap(start, end, s, e) for s, e in taken.get(candidate, [])):
+                continue
+            plan[(kind, b_id)] = candidate
+            taken.setdefault(candidate, []).append((start, end))
+            break
+        else:
+            unplaced.append((kind, b_id))
+
+    return plan, unplaced
+
+
+def apply_trainer_reassignment(cur, trainer_id, plan):
+    """Move the planned bookings to their new trainers, with outbox events."""
+    for kind, table, key, event_type in (
+        ("PT session", "PTSession", "session_id", "pt_session.trainer_reassigned"),
+        ("class", "GroupClass", "class_id", "group_class.trainer_reassigned"),
+    ):
+        rows = [(b_id, new_t, trainer_id) for (k, b_id), new_t in plan.items() if k == kind]
+        if not rows:
+            continue
+        execute_values(
+            cur,
+            f"""
+            WITH moved AS (
+                UPDATE {table} b SET trainer_id = v.trainer_id
+                FROM (VALUES %s) AS v(booking_id, trainer_id, old_trainer_id)
+                WHERE b.{key} = v.booking_id AND b.trainer_id = v.old_trainer_id
+                RETURNING b.{key} AS booking_id, v.trainer_id, v.old_trainer_id
+            )
+            INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload)
+            SELECT '{table}', booking_id, '{event_type}',
+                   jsonb_build_object('trainer_id', trainer_id, 'old_trainer_id', old_trainer_id)
+            FROM moved;
+            """,
+            rows
+        )
+
+
 def set_trainer_availability(user):
     print("\n=== Set Trainer Availability ===")
 
@@ -361,6 +2200,7 @@ def set_trainer_availability(user):
             return
 
         old_start, old_end = row
+        con.rollback()
 
         print("Current availability:")
         print("  Start:", old_start)
@@ -386,6 +2226,55 @@ def set_trainer_availability(user):
             con.close()
             return
 
+        # Future bookings the new window would leave outside the trainer's hours.
+        # This is only a preview: the choice is made with no transaction open,
+        # and the list is read again under the lock before anything is saved.
+        orphans = find_orphaned_bookings(cur, trainer_id, new_start, new_end)
+        con.rollback()
+        previewed = {(kind, b_id) for kind, b_id, _s_at, _dur in orphans}
+        reassign = False
+        if orphans:
+            print(f"\n{len(orphans)} upcoming bookings fall outside the new hours:")
+            for kind, b_id, s_at, dur in orphans:
+                print(f"  {kind} {b_id} at {s_at} ({dur} min)")
+            print("1. Save and hand these bookings to other available trainers")
+            print("2. Save and keep these bookings")
+            print("3. Cancel")
+            choice = input("Choose: ").strip()
+            if choice not in ("1", "2"):
+                print("Availability not changed.")
+                cur.close()
+                con.close()
+                return
+            reassign = choice == "1"
+
+        # Lock this trainer, plus every trainer that could take over one of
+        # the bookings, in one call so the lock order is kept. No booking
+        # for them can be made until the new window is committed.
+        locked = set()
+        if reassign:
+            candidates = reassignment_candidates(cur, trainer_id, orphans)
+            locked = {t for ids in candidates.values() for t in ids}
+        lock_booking_resources(cur, trainer_id=locked | {trainer_id})
+
+        orphans = find_orphaned_bookings(cur, trainer_id, new_start, new_end)
+        plan = {}
+        if reassign:
+            plan, unplaced = plan_trainer_reassignment(cur, trainer_id, orphans, locked)
+            for (kind, b_id), new_trainer in plan.items():
+                print(f"  {kind} {b_id} -> trainer {new_trainer}")
+            if unplaced:
+                print(f"No other trainer is free for {len(unplaced)} bookings; they stay with you:")
+                for kind, b_id in unplaced:
+                    print(f"  {kind} {b_id}")
+            apply_trainer_reassignment(cur, trainer_id, plan)
+        else:
+            added = [o for o in orphans if (o[0], o[1]) not in previewed]
+            if added:
+                print(f"{len(added)} more bookings were made outside the new hours meanwhile; they stay with you:")
+                for kind, b_id, s_at, dur in added:
+                    print(f"  {kind} {b_id} at {s_at} ({dur} min)")
+
         cur.execute(
             "UPDATE Trainer "
             "SET start_time = %s, end_time = %s "
@@ -394,9 +2283,12 @@ def set_trainer_availability(user):
         )
 
         con.commit()
+        remember_write(cur, user["user_id"])
         cur.close()
         con.close()
         print("Availability updated.")
+        if plan:
+            print(f"Reassigned {len(plan)} bookings.")
     except Exception as e:
         print("Error updating availability:", e)
 
@@ -411,8 +2303,9 @@ def trainer_schedule_view(user):
         print("No trainer record found.")
         return
 
+    con = None
     try:
-        con = get_connection()
+        con = get_read_connection(user["user_id"])
         cur = con.cursor()
 
         # Upcoming PT sessions
@@ -444,7 +2337,7 @@ def trainer_schedule_view(user):
         classes = cur.fetchall()
 
         cur.close()
-        con.close()
+        release_connection(con)
 
         print("\n--- Upcoming PT Sessions ---")
         if pt_sessions:
@@ -461,9 +2354,552 @@ def trainer_schedule_view(user):
             print("No upcoming classes.")
 
     except Exception as e:
+        release_connection(con)
         print("Error loading schedule:", e)
 
 
+# ---------- LIVE SCHEDULE PUSH ----------
+
+# Booking triggers NOTIFY the schedule_changes channel on commit (see DDL.sql).
+# One listener process per location LISTENs on a single connection, merges the
+# notifications that arrive within LIVE_COALESCE_SECONDS, and hands them to
+# screens long-polling GET /changes. Screens then fetch GET /schedule only for
+# the trainer/room days that changed; those day schedules are cached in the
+# listener until the next change, so many screens on one trainer cost one query.
+#
+#   python project.py live-server [port] [location_id]
+
+SCHEDULE_CHANNEL = "schedule_changes"
+LIVE_HTTP_PORT = 8765
+LIVE_SERVER_URL = "http://localhost:8765"
+LIVE_COALESCE_SECONDS = 0.5
+LIVE_POLL_TIMEOUT = 25
+LIVE_HISTORY_SIZE = 1000
+
+
+def day_schedule(kind, entity_id, day, location_id=None):
+    """Bookings for one trainer or room on one day, as JSON-ready dicts.
+
+    Always read from the primary: the result is cached until the next NOTIFY,
+    and a replica may not have replayed the change that NOTIFY announced.
+    """
+    column = {"trainer": "trainer_id", "room": "room_id"}[kind]
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+
+    con = get_pooled_connection("primary", location_id)
+    try:
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT 'PT' AS kind, session_id, session_at, duration_minutes,
+                   trainer_id, room_id, member_id, NULL AS class_name
+            FROM PTSession
+            WHERE {column} = %s AND session_at >= %s AND session_at < %s
+            UNION ALL
+            SELECT 'CLASS', class_id, scheduled_at, duration_minutes,
+                   trainer_id, room_id, NULL, class_name
+            FROM GroupClass
+            WHERE {column} = %s AND scheduled_at >= %s AND scheduled_at < %s
+            ORDER BY 3, 2;
+            """,
+            (entity_id, day_start, day_end, entity_id, day_start, day_end)
+        )
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        release_connection(con)
+
+    return [
+        {"kind": r[0], "id": r[1], "start": r[2].strftime(TIME_FORMAT),
+         "duration_minutes": r[3], "trainer_id": r[4], "room_id": r[5],
+         "member_id": r[6], "class_name": r[7]}
+        for r in rows
+    ]
+
+
+class ScheduleBroadcaster:
+    """Versioned log of changed (kind, id, day) keys that long-pollers wait on."""
+
+    def __init__(self, location_id=None):
+        self.location_id = location_id
+        self.version = 0
+        self.floor = 0  # changes up to this version are no longer in history
+        self.history = []  # (version, keys), oldest first
+        self.cache = {}
+        self.cond = threading.Condition()
+
+    def publish(self, keys):
+        with self.cond:
+            self.version += 1
+            self.history.append((self.version, keys))
+            if len(self.history) > LIVE_HISTORY_SIZE:
+                del self.history[:-LIVE_HISTORY_SIZE]
+                self.floor = self.history[0][0] - 1
+            for key in keys:
+                self.cache.pop(key, None)
+            self.cond.notify_all()
+
+    def reset(self):
+        """Tell every screen to reload, e.g. after notifications may have been missed."""
+        with self.cond:
+            self.version += 1
+            self.floor = self.version
+            self.history = []
+            self.cache.clear()
+            self.cond.notify_all()
+
+    def changes_since(self, since, subscriptions, timeout=LIVE_POLL_TIMEOUT):
+        """Wait until a subscribed key changes after version since.
+
+        Returns (version, keys). keys is None when since is older than the
+        kept history, meaning the screen should reload everything.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if since < self.floor:
+                    return self.version, None
+                changed = set()
+                for version, keys in self.history:
+                    if version > since:
+                        changed.update(k for k in keys if k[:2] in subscriptions)
+                if changed:
+                    return self.version, changed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self.version, changed
+                self.cond.wait(remaining)
+
+    def schedule(self, kind, entity_id, day):
+        key = (kind, entity_id, day)
+        with self.cond:
+            if key in self.cache:
+                return self.cache[key]
+            version = self.version
+        rows = day_schedule(kind, entity_id, day, self.location_id)
+        with self.cond:
+            # Only cache if nothing was published while we were querying.
+            if self.version == version:
+                self.cache[key] = rows
+        return rows
+
+
+def _notify_keys(payload):
+    data = json.loads(payload)
+    day = datetime.strptime(data["day"], DATE_FORMAT).date()
+    keys = set()
+    if data.get("trainer_id") is not None:
+        keys.add(("trainer", data["trainer_id"], day))
+    if data.get("room_id") is not None:
+        keys.add(("room", data["room_id"], day))
+    return keys
+
+
+def listen_for_schedule_changes(broadcaster, stop_event, location_id=None):
+    """LISTEN on one dedicated connection and publish coalesced change sets."""
+    while not stop_event.is_set():
+        con = None
+        try:
+            con = get_connection(location_id)
+            con.autocommit = True
+            cur = con.cursor()
+            cur.execute(f"LISTEN {SCHEDULE_CHANNEL};")
+            # Anything may have changed while we were not listening.
+            broadcaster.reset()
+
+            pending = set()
+            flush_at = None
+            while not stop_event.is_set():
+                wait = 1.0 if flush_at is None else max(0.0, flush_at - time.monotonic())
+                if select.select([con], [], [], wait)[0]:
+                    con.poll()
+                    while con.notifies:
+                        pending |= _notify_keys(con.notifies.pop(0).payload)
+                    if pending and flush_at is None:
+                        flush_at = time.monotonic() + LIVE_COALESCE_SECONDS
+                if flush_at is not None and time.monotonic() >= flush_at:
+                    broadcaster.publish(pending)
+                    pending = set()
+                    flush_at = None
+            cur.close()
+        except psycopg2.Error as e:
+            print("Schedule listener lost its connection, retrying:", e)
+            stop_event.wait(2)
+        finally:
+            if con is not None:
+                con.close()
+
+
+class LiveScheduleHandler(BaseHTTPRequestHandler):
+    """GET /changes?since=V&trainer=ID&room=ID  (long-poll)
+    GET /schedule?trainer=ID&day=YYYY-MM-DD  or  ?room=ID&day=..."""
+
+    broadcaster = None
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            subscriptions = set()
+            for kind in ("trainer", "room"):
+                for value in query.get(kind, []):
+                    subscriptions.add((kind, int(value)))
+
+            if url.path == "/changes":
+                since = int(query.get("since", ["0"])[0])
+                version, keys = self.broadcaster.changes_since(since, subscriptions)
+                changes = None if keys is None else [
+                    {"kind": k, "id": i, "day": d.strftime(DATE_FORMAT)}
+                    for k, i, d in sorted(keys)
+                ]
+                self._send_json(200, {"version": version, "changes": changes})
+            elif url.path == "/schedule" and len(subscriptions) == 1:
+                kind, entity_id = subscriptions.pop()
+                day = datetime.strptime(query["day"][0], DATE_FORMAT).date()
+                rows = self.broadcaster.schedule(kind, entity_id, day)
+                self._send_json(200, {"kind": kind, "id": entity_id,
+                                      "day": day.strftime(DATE_FORMAT), "bookings": rows})
+            else:
+                self._send_json(404, {"error": "unknown request"})
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+        except psycopg2.Error as e:
+            self._send_json(503, {"error": str(e).strip()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_live_schedule_server(port=LIVE_HTTP_PORT, location_id=None):
+    location_id = location_id or get_active_location()
+    broadcaster = ScheduleBroadcaster(location_id)
+    stop_event = threading.Event()
+    listener = threading.Thread(
+        target=listen_for_schedule_changes,
+        args=(broadcaster, stop_event, location_id),
+        daemon=True,
+    )
+    listener.start()
+
+    handler = type("BoundLiveScheduleHandler", (LiveScheduleHandler,), {"broadcaster": broadcaster})
+    server = ThreadingHTTPServer(("", port), handler)
+    server.daemon_threads = True
+    print(f"Live schedule server for location {location_id} on port {port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
+def _live_get(path, timeout):
+    with urlopen(LIVE_SERVER_URL + path, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def trainer_live_schedule(user):
+    """Show today's schedule and redraw it only when the listener reports a change."""
+    print("\n=== Live Schedule (Ctrl+C to stop) ===")
+
+    trainer_id = get_trainer_id(user["user_id"])
+    if trainer_id is None:
+        print("No trainer record found.")
+        return
+
+    since = 0
+    reload = True
+    shown_day = None
+    try:
+        while True:
+            today = datetime.now().strftime(DATE_FORMAT)
+            # Past midnight: draw the new day even if nothing changed in it.
+            # The long-poll returns at least every LIVE_POLL_TIMEOUT seconds.
+            if reload or today != shown_day:
+                shown_day = today
+                schedule = _live_get(f"/schedule?trainer={trainer_id}&day={today}", 10)
+                print(f"\n--- {today} ---")
+                if schedule["bookings"]:
+                    for b in schedule["bookings"]:
+                        what = b["class_name"] or f"PT with member {b['member_id']}"
+                        print(f"- {b['start']}, {b['duration_minutes']} min, {what}, room {b['room_id']}")
+                else:
+                    print("Nothing booked today.")
+
+            result = _live_get(f"/changes?since={since}&trainer={trainer_id}",
+                               LIVE_POLL_TIMEOUT + 10)
+            since = result["version"]
+            changes = result["changes"]
+            reload = changes is None or any(c["day"] == today for c in changes)
+    except KeyboardInterrupt:
+        print()
+    except (OSError, ValueError) as e:
+        print("Live schedule server not reachable:", e)
+        print("Start it with: python project.py live-server")
+
+
+# ---------- SCHEDULE EXPORT (iCal / CSV) ----------
+
+EXPORT_FETCH_SIZE = 2000
+DATE_FORMAT = "%Y-%m-%d"
+
+# Every export query returns rows shaped as:
+# (kind, booking_id, start, end, trainer_id, trainer_name, room_id, room_name, member_id, class_name)
+BOOKING_EXPORT_SQL = """
+    SELECT 'PT'::text, p.session_id, p.session_at,
+           p.session_at + (p.duration_minutes * INTERVAL '1 minute'),
+           p.trainer_id, t.name, p.room_id, r.name, p.member_id, NULL::text
+    FROM PTSession p
+    JOIN Trainer t ON t.trainer_id = p.trainer_id
+    JOIN Room    r ON r.room_id = p.room_id
+    WHERE {pt_filter}
+      AND p.session_at >= %(range_start)s AND p.session_at < %(range_end)s
+    UNION ALL
+    SELECT 'CLASS'::text, g.class_id, g.scheduled_at,
+           g.scheduled_at + (g.duration_minutes * INTERVAL '1 minute'),
+           g.trainer_id, t.name, g.room_id, r.name, NULL::int, g.class_name
+    FROM GroupClass g
+    JOIN Trainer t ON t.trainer_id = g.trainer_id
+    JOIN Room    r ON r.room_id = g.room_id
+    WHERE {class_filter}
+      AND g.scheduled_at >= %(range_start)s AND g.scheduled_at < %(range_end)s
+    ORDER BY 3, 1, 2
+"""
+
+MEMBER_EXPORT_SQL = """
+    SELECT schedule_type, COALESCE(session_id, class_id), start_time, end_time,
+           trainer_id, trainer_name, room_id, room_name, member_id, class_name
+    FROM MemberFullScheduleView
+    WHERE member_id = %(scope_id)s
+      AND start_time >= %(range_start)s AND start_time < %(range_end)s
+    ORDER BY start_time, schedule_type
+"""
+
+EXPORT_SCOPE_FILTERS = {
+    "trainer": ("p.trainer_id = %(scope_id)s", "g.trainer_id = %(scope_id)s"),
+    "room": ("p.room_id = %(scope_id)s", "g.room_id = %(scope_id)s"),
+    "club": ("TRUE", "TRUE"),
+}
+
+
+def _stream_export_rows(sql, params, location_id):
+    con = get_read_connection(location_id=location_id)
+    try:
+        cur = con.cursor(name="schedule_export")
+        cur.itersize = EXPORT_FETCH_SIZE
+        cur.execute(sql, params)
+        for row in cur:
+            yield location_id, row
+        cur.close()
+    finally:
+        release_connection(con)
+
+
+def iter_schedule_rows(scope, scope_id, range_start, range_end):
+    """Yield (location_id, row) for a trainer, member, room or the whole club, oldest first.
+
+    Rows come through a server-side (named) cursor EXPORT_FETCH_SIZE at a
+    time, so memory use does not grow with the size of the export. Trainers,
+    rooms and the club belong to the active location; a member can book at
+    any location, so a member export streams every shard and merges by start.
+    """
+    params = {"scope_id": scope_id, "range_start": range_start, "range_end": range_end}
+    if scope == "member":
+        streams = [_stream_export_rows(MEMBER_EXPORT_SQL, params, location_id)
+                   for location_id in LOCATION_SHARDS]
+        yield from heapq.merge(*streams, key=lambda item: (item[1][2], item[1][0]))
+    elif scope in EXPORT_SCOPE_FILTERS:
+        pt_filter, class_filter = EXPORT_SCOPE_FILTERS[scope]
+        sql = BOOKING_EXPORT_SQL.format(pt_filter=pt_filter, class_filter=class_filter)
+        yield from _stream_export_rows(sql, params, _active_location)
+    else:
+        raise ValueError(f"Unknown export scope: {scope}")
+
+
+def _ical_escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _ical_fold(line):
+    """Fold a content line to 75 octets as RFC 5545 requires."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts = []
+    while len(raw) > 75:
+        cut = 75 if not parts else 74
+        # don't split a multi-byte character
+        while cut > 0 and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(raw[:cut].decode("utf-8"))
+        raw = raw[cut:]
+    parts.append(raw.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _export_uid(kind, booking_id, location_id):
+    # booking ids are per shard; keep the original form for the home location
+    # so calendars that imported an earlier export update instead of duplicating
+    if location_id == HOME_LOCATION_ID:
+        return f"{kind.lower()}-{booking_id}@fitness-club"
+    return f"{kind.lower()}-{booking_id}@location-{location_id}.fitness-club"
+
+
+def ical_lines(rows, calendar_name):
+    """Turn (location_id, row) export rows into iCalendar text, one folded line at a time."""
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield _ical_fold("BEGIN:VCALENDAR")
+    yield _ical_fold("VERSION:2.0")
+    yield _ical_fold("PRODID:-//Fitness Club//Schedule Export//EN")
+    yield _ical_fold("CALSCALE:GREGORIAN")
+    yield _ical_fold("X-WR-CALNAME:" + _ical_escape(calendar_name))
+
+    for location_id, (kind, booking_id, start, end, trainer_id, trainer_name,
+                      room_id, room_name, member_id, class_name) in rows:
+        if kind == "PT":
+            summary = f"PT Session with {trainer_name}"
+            description = f"Trainer {trainer_id}, room {room_id}"
+            if member_id is not None:
+                description += f", member {member_id}"
+        else:
+            summary = class_name
+            description = f"Group class with {trainer_name} (trainer {trainer_id}), room {room_id}"
+
+        yield _ical_fold("BEGIN:VEVENT")
+        yield _ical_fold("UID:" + _export_uid(kind, booking_id, location_id))
+        yield _ical_fold("DTSTAMP:" + stamp)
+        yield _ical_fold("DTSTART:" + start.strftime("%Y%m%dT%H%M%S"))
+        yield _ical_fold("DTEND:" + end.strftime("%Y%m%dT%H%M%S"))
+        yield _ical_fold("SUMMARY:" + _ical_escape(summary))
+        yield _ical_fold("LOCATION:" + _ical_escape(
+            f"{room_name}, {LOCATION_SHARDS[location_id]['name']}"))
+        yield _ical_fold("DESCRIPTION:" + _ical_escape(description))
+        yield _ical_fold("END:VEVENT")
+
+    yield _ical_fold("END:VCALENDAR")
+
+
+def csv_lines(rows):
+    """Turn (location_id, row) export rows into CSV text, one line at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["type", "booking_id", "start", "end", "trainer_id", "trainer_name",
+                     "room_id", "room_name", "member_id", "class_name", "location"])
+    yield buf.getvalue()
+    for location_id, row in rows:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(list(row) + [LOCATION_SHARDS[location_id]["name"]])
+        yield buf.getvalue()
+
+
+def export_schedule(scope, scope_id, range_start, range_end, fmt, out_path):
+    """Write a schedule export to out_path. Returns the number of bookings written."""
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    rows = counted(iter_schedule_rows(scope, scope_id, range_start, range_end))
+    if fmt == "ics":
+        name = "Fitness Club" if scope == "club" else f"Fitness Club {scope} {scope_id}"
+        lines = ical_lines(rows, name)
+    elif fmt == "csv":
+        lines = csv_lines(rows)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    with open(out_path, "w", newline="", encoding="utf-8") as out:
+        for line in lines:
+            out.write(line)
+    return count
+
+
+def prompt_and_export_schedule(scope, scope_id):
+    """Ask for date range/format/file, then run export_schedule."""
+    print(f"Date range (format {DATE_FORMAT}); the end date is exclusive.")
+    start_str = input("From date: ").strip()
+    end_str = input("To date: ").strip()
+    try:
+        range_start = datetime.strptime(start_str, DATE_FORMAT)
+        range_end = datetime.strptime(end_str, DATE_FORMAT)
+    except ValueError:
+        print("Invalid date format.")
+        return
+    if range_start >= range_end:
+        print("From date must be before to date.")
+        return
+
+    fmt = input("Format (ics/csv, default ics): ").strip().lower() or "ics"
+    if fmt not in ("ics", "csv"):
+        print("Invalid format.")
+        return
+    default_path = f"schedule_{scope}{'' if scope_id is None else '_' + str(scope_id)}.{fmt}"
+    out_path = input(f"Output file (default {default_path}): ").strip() or default_path
+
+    try:
+        count = export_schedule(scope, scope_id, range_start, range_end, fmt, out_path)
+        print(f"Exported {count} bookings to {out_path}.")
+    except Exception as e:
+        print("Error exporting schedule:", e)
+
+
+def trainer_export_schedule(user):
+    print("\n=== Export Trainer Schedule ===")
+    trainer_id = get_trainer_id(user["user_id"])
+    if trainer_id is None:
+        print("No trainer record found.")
+        return
+    prompt_and_export_schedule("trainer", trainer_id)
+
+
+def member_export_schedule(user):
+    print("\n=== Export My Schedule ===")
+    member_id = get_member_id(user["user_id"])
+    if member_id is None:
+        print("No member record found.")
+        return
+    prompt_and_export_schedule("member", member_id)
+
+
+def admin_export_schedules(user):
+    print("\n=== Export Schedules ===")
+    print("1. Trainer")
+    print("2. Member")
+    print("3. Room")
+    print("4. Whole club")
+    choice = input("Choose: ").strip()
+
+    scopes = {"1": "trainer", "2": "member", "3": "room", "4": "club"}
+    if choice not in scopes:
+        print("Invalid choice.")
+        return
+    scope = scopes[choice]
+
+    scope_id = None
+    if scope != "club":
+        scope_id = resolve_id(scope, input(f"{scope.capitalize()} ID (or name to search): "))
+        if scope_id is None:
+            print(f"Invalid {scope} id.")
+            return
+
+    prompt_and_export_schedule(scope, scope_id)
+
+
 # ---------- MEMBER: PROFILE MANAGEMENT ----------
 
 def update_member_profile(user):
@@ -475,7 +2911,7 @@ def update_member_profile(user):
         return
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
@@ -513,8 +2949,10 @@ def update_member_profile(user):
         )
 
         con.commit()
+        remember_write(cur, user["user_id"], HOME_LOCATION_ID)
         cur.close()
         con.close()
+        sync_accounts_to_shards([member_id])
         print("Profile updated.")
     except Exception as e:
         print("Error updating profile:", e)
@@ -538,7 +2976,7 @@ def set_fitness_goal(user):
         return
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
@@ -548,6 +2986,7 @@ def set_fitness_goal(user):
         )
 
         con.commit()
+        remember_write(cur, user["user_id"], HOME_LOCATION_ID)
         cur.close()
         con.close()
         print("Fitness goal saved.")
@@ -569,7 +3008,7 @@ def add_health_metric(user):
     hr = input("Heart rate (optional): ").strip() or None
 
     try:
-        con = get_connection()
+        con = get_home_connection()
         cur = con.cursor()
 
         cur.execute(
@@ -579,6 +3018,7 @@ def add_health_metric(user):
         )
 
         con.commit()
+        remember_write(cur, user["user_id"], HOME_LOCATION_ID)
         cur.close()
         con.close()
         print("Health metric recorded.")
@@ -610,10 +3050,13 @@ def schedule_pt_session(user):
     except ValueError:
         print("Invalid duration.")
         return
+    if not 0 < duration <= MAX_BOOKING_MINUTES:
+        print(f"Duration must be between 1 and {MAX_BOOKING_MINUTES} minutes.")
+        return
 
     # Get available rooms and trainers
-    available_rooms = get_available_rooms(new_start, duration)
-    available_trainers = get_available_trainers(new_start, duration)
+    available_rooms = get_available_rooms(new_start, duration, user_id=user["user_id"])
+    available_trainers = get_available_trainers(new_start, duration, user_id=user["user_id"])
 
     if not available_rooms:
         print("No rooms available at that time.")
@@ -642,22 +3085,32 @@ def schedule_pt_session(user):
         print("Selected trainer not in available list.")
         return
 
-    # Final check
-    if not check_trainer_and_room_availability(trainer_id, room_id, new_start, duration):
-        print("No trainer/room available (conflict detected).")
-        return
-
     try:
+        ensure_booking_months(new_start)
         con = get_connection()
         cur = con.cursor()
 
+        # Final check, under locks in the same transaction as the insert
+        if not check_trainer_and_room_availability(cur, trainer_id, room_id, new_start, duration):
+            print("No trainer/room available (conflict detected).")
+            con.rollback()
+            cur.close()
+            con.close()
+            return
+
         cur.execute(
             "INSERT INTO PTSession (member_id, trainer_id, room_id, session_at, duration_minutes) "
-            "VALUES (%s, %s, %s, %s, %s);",
+            "VALUES (%s, %s, %s, %s, %s) RETURNING session_id;",
             (member_id, trainer_id, room_id, new_start, duration)
         )
+        session_id = cur.fetchone()[0]
+        record_event(cur, "PTSession", session_id, "pt_session.scheduled", {
+            "member_id": member_id, "trainer_id": trainer_id, "room_id": room_id,
+            "session_at": new_start, "duration_minutes": duration,
+        })
 
         con.commit()
+        remember_write(cur, user["user_id"])
         cur.close()
         con.close()
         print("PT session scheduled.")
@@ -707,6 +3160,16 @@ def reschedule_pt_session(user):
             cur.close()
             con.close()
             return
+        if not 0 < duration <= MAX_BOOKING_MINUTES:
+            print(f"Duration must be between 1 and {MAX_BOOKING_MINUTES} minutes.")
+            cur.close()
+            con.close()
+            return
+
+        # Nothing written yet: end the read transaction so the new month's
+        # partition can be created if it is missing
+        con.rollback()
+        ensure_booking_months(new_start)
 
         # Get trainer_id from that session
         cur.execute(
@@ -730,9 +3193,11 @@ def reschedule_pt_session(user):
             con.close()
             return
 
-        # Check availability
-        if not check_trainer_and_room_availability(trainer_id, room_id, new_start, duration):
+        # Check availability (ignoring the session being moved)
+        if not check_trainer_and_room_availability(cur, trainer_id, room_id, new_start, duration,
+                                                   exclude_session_id=int(session_id_str)):
             print("No trainer/room available (conflict detected).")
+            con.rollback()
             cur.close()
             con.close()
             return
@@ -743,8 +3208,13 @@ def reschedule_pt_session(user):
             "WHERE session_id = %s AND member_id = %s;",
             (new_start, room_id, duration, session_id_str, member_id)
         )
+        record_event(cur, "PTSession", int(session_id_str), "pt_session.rescheduled", {
+            "member_id": member_id, "trainer_id": trainer_id, "room_id": room_id,
+            "session_at": new_start, "duration_minutes": duration,
+        })
 
         con.commit()
+        remember_write(cur, user["user_id"])
         cur.close()
         con.close()
         print("PT session rescheduled.")
@@ -762,67 +3232,16 @@ def register_group_class(user):
         print("No member record found.")
         return
     
+    # 1. Let the member pick from the upcoming class catalog
+    class_id = choose_from_class_catalog(prompt_class_catalog_filters(), user["user_id"])
+    if class_id is None:
+        print("Registration cancelled.")
+        return
+
     try:
-        con = get_connection()
+        con = get_pooled_connection()
         cur = con.cursor()
 
-        # 1. List upcoming group classes with their capacity and current registrations
-        cur.execute(
-            """
-            SELECT gc.class_id,
-                   gc.class_name,
-                   gc.scheduled_at,
-                   gc.duration_minutes,
-                   gc.room_id,
-                   gc.trainer_id,
-                   gc.capacity
-            FROM GroupClass gc
-            WHERE gc.scheduled_at >= NOW()
-            ORDER BY gc.scheduled_at;
-            """
-        )
-        classes = cur.fetchall()
-
-        if not classes:
-            print("No upcoming group classes available.")
-            cur.close()
-            con.close()
-            return
-        
-        class_ids = [row[0] for row in classes]
-        cur.execute(
-            "SELECT class_id, COUNT(*) FROM ClassRegistration "
-            "WHERE class_id = ANY(%s) GROUP BY class_id;",
-            (class_ids,)
-        )
-        reg_counts_rows = cur.fetchall()
-        reg_counts = {r[0]: r[1] for r in reg_counts_rows}
-
-        print("\nUpcoming classes:")
-        for cls in classes:
-            cid, cname, sched, dur, room_id, trainer_id, cap = cls
-            reg_count = reg_counts.get(cid, 0)
-            spots_left = cap - reg_count
-            print(
-                f"  ID {cid}: {cname} at {sched} ({dur} min), room {room_id}, "
-                f"trainer {trainer_id} -> {reg_count}/{cap} registered, {spots_left} spots left"
-            )
-
-        class_id_str = input("Enter class ID to register (or press Enter to cancel): ").strip()
-        if not class_id_str:
-            print("Registration cancelled.")
-            cur.close()
-            con.close()
-            return
-        
-        if not class_id_str.isdigit():
-            print("Invalid class ID. Registration cancelled.")
-            cur.close()
-            con.close()
-            return
-        
-        class_id = int(class_id_str)
-
         # 2. Get selected class details
         cur.execute(
             """
@@ -836,7 +3255,7 @@ def register_group_class(user):
         if not row:
             print("Class not found. Registration cancelled.")
             cur.close()
-            con.close()
+            release_connection(con)
             return
         
         cid, cname, scheduled_at, duration_minutes, room_id, trainer_id, class_capacity = row
@@ -846,7 +3265,7 @@ def register_group_class(user):
         if scheduled_at < now:
             print("Cannot register: class has already started or is in the past.")
             cur.close()
-            con.close()
+            release_connection(con)
             return
         
         # Check if member already registered
@@ -857,28 +3276,27 @@ def register_group_class(user):
         if cur.fetchone():
             print("You are already registered for this class.")
             cur.close()
-            con.close()
+            release_connection(con)
             return
         
-        cur.execute(
-            "SELECT COUNT(*) FROM ClassRegistration WHERE class_id = %s;",
-            (class_id,)
-        )
+        execute_prepared(cur, "registration_count", (class_id, scheduled_at))
         reg_count = cur.fetchone()[0]
 
         if reg_count >= class_capacity:
             print("Class is full. Cannot register.")
             cur.close()
-            con.close()
+            release_connection(con)
             return
         
         new_start = scheduled_at
         new_end = scheduled_at + timedelta(minutes=duration_minutes)
+        scan_from, scan_to = overlap_scan_bounds(new_start, new_end)
 
         cur.execute(
             "SELECT class_id, scheduled_at, duration_minutes "
-            "FROM GroupClass WHERE room_id = %s AND class_id != %s;",
-            (room_id, class_id)
+            "FROM GroupClass WHERE room_id = %s AND class_id != %s "
+            "AND scheduled_at > %s AND scheduled_at < %s;",
+            (room_id, class_id, scan_from, scan_to)
         )
         other_classes = cur.fetchall()
         for oc_id, oc_start, oc_dur in other_classes:
@@ -889,12 +3307,13 @@ def register_group_class(user):
                     f"room {room_id} and overlaps this class."
                 )
                 cur.close()
-                con.close()
+                release_connection(con)
                 return
         
         cur.execute(
-            "SELECT session_at, duration_minutes FROM PTSession WHERE room_id = %s;",
-            (room_id,)
+            "SELECT session_at, duration_minutes FROM PTSession "
+            "WHERE room_id = %s AND session_at > %s AND session_at < %s;",
+            (room_id, scan_from, scan_to)
         )
         pt_in_room = cur.fetchall()
         for s_at, s_dur in pt_in_room:
@@ -905,12 +3324,13 @@ def register_group_class(user):
                     f"that overlaps this class."
                 )
                 cur.close()
-                con.close()
+                release_connection(con)
                 return
         
         cur.execute(
-            "SELECT session_at, duration_minutes FROM PTSession WHERE member_id = %s;",
-            (member_id,)
+            "SELECT session_at, duration_minutes FROM PTSession "
+            "WHERE member_id = %s AND session_at > %s AND session_at < %s;",
+            (member_id, scan_from, scan_to)
         )
         member_pt = cur.fetchall()
         for s_at, s_dur in member_pt:
@@ -918,17 +3338,17 @@ def register_group_class(user):
             if times_overlap(new_start, new_end, s_at, s_end):
                 print("Cannot register: you have a PT session that overlaps this class.")
                 cur.close()
-                con.close()
+                release_connection(con)
                 return
             
         cur.execute(
             """
             SELECT gc.class_id, gc.scheduled_at, gc.duration_minutes
             FROM ClassRegistration cr
-            JOIN GroupClass gc ON cr.class_id = gc.class_id
-            WHERE cr.member_id = %s;
+            JOIN GroupClass gc ON cr.class_id = gc.class_id AND cr.scheduled_at = gc.scheduled_at
+            WHERE cr.member_id = %s AND cr.scheduled_at > %s AND cr.scheduled_at < %s;
             """,
-            (member_id,)
+            (member_id, scan_from, scan_to)
         )
         member_classes = cur.fetchall()
         for m_cid, m_start, m_dur in member_classes:
@@ -939,18 +3359,22 @@ def register_group_class(user):
                     "which overlaps this class."
                 )
                 cur.close()
-                con.close()
+                release_connection(con)
                 return
 
         try:
             cur.execute(
-                "INSERT INTO ClassRegistration (class_id, member_id) "
-                "VALUES (%s, %s) RETURNING registration_id;",
-                (class_id, member_id)
+                "INSERT INTO ClassRegistration (class_id, member_id, scheduled_at) "
+                "VALUES (%s, %s, %s) RETURNING registration_id;",
+                (class_id, member_id, scheduled_at)
             )
             res = cur.fetchone()
             if res:
+                record_event(cur, "ClassRegistration", res[0], "class.registered", {
+                    "class_id": class_id, "member_id": member_id,
+                })
                 con.commit()
+                remember_write(cur, user["user_id"])
                 print("Successfully registered for the class.")
             else:
                 con.rollback()
@@ -963,11 +3387,12 @@ def register_group_class(user):
             else:
                 print("Registration failed:", e)
         cur.close()
-        con.close()
+        release_connection(con)
 
     except Exception as e:
         try:
             con.rollback()
+            release_connection(con)
         except:
             pass
         print("Error registering for class:", e)
@@ -983,67 +3408,30 @@ def member_dashboard(user):
         print("No member record found.")
         return
 
+    con = None
     try:
-        con = get_connection()
+        con = get_read_connection(user["user_id"], HOME_LOCATION_ID)
         cur = con.cursor()
 
-        cur.execute(
-            """
-            SELECT height, weight, bfp, heart_rate, measured_at
-            FROM HealthMetric
-            WHERE member_id = %s
-            ORDER BY measured_at DESC
-            LIMIT 1;
-            """,
-            (member_id,)
-        )
+        execute_prepared(cur, "dashboard_latest_health", (member_id,))
         health = cur.fetchone()
 
-        cur.execute(
-            """
-            SELECT goal_type, target_value, start_date, end_date
-            FROM FitnessGoal
-            WHERE member_id = %s
-              AND end_date >= CURRENT_DATE
-            ORDER BY end_date;
-            """,
-            (member_id,)
-        )
+        execute_prepared(cur, "dashboard_active_goals", (member_id,))
         goals = cur.fetchall()
 
-        cur.execute(
-            """
-            SELECT COUNT(*)
-            FROM MemberFullScheduleView
-            WHERE member_id = %s
-              AND schedule_type = 'CLASS'
-              AND end_time < NOW();
-            """,
-            (member_id,)
-        )
-        past_class_count = cur.fetchone()[0]
+        if len(LOCATION_SHARDS) == 1:
+            execute_prepared(cur, "dashboard_past_class_count", (member_id,))
+            past_class_count = cur.fetchone()[0]
 
-        cur.execute(
-            """
-            SELECT schedule_type,
-                   start_time,
-                   end_time,
-                   trainer_id,
-                   room_id,
-                   class_id,
-                   class_name
-            FROM MemberFullScheduleView
-            WHERE member_id = %s
-              AND start_time >= NOW()
-            ORDER BY start_time
-            LIMIT 10;
-            """,
-            (member_id,)
-        )
-        full_schedule = cur.fetchall()
+            execute_prepared(cur, "dashboard_upcoming_schedule", (member_id,))
+            full_schedule = cur.fetchall()
+        else:
+            # Bookings live in each location's shard
+            past_class_count = member_global_past_class_count(member_id)
+            full_schedule = [row for _loc, row in member_global_schedule(member_id)]
 
         cur.close()
-        con.close()
+        release_connection(con)
 
         # ---- Print section by section ----
         print("\n--- Latest Health Stats ---")
@@ -1082,6 +3470,7 @@ def member_dashboard(user):
             print("No upcoming PT sessions or group classes.")
 
     except Exception as e:
+        release_connection(con)
         print("Error loading dashboard:", e)
 
 #----------ADMIN-EQUIPMENT MAINTENANCE MENU------------
@@ -1092,16 +3481,19 @@ def admin_equipment_maintenance(user):
         print("1. Log new issue")
         print("2. View tickets")
         print("3. Update ticket status")
-        print("4. Back")
+        print("4. Technician work queue")
+        print("5. Back")
         choice = input("Choose: ").strip()
 
         if choice == "1":
-            admin_log_maintenance_issue()
+            admin_log_maintenance_issue(user)
         elif choice == "2":
-            admin_view_tickets()
+            admin_view_tickets(user)
         elif choice == "3":
-            admin_update_ticket_status()
+            admin_update_ticket_status(user)
         elif choice == "4":
+            admin_ticket_work_queue(user)
+        elif choice == "5":
             break
         else:
             print("Invalid choice.")
@@ -1109,14 +3501,13 @@ def admin_equipment_maintenance(user):
 
 #----------ADMIN-LOG NEW ISSUE------------
 
-def admin_log_maintenance_issue():
+def admin_log_maintenance_issue(user=None):
     print("\n=== Log New Maintenance Issue ===")
 
-    room_id_str = input("Room ID: ").strip()
-    if not room_id_str.isdigit():
+    room_id = resolve_id("room", input("Room ID (or name to search): "))
+    if room_id is None:
         print("Invalid room id.")
         return
-    room_id = int(room_id_str)
 
     has_equipment = input("Is this for specific equipment? (y/n): ").strip().lower()
     equipment_no = None
@@ -1172,19 +3563,65 @@ def admin_log_maintenance_issue():
                 return
 
         issue = input("Issue description: ").strip()
-        priority = input("Priority (e.g. LOW/MEDIUM/HIGH): ").strip() or "MEDIUM"
-        status = "OPEN"  # default for new tickets
+        priority = parse_enum(
+            TicketPriority, input("Priority (CRITICAL/HIGH/MEDIUM/LOW, Enter for MEDIUM): "),
+            default=TicketPriority.MEDIUM
+        )
+        if priority is None:
+            print("Invalid priority.")
+            cur.close()
+            con.close()
+            return
+        status = TicketStatus.OPEN  # default for new tickets
+
+        # Out of service: a room-level blocking ticket stops the room from being
+        # booked until the ticket is closed or the end time passes. Availability
+        # is per room, so equipment tickets never block anything.
+        blocks_booking = False
+        if equipment_no is None:
+            blocks_booking = input("Take the room out of service? (y/n): ").strip().lower() == "y"
+        else:
+            print("Note: an equipment ticket does not stop the room from being booked; "
+                  "log a ticket for the room itself to take it out of service.")
+        out_from = out_until = None
+        if blocks_booking:
+            try:
+                from_str = input(f"Out of service from ({TIME_FORMAT}, Enter for now): ").strip()
+                out_from = datetime.strptime(from_str, TIME_FORMAT) if from_str else datetime.now()
+                until_str = input(f"Out of service until ({TIME_FORMAT}, Enter for until closed): ").strip()
+                out_until = datetime.strptime(until_str, TIME_FORMAT) if until_str else None
+            except ValueError:
+                print("Invalid date/time format.")
+                cur.close()
+                con.close()
+                return
+            if out_until is not None and out_until <= out_from:
+                print("End must be after start.")
+                cur.close()
+                con.close()
+                return
 
         # Insert ticket
+        _set_actor(cur, user["user_id"] if user else None)
         cur.execute(
             """
-            INSERT INTO MaintenanceTicket (room_id, equipment_no, issue, priority, status)
-            VALUES (%s, %s, %s, %s, %s);
+            INSERT INTO MaintenanceTicket (room_id, equipment_no, issue, priority, status,
+                                           blocks_booking, out_of_service_from, out_of_service_until)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING ticket_id;
             """,
-            (room_id, equipment_no, issue, priority, status)
+            (room_id, equipment_no, issue, priority, status,
+             blocks_booking, out_from, out_until)
         )
+        ticket_id = cur.fetchone()[0]
+        record_event(cur, "MaintenanceTicket", ticket_id, "maintenance_ticket.created", {
+            "room_id": room_id, "equipment_no": equipment_no, "issue": issue,
+            "priority": priority, "status": status, "blocks_booking": blocks_booking,
+            "out_of_service_from": out_from, "out_of_service_until": out_until,
+        })
 
         con.commit()
+        remember_write(cur)
         cur.close()
         con.close()
         print("Maintenance ticket created.")
@@ -1194,54 +3631,66 @@ def admin_log_maintenance_issue():
 
 #----------ADMIN-VIEW TICKETS------------
 
-def admin_view_tickets():
+def admin_view_tickets(user):
     print("\n=== View Maintenance Tickets ===")
     print("Filter by status? (press Enter to show all, or type e.g. OPEN/CLOSED)")
-    status_filter = input("Status filter: ").strip().upper()
+    status_filter = input("Status filter: ").strip()
+    if status_filter:
+        status_filter = parse_enum(TicketStatus, status_filter)
+        if status_filter is None:
+            print("Invalid status.")
+            return
 
+    con = None
     try:
-        con = get_connection()
+        con = get_read_connection(user["user_id"])
         cur = con.cursor()
 
         if status_filter:
             cur.execute(
                 """
-                SELECT ticket_id, room_id, equipment_no, issue, priority, status
+                SELECT ticket_id, room_id, equipment_no, issue, priority, status,
+                       blocks_booking, out_of_service_from, out_of_service_until
                 FROM MaintenanceTicket
                 WHERE status = %s
-                ORDER BY ticket_id;
+                ORDER BY priority, created_at, ticket_id;
                 """,
                 (status_filter,)
             )
         else:
             cur.execute(
                 """
-                SELECT ticket_id, room_id, equipment_no, issue, priority, status
+                SELECT ticket_id, room_id, equipment_no, issue, priority, status,
+                       blocks_booking, out_of_service_from, out_of_service_until
                 FROM MaintenanceTicket
-                ORDER BY ticket_id;
+                ORDER BY priority, created_at, ticket_id;
                 """
             )
 
         rows = cur.fetchall()
         cur.close()
-        con.close()
+        release_connection(con)
 
         if not rows:
             print("No tickets found.")
             return
 
-        for t_id, room_id, eq_no, issue, priority, status in rows:
+        for t_id, room_id, eq_no, issue, priority, status, blocks, out_from, out_until in rows:
             eq_text = f"equipment {eq_no}" if eq_no is not None else "room only"
             print(f"[{t_id}] Room {room_id}, {eq_text}")
             print(f"     Priority: {priority}, Status: {status}")
             print(f"     Issue: {issue}")
+            if blocks:
+                until_text = out_until if out_until is not None else "ticket closed"
+                print(f"     Out of service: {out_from} until {until_text}")
     except Exception as e:
+        release_connection(con)
         print("Error viewing tickets:", e)
 
 
 #----------ADMIN-UPDATE TICKETS------------
 
-def admin_update_ticket_status():
+def admin_update_ticket_status(user=None):
     print("\n=== Update Ticket Status ===")
 
     ticket_id_str = input("Ticket ID: ").strip()
@@ -1250,9 +3699,9 @@ def admin_update_ticket_status():
         return
     ticket_id = int(ticket_id_str)
 
-    new_status = input("New status (e.g. OPEN/IN_PROGRESS/CLOSED): ").strip().upper()
-    if not new_status:
-        print("Status cannot be empty.")
+    new_status = parse_enum(TicketStatus, input("New status (e.g. OPEN/IN_PROGRESS/CLOSED): "))
+    if new_status is None:
+        print("Invalid status.")
         return
 
     try:
@@ -1271,12 +3720,21 @@ def admin_update_ticket_status():
             con.close()
             return
 
+        _set_actor(cur, user["user_id"] if user else None)
+        # Reopening or closing a ticket by hand also drops any technician's claim.
         cur.execute(
-            "UPDATE MaintenanceTicket SET status = %s WHERE ticket_id = %s;",
-            (new_status, ticket_id)
+            "UPDATE MaintenanceTicket SET status = %s, "
+            "claimed_by = CASE WHEN %s = 'IN_PROGRESS' THEN claimed_by END, "
+            "claim_expires_at = CASE WHEN %s = 'IN_PROGRESS' THEN claim_expires_at END "
+            "WHERE ticket_id = %s;",
+            (new_status, new_status, new_status, ticket_id)
         )
+        record_event(cur, "MaintenanceTicket", ticket_id, "maintenance_ticket.status_changed", {
+            "old_status": row[0], "new_status": new_status.value,
+        })
 
         con.commit()
+        remember_write(cur)
         cur.close()
         con.close()
         print("Ticket status updated.")
@@ -1284,6 +3742,271 @@ def admin_update_ticket_status():
         print("Error updating ticket:", e)
 
 
+#----------ADMIN-TECHNICIAN WORK QUEUE------------
+
+# Technicians (admin accounts) pull the most urgent, oldest unresolved ticket.
+# Claiming locks the candidate row with FOR UPDATE SKIP LOCKED, so parallel
+# claims each skip past rows another technician is taking instead of waiting
+# on them, and no ticket is handed out twice. A claim is a lease: if it is not
+# renewed or finished before claim_expires_at, the ticket goes back in the queue.
+
+TICKET_LEASE_MINUTES = 30
+TICKET_CLAIM_ATTEMPTS = 3
+
+TICKET_COLUMNS = (
+    "ticket_id, room_id, equipment_no, issue, priority, status, created_at, claim_expires_at"
+)
+
+
+def _set_actor(cur, user_id):
+    """Record user_id as changed_by in TicketStatusHistory for this transaction."""
+    cur.execute("SELECT set_config('app.actor', %s, true);", (str(user_id or ""),))
+
+
+def claim_next_ticket(technician_id, lease_minutes=TICKET_LEASE_MINUTES):
+    """Claim the next ticket for technician_id; returns its row or None if the queue is empty.
+
+    If the one candidate the subquery picks is claimed by someone else just
+    before it is locked, the re-check drops it and nothing is claimed even
+    though other tickets may be free, so an empty result is retried (each
+    statement sees a fresh snapshot).
+    """
+    con = get_connection()
+    cur = con.cursor()
+    _set_actor(cur, technician_id)
+    row = None
+    for _attempt in range(TICKET_CLAIM_ATTEMPTS):
+        row = _claim_one_ticket(cur, technician_id, lease_minutes)
+        if row:
+            break
+    if row:
+        record_event(cur, "MaintenanceTicket", row[0], "maintenance_ticket.claimed", {
+            "claimed_by": technician_id, "claim_expires_at": row[7],
+        })
+    con.commit()
+    remember_write(cur)
+    cur.close()
+    con.close()
+    return row
+
+
+def _claim_one_ticket(cur, technician_id, lease_minutes):
+    cur.execute(
+        f"""
+        UPDATE MaintenanceTicket
+        SET claimed_by = %s,
+            claim_expires_at = NOW() + (%s * INTERVAL '1 minute'),
+            status = 'IN_PROGRESS'
+        WHERE ticket_id = (
+            SELECT ticket_id
+            FROM MaintenanceTicket
+            WHERE status <> 'CLOSED'
+              AND (claim_expires_at IS NULL OR claim_expires_at < NOW())
+            ORDER BY priority, created_at, ticket_id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {TICKET_COLUMNS};
+        """,
+        (technician_id, lease_minutes)
+    )
+    return cur.fetchone()
+
+
+def renew_ticket_claim(ticket_id, technician_id, lease_minutes=TICKET_LEASE_MINUTES):
+    """Extend a claim the technician still holds. Returns False if it was lost."""
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute(
+        """
+        UPDATE MaintenanceTicket
+        SET claim_expires_at = NOW() + (%s * INTERVAL '1 minute')
+        WHERE ticket_id = %s AND claimed_by = %s
+          AND status <> 'CLOSED' AND claim_expires_at >= NOW();
+        """,
+        (lease_minutes, ticket_id, technician_id)
+    )
+    renewed = cur.rowcount == 1
+    con.commit()
+    cur.close()
+    con.close()
+    return renewed
+
+
+def finish_ticket_claim(ticket_id, technician_id, new_status):
+    """Close a claimed ticket (CLOSED) or hand it back to the queue (OPEN).
+
+    Only works while the technician's lease is still valid, so a technician
+    whose claim expired and was picked up by someone else cannot overwrite it.
+    """
+    con = get_connection()
+    cur = con.cursor()
+    _set_actor(cur, technician_id)
+    cur.execute(
+        """
+        UPDATE MaintenanceTicket
+        SET status = %s, claimed_by = NULL, claim_expires_at = NULL
+        WHERE ticket_id = %s AND claimed_by = %s AND claim_expires_at >= NOW()
+        RETURNING ticket_id;
+        """,
+        (new_status, ticket_id, technician_id)
+    )
+    done = cur.fetchone() is not None
+    if done:
+        record_event(cur, "MaintenanceTicket", ticket_id, "maintenance_ticket.status_changed", {
+            "old_status": TicketStatus.IN_PROGRESS.value, "new_status": new_status.value,
+        })
+    con.commit()
+    remember_write(cur)
+    cur.close()
+    con.close()
+    return done
+
+
+def bulk_update_ticket_status(ticket_ids, new_status, actor_id=None):
+    """Move many tickets to new_status in one statement; returns the ids changed.
+
+    Tickets already in new_status are skipped. Moving a ticket to OPEN or
+    CLOSED drops any claim on it.
+    """
+    if not ticket_ids:
+        return []
+
+    con = get_connection()
+    cur = con.cursor()
+    _set_actor(cur, actor_id)
+    cur.execute(
+        """
+        WITH old AS (
+            SELECT ticket_id, status
+            FROM MaintenanceTicket
+            WHERE ticket_id = ANY(%(ids)s) AND status <> %(status)s
+            ORDER BY ticket_id
+            FOR UPDATE
+        ),
+        changed AS (
+            UPDATE MaintenanceTicket t
+            SET status = %(status)s,
+                claimed_by = CASE WHEN %(status)s = 'IN_PROGRESS' THEN t.claimed_by END,
+                claim_expires_at = CASE WHEN %(status)s = 'IN_PROGRESS' THEN t.claim_expires_at END
+            FROM old
+            WHERE t.ticket_id = old.ticket_id
+            RETURNING t.ticket_id, old.status AS old_status
+        ),
+        events AS (
+            INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload)
+            SELECT 'MaintenanceTicket', ticket_id, 'maintenance_ticket.status_changed',
+                   jsonb_build_object('old_status', old_status, 'new_status', %(status)s::text)
+            FROM changed
+        )
+        SELECT ticket_id FROM changed ORDER BY ticket_id;
+        """,
+        {"ids": list(ticket_ids), "status": new_status}
+    )
+    changed = [r[0] for r in cur.fetchall()]
+    con.commit()
+    remember_write(cur)
+    cur.close()
+    con.close()
+    return changed
+
+
+def _print_ticket(row):
+    t_id, room_id, eq_no, issue, priority, status, created_at, expires = row
+    eq_text = f"equipment {eq_no}" if eq_no is not None else "room only"
+    print(f"[{t_id}] Room {room_id}, {eq_text} (opened {created_at})")
+    print(f"     Priority: {priority}, Status: {status}")
+    print(f"     Issue: {issue}")
+    if expires is not None:
+        print(f"     Claim expires: {expires}")
+
+
+def _read_ticket_id(prompt="Ticket ID: "):
+    ticket_id_str = input(prompt).strip()
+    if not ticket_id_str.isdigit():
+        print("Invalid ticket id.")
+        return None
+    return int(ticket_id_str)
+
+
+def admin_ticket_work_queue(user):
+    technician_id = user["user_id"]
+    while True:
+        print("\n=== Technician Work Queue ===")
+        print("1. Claim next ticket")
+        print("2. My claimed tickets")
+        print("3. Close a claimed ticket")
+        print("4. Release a claimed ticket")
+        print("5. Renew a claim")
+        print("6. Bulk status update")
+        print("7. Back")
+        choice = input("Choose: ").strip()
+
+        try:
+            if choice == "1":
+                row = claim_next_ticket(technician_id)
+                if row:
+                    print(f"Claimed for {TICKET_LEASE_MINUTES} minutes:")
+                    _print_ticket(row)
+                else:
+                    print("No unclaimed open tickets.")
+            elif choice == "2":
+                con = None
+                try:
+                    con = get_read_connection(technician_id)
+                    cur = con.cursor()
+                    cur.execute(
+                        f"SELECT {TICKET_COLUMNS} FROM MaintenanceTicket "
+                        "WHERE claimed_by = %s AND status <> 'CLOSED' "
+                        "ORDER BY priority, created_at;",
+                        (technician_id,)
+                    )
+                    rows = cur.fetchall()
+                    cur.close()
+                finally:
+                    release_connection(con)
+                if not rows:
+                    print("You have no claimed tickets.")
+                for row in rows:
+                    _print_ticket(row)
+            elif choice in ("3", "4"):
+                ticket_id = _read_ticket_id()
+                if ticket_id is None:
+                    continue
+                new_status = TicketStatus.CLOSED if choice == "3" else TicketStatus.OPEN
+                if finish_ticket_claim(ticket_id, technician_id, new_status):
+                    print("Ticket closed." if new_status == TicketStatus.CLOSED else "Ticket returned to the queue.")
+                else:
+                    print("You do not hold a current claim on that ticket.")
+            elif choice == "5":
+                ticket_id = _read_ticket_id()
+                if ticket_id is None:
+                    continue
+                if renew_ticket_claim(ticket_id, technician_id):
+                    print(f"Claim extended by {TICKET_LEASE_MINUTES} minutes.")
+                else:
+                    print("Claim could not be renewed (expired or not yours).")
+            elif choice == "6":
+                ids_str = input("Ticket IDs (comma separated): ").strip()
+                try:
+                    ticket_ids = [int(x) for x in ids_str.split(",") if x.strip()]
+                except ValueError:
+                    print("Invalid ticket id list.")
+                    continue
+                new_status = parse_enum(TicketStatus, input("New status (OPEN/IN_PROGRESS/CLOSED): "))
+                if not ticket_ids or new_status is None:
+                    print("Need at least one ticket id and a valid status.")
+                    continue
+                changed = bulk_update_ticket_status(ticket_ids, new_status, technician_id)
+                print(f"Updated {len(changed)} ticket(s):", ", ".join(str(t) for t in changed) or "none")
+            elif choice == "7":
+                break
+            else:
+                print("Invalid choice.")
+        except psycopg2.Error as e:
+            print("Database error:", e)
+
+
 #----------ADMIN-ROOM BOOKING------------
 
 def admin_book_room(user):
@@ -1305,13 +4028,14 @@ def admin_book_room(user):
             cur = con.cursor()
 
             if choice == "1":  # Update PT session
-                session_id_str = input("Enter PT session_id: ").strip()
-                if not session_id_str.isdigit():
+                session_id = resolve_id(
+                    "session", input("Enter PT session_id (or member/trainer name to search): ")
+                )
+                if session_id is None:
                     print("Invalid session id.")
                     cur.close()
                     con.close()
                     continue
-                session_id = int(session_id_str)
 
                 cur.execute(
                     "SELECT session_at, duration_minutes, room_id "
@@ -1326,7 +4050,7 @@ def admin_book_room(user):
                     continue
 
                 session_at, duration_minutes, current_room = row
-                available_rooms = get_available_rooms(session_at, duration_minutes)
+                available_rooms = get_available_rooms(session_at, duration_minutes, use_primary=True)
 
                 if current_room is not None and current_room not in available_rooms:
                     available_rooms.append(current_room)
@@ -1338,13 +4062,12 @@ def admin_book_room(user):
                     continue
 
                 print("Available rooms (room_id):", ", ".join(str(r) for r in available_rooms))
-                room_id_str = input("Select room_id to assign: ").strip()
-                if not room_id_str.isdigit():
+                room_id = resolve_id("room", input("Select room_id to assign (or name to search): "))
+                if room_id is None:
                     print("Invalid room id.")
                     cur.close()
                     con.close()
                     continue
-                room_id = int(room_id_str)
 
                 if room_id not in available_rooms:
                     print("Selected room is not available.")
@@ -1359,21 +4082,34 @@ def admin_book_room(user):
                     con.close()
                     continue
 
+                # Check again under the room lock, so a PT booking or class
+                # made since the list was shown is seen and none can slip in
+                lock_booking_resources(cur, room_id)
+                if room_id != current_room and room_id not in get_available_rooms(
+                        session_at, duration_minutes, use_primary=True):
+                    print("Selected room is no longer available.")
+                    cur.close()
+                    con.close()
+                    continue
+
                 cur.execute(
                     "UPDATE PTSession SET room_id = %s WHERE session_id = %s;",
                     (room_id, session_id)
                 )
+                record_event(cur, "PTSession", session_id, "pt_session.room_assigned", {
+                    "old_room_id": current_room, "room_id": room_id,
+                })
                 con.commit()
+                remember_write(cur, user["user_id"])
                 print(f"PT session {session_id} assigned to room {room_id}.")
 
             else:  # Update group class
-                class_id_str = input("Enter Group class_id: ").strip()
-                if not class_id_str.isdigit():
+                class_id = resolve_id("class", input("Enter Group class_id (or class name to search): "))
+                if class_id is None:
                     print("Invalid class id.")
                     cur.close()
                     con.close()
                     continue
-                class_id = int(class_id_str)
 
                 cur.execute(
                     "SELECT scheduled_at, duration_minutes, room_id "
@@ -1388,7 +4124,7 @@ def admin_book_room(user):
                     continue
 
                 scheduled_at, duration_minutes, current_room = row
-                available_rooms = get_available_rooms(scheduled_at, duration_minutes)
+                available_rooms = get_available_rooms(scheduled_at, duration_minutes, use_primary=True)
 
                 # Allow keeping current room even if helper filters it out
                 if current_room is not None and current_room not in available_rooms:
@@ -1401,13 +4137,12 @@ def admin_book_room(user):
                     continue
 
                 print("Available rooms (room_id):", ", ".join(str(r) for r in available_rooms))
-                room_id_str = input("Select room_id to assign: ").strip()
-                if not room_id_str.isdigit():
+                room_id = resolve_id("room", input("Select room_id to assign (or name to search): "))
+                if room_id is None:
                     print("Invalid room id.")
                     cur.close()
                     con.close()
                     continue
-                room_id = int(room_id_str)
 
                 if room_id not in available_rooms:
                     print("Selected room is not available.")
@@ -1422,11 +4157,25 @@ def admin_book_room(user):
                     con.close()
                     continue
 
+                # Check again under the room lock, so a PT booking or class
+                # made since the list was shown is seen and none can slip in
+                lock_booking_resources(cur, room_id)
+                if room_id != current_room and room_id not in get_available_rooms(
+                        scheduled_at, duration_minutes, use_primary=True):
+                    print("Selected room is no longer available.")
+                    cur.close()
+                    con.close()
+                    continue
+
                 cur.execute(
                     "UPDATE GroupClass SET room_id = %s WHERE class_id = %s;",
                     (room_id, class_id)
                 )
+                record_event(cur, "GroupClass", class_id, "group_class.room_assigned", {
+                    "old_room_id": current_room, "room_id": room_id,
+                })
                 con.commit()
+                remember_write(cur, user["user_id"])
                 print(f"Group class {class_id} assigned to room {room_id}.")
 
             cur.close()
@@ -1444,6 +4193,118 @@ def admin_book_room(user):
                 pass
 
 
+#----------ADMIN-CLASS RESCHEDULE IMPACT------------
+
+# Registrants of a class whose other bookings overlap the class's new time.
+# One query for the whole class: the registrants are probed through the
+# (member_id, session_at) and (member_id, scheduled_at) indexes, and the
+# start-time bounds from overlap_scan_bounds() keep it to the right months.
+CLASS_IMPACT_SQL = """
+WITH registrants AS (
+    SELECT cr.registration_id, cr.member_id
+    FROM ClassRegistration cr
+    WHERE cr.class_id = %(class_id)s AND cr.scheduled_at = %(old_at)s
+)
+SELECT r.registration_id, r.member_id, m.name, 'PT session', p.session_id,
+       p.session_at, p.duration_minutes
+FROM registrants r
+JOIN Member m ON m.member_id = r.member_id
+JOIN PTSession p ON p.member_id = r.member_id
+ AND p.session_at > %(scan_from)s AND p.session_at < %(scan_to)s
+ AND p.session_at + make_interval(mins => p.duration_minutes) > %(new_start)s
+UNION ALL
+SELECT r.registration_id, r.member_id, m.name, 'class', g.class_id,
+       g.scheduled_at, g.duration_minutes
+FROM registrants r
+JOIN Member m ON m.member_id = r.member_id
+JOIN ClassRegistration other ON other.member_id = r.member_id
+ AND other.class_id <> %(class_id)s
+ AND other.scheduled_at > %(scan_from)s AND other.scheduled_at < %(scan_to)s
+JOIN GroupClass g ON g.class_id = other.class_id AND g.scheduled_at = other.scheduled_at
+ AND g.scheduled_at + make_interval(mins => g.duration_minutes) > %(new_start)s
+ORDER BY 3, 2, 6;
+"""
+IMPACT_PREVIEW_ROWS = 20
+
+
+def class_reschedule_impact(cur, class_id, old_scheduled_at, new_start, duration_minutes):
+    """Return the clashes moving a class to [new_start, +duration) would cause.
+
+    Each row is (registration_id, member_id, member_name, kind, booking_id,
+    starts_at, duration_minutes), where kind is 'PT session' or 'class'.
+    A member with several clashing bookings appears once per booking.
+    """
+    new_end = new_start + timedelta(minutes=duration_minutes)
+    scan_from, scan_to = overlap_scan_bounds(new_start, new_end)
+    cur.execute(CLASS_IMPACT_SQL, {
+        "class_id": class_id, "old_at": old_scheduled_at, "new_start": new_start,
+        "scan_from": scan_from, "scan_to": scan_to,
+    })
+    return cur.fetchall()
+
+
+def resolve_reschedule_impact(cur, class_id, old_scheduled_at, new_start, registration_ids, action):
+    """Act on the registrations hit by a class move, in the caller's transaction.
+
+    action is "notify" (queue a class.schedule_conflict event for each) or
+    "drop" (unregister them and queue class.unregistered events). Must run
+    before GroupClass is updated, while the registrations still carry
+    old_scheduled_at.
+    """
+    params = {
+        "class_id": class_id, "old_at": old_scheduled_at, "ids": list(registration_ids),
+        "new_at": new_start.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if action == "drop":
+        cur.execute(
+            """
+            WITH dropped AS (
+                DELETE FROM ClassRegistration
+                WHERE class_id = %(class_id)s AND scheduled_at = %(old_at)s
+                  AND registration_id = ANY(%(ids)s)
+                RETURNING registration_id, member_id
+            )
+            INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload)
+            SELECT 'ClassRegistration', registration_id, 'class.unregistered',
+                   jsonb_build_object('class_id', %(class_id)s, 'member_id', member_id,
+                                      'reason', 'schedule_conflict',
+                                      'new_scheduled_at', %(new_at)s::text)
+            FROM dropped;
+            """,
+            params
+        )
+    elif action == "notify":
+        cur.execute(
+            """
+            INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload)
+            SELECT 'ClassRegistration', registration_id, 'class.schedule_conflict',
+                   jsonb_build_object('class_id', %(class_id)s, 'member_id', member_id,
+                                      'new_scheduled_at', %(new_at)s::text)
+            FROM ClassRegistration
+            WHERE class_id = %(class_id)s AND scheduled_at = %(old_at)s
+              AND registration_id = ANY(%(ids)s);
+            """,
+            params
+        )
+    return cur.rowcount
+
+
+def prompt_reschedule_impact(impact):
+    """Show the clashes and ask what to do; returns "apply", "notify", "drop" or None."""
+    members = {row[1] for row in impact}
+    print(f"\n{len(members)} registered members have another booking at the new time:")
+    for registration_id, member_id, name, kind, booking_id, starts_at, dur in impact[:IMPACT_PREVIEW_ROWS]:
+        print(f"  {name} (member {member_id}): {kind} {booking_id} at {starts_at} ({dur} min)")
+    if len(impact) > IMPACT_PREVIEW_ROWS:
+        print(f"  ... and {len(impact) - IMPACT_PREVIEW_ROWS} more clashes")
+
+    print("1. Apply change and keep them registered")
+    print("2. Apply change and notify them")
+    print("3. Apply change and drop their registrations")
+    print("4. Cancel")
+    return {"1": "apply", "2": "notify", "3": "drop"}.get(input("Choose: ").strip())
+
+
 #----------ADMIN-CLASS MANAGEMENT------------
 
 def admin_manage_classes(user):
@@ -1457,46 +4318,40 @@ def admin_manage_classes(user):
         cur.execute("SELECT 1 FROM Trainer WHERE trainer_id = %s;", (trainer_id,))
         return cur.fetchone() is not None
 
+    def excluded_class(cur, exclude_class_id):
+        """(start, end, room_id, trainer_id) of the class being updated, as stored now."""
+        if exclude_class_id is None:
+            return None
+        cur.execute(
+            "SELECT scheduled_at, duration_minutes, room_id, trainer_id "
+            "FROM GroupClass WHERE class_id = %s;",
+            (exclude_class_id,)
+        )
+        row = cur.fetchone()
+        return (row[0], row[0] + timedelta(minutes=row[1]), row[2], row[3]) if row else None
+
     def check_room_available_excluding_class(cur, room_id, new_start, duration_minutes, exclude_class_id=None):
         new_end = new_start + timedelta(minutes=duration_minutes)
 
-        cur.execute("SELECT capacity FROM Room WHERE room_id = %s;", (room_id,))
-        row = cur.fetchone()
-        if not row:
+        # Missing rooms and rooms out of service for the window both fail here
+        execute_prepared(cur, "room_capacities", (new_end, new_start))
+        capacity = dict(cur.fetchall()).get(room_id)
+        if capacity is None:
             return False
-        capacity = row[0]
 
-        # Count overlapping PT sessions in this room
-        cur.execute("SELECT session_at, duration_minutes FROM PTSession WHERE room_id = %s;", (room_id,))
-        pt_sessions = cur.fetchall()
-        concurrent_pt = 0
-        for s_at, dur in pt_sessions:
-            s_end = s_at + timedelta(minutes=dur)
-            if times_overlap(new_start, new_end, s_at, s_end):
-                concurrent_pt += 1
+        counts = load_occupancy(cur, "room", new_start, new_end, ids=[room_id]).get(room_id)
+        if counts is None:
+            return True
 
-        if concurrent_pt >= capacity:
+        # Most PT sessions in this room at any one moment of the window
+        if max(counts["pt_slots"]) >= capacity:
             return False
 
-        # Check group classes in the room
-        if exclude_class_id is None:
-            cur.execute(
-                "SELECT scheduled_at, duration_minutes FROM GroupClass WHERE room_id = %s;",
-                (room_id,)
-            )
-        else:
-            cur.execute(
-                "SELECT scheduled_at, duration_minutes FROM GroupClass "
-                "WHERE room_id = %s AND class_id != %s;",
-                (room_id, exclude_class_id)
-            )
-        gc_list = cur.fetchall()
-        for gc_start, gc_dur in gc_list:
-            gc_end = gc_start + timedelta(minutes=gc_dur)
-            if times_overlap(new_start, new_end, gc_start, gc_end):
-                return False
-
-        return True
+        # Group classes in the room, not counting the class being updated
+        excluded = excluded_class(cur, exclude_class_id)
+        if excluded and excluded[2] == room_id:
+            release_slots(counts["class_slots"], new_start, new_end, excluded[0], excluded[1])
+        return max(counts["class_slots"]) <= 0
 
     def check_trainer_available_excluding_class(cur, trainer_id, new_start, duration_minutes, exclude_class_id=None):
         new_end = new_start + timedelta(minutes=duration_minutes)
@@ -1510,37 +4365,23 @@ def admin_manage_classes(user):
             if not (new_start.time() >= avail_start.time() and new_end.time() <= avail_end.time()):
                 return False
 
-        # Check trainer's PT sessions
-        cur.execute("SELECT session_at, duration_minutes FROM PTSession WHERE trainer_id = %s;", (trainer_id,))
-        pt_sessions = cur.fetchall()
-        for s_at, dur in pt_sessions:
-            s_end = s_at + timedelta(minutes=dur)
-            if times_overlap(new_start, new_end, s_at, s_end):
-                return False
+        counts = load_occupancy(cur, "trainer", new_start, new_end, ids=[trainer_id]).get(trainer_id)
+        if counts is None:
+            return True
 
-        # Check trainer's group classes (exclude provided class id)
-        if exclude_class_id is None:
-            cur.execute("SELECT scheduled_at, duration_minutes FROM GroupClass WHERE trainer_id = %s;", (trainer_id,))
-        else:
-            cur.execute(
-                "SELECT scheduled_at, duration_minutes FROM GroupClass "
-                "WHERE trainer_id = %s AND class_id != %s;",
-                (trainer_id, exclude_class_id)
-            )
-        gc_list = cur.fetchall()
-        for gc_start, gc_dur in gc_list:
-            gc_end = gc_start + timedelta(minutes=gc_dur)
-            if times_overlap(new_start, new_end, gc_start, gc_end):
-                return False
-
-        return True
+        # Trainer's PT sessions and classes, not counting the class being updated
+        excluded = excluded_class(cur, exclude_class_id)
+        if excluded and excluded[3] == trainer_id:
+            release_slots(counts["busy_slots"], new_start, new_end, excluded[0], excluded[1])
+        return max(counts["busy_slots"]) <= 0
 
     while True:
         print("\n--- Class Management ---")
         print("1. Create new class")
         print("2. Update existing class")
         print("3. View classes")
-        print("4. Back")
+        print("4. Generate timetable from template")
+        print("5. Back")
         choice = input("Choose: ").strip()
 
         if choice == "1":
@@ -1549,27 +4390,36 @@ def admin_manage_classes(user):
                 print("Class name required.")
                 continue
 
-            trainer_id_str = input("Trainer ID: ").strip()
-            room_id_str = input("Room ID: ").strip()
+            trainer_id = resolve_id("trainer", input("Trainer ID (or name to search): "))
+            if trainer_id is None:
+                print("Invalid trainer id.")
+                continue
+            room_id = resolve_id("room", input("Room ID (or name to search): "))
+            if room_id is None:
+                print("Invalid room id.")
+                continue
             sched_str = input(f"Scheduled at ({TIME_FORMAT}): ").strip()
             capacity_str = input("Capacity (int): ").strip()
             duration_str = input("Duration minutes (int): ").strip()
 
             try:
-                trainer_id = int(trainer_id_str)
-                room_id = int(room_id_str)
                 scheduled_at = datetime.strptime(sched_str, TIME_FORMAT)
                 capacity = int(capacity_str)
                 duration_minutes = int(duration_str)
             except Exception:
-                print("Invalid input for trainer/room/time/capacity/duration.")
+                print("Invalid input for time/capacity/duration.")
                 continue
 
             if capacity <= 0:
                 print("Capacity must be a positive integer.")
                 continue
 
+            if not 0 < duration_minutes <= MAX_BOOKING_MINUTES:
+                print(f"Duration must be between 1 and {MAX_BOOKING_MINUTES} minutes.")
+                continue
+
             try:
+                ensure_booking_months(scheduled_at)
                 con = get_connection()
                 cur = con.cursor()
 
@@ -1584,9 +4434,11 @@ def admin_manage_classes(user):
                     con.close()
                     continue
 
-                # Check availability using helper functions
-                available_rooms = get_available_rooms(scheduled_at, duration_minutes)
-                available_trainers = get_available_trainers(scheduled_at, duration_minutes)
+                # Check availability using helper functions; the locks make PT
+                # bookings for this room or trainer wait until the class is saved
+                lock_booking_resources(cur, room_id, trainer_id)
+                available_rooms = get_available_rooms(scheduled_at, duration_minutes, use_primary=True)
+                available_trainers = get_available_trainers(scheduled_at, duration_minutes, use_primary=True)
                 if room_id not in available_rooms:
                     print("Room not available at that time.")
                     cur.close()
@@ -1600,10 +4452,17 @@ def admin_manage_classes(user):
 
                 cur.execute(
                     "INSERT INTO GroupClass (class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes) "
-                    "VALUES (%s, %s, %s, %s, %s, %s);",
+                    "VALUES (%s, %s, %s, %s, %s, %s) RETURNING class_id;",
                     (class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes)
                 )
+                new_class_id = cur.fetchone()[0]
+                record_event(cur, "GroupClass", new_class_id, "group_class.created", {
+                    "class_name": class_name, "trainer_id": trainer_id, "room_id": room_id,
+                    "scheduled_at": scheduled_at, "capacity": capacity,
+                    "duration_minutes": duration_minutes,
+                })
                 con.commit()
+                remember_write(cur, user["user_id"])
                 cur.close()
                 con.close()
                 print("Group class created.")
@@ -1611,11 +4470,10 @@ def admin_manage_classes(user):
                 print("Error creating class:", e)
 
         elif choice == "2":
-            class_id_str = input("Enter class ID to update: ").strip()
-            if not class_id_str.isdigit():
+            class_id = resolve_id("class", input("Enter class ID to update (or class name to search): "))
+            if class_id is None:
                 print("Invalid class id.")
                 continue
-            class_id = int(class_id_str)
 
             try:
                 con = get_connection()
@@ -1643,28 +4501,26 @@ def admin_manage_classes(user):
                 print("Duration (min):", old_duration)
 
                 name = input("New name: ").strip() or old_name
-                trainer_id_in = input("New trainer ID: ").strip()
-                room_id_in = input("New room ID: ").strip()
-                sched_in = input(f"New scheduled at ({TIME_FORMAT}): ").strip()
-                capacity_in = input("New capacity: ").strip()
-                duration_in = input("New duration minutes: ").strip()
-
-                try:
-                    trainer_id = int(trainer_id_in) if trainer_id_in != "" else old_trainer_id
-                except ValueError:
+                trainer_id_in = input("New trainer ID (or name to search): ").strip()
+                trainer_id = resolve_id("trainer", trainer_id_in) if trainer_id_in != "" else old_trainer_id
+                if trainer_id is None:
                     print("Invalid trainer id.")
                     cur.close()
                     con.close()
                     continue
 
-                try:
-                    room_id = int(room_id_in) if room_id_in != "" else old_room_id
-                except ValueError:
+                room_id_in = input("New room ID (or name to search): ").strip()
+                room_id = resolve_id("room", room_id_in) if room_id_in != "" else old_room_id
+                if room_id is None:
                     print("Invalid room id.")
                     cur.close()
                     con.close()
                     continue
 
+                sched_in = input(f"New scheduled at ({TIME_FORMAT}): ").strip()
+                capacity_in = input("New capacity: ").strip()
+                duration_in = input("New duration minutes: ").strip()
+
                 if sched_in == "":
                     scheduled_at = old_scheduled_at
                 else:
@@ -1698,6 +4554,18 @@ def admin_manage_classes(user):
                     con.close()
                     continue
 
+                if not 0 < duration_minutes <= MAX_BOOKING_MINUTES:
+                    print(f"Duration must be between 1 and {MAX_BOOKING_MINUTES} minutes.")
+                    cur.close()
+                    con.close()
+                    continue
+
+                if scheduled_at != old_scheduled_at:
+                    # Nothing written yet: end the read transaction so the new
+                    # month's partition can be created if it is missing
+                    con.rollback()
+                    ensure_booking_months(scheduled_at)
+
                 if not trainer_exists(cur, trainer_id):
                     print("Trainer not found.")
                     cur.close()
@@ -1711,8 +4579,8 @@ def admin_manage_classes(user):
 
                 # Ensure new capacity is not less than current registrations
                 cur.execute(
-                    "SELECT COUNT(*) FROM ClassRegistration WHERE class_id = %s;",
-                    (class_id,)
+                    "SELECT COUNT(*) FROM ClassRegistration WHERE class_id = %s AND scheduled_at = %s;",
+                    (class_id, old_scheduled_at)
                 )
                 current_reg = cur.fetchone()[0]
                 if capacity < current_reg:
@@ -1724,6 +4592,9 @@ def admin_manage_classes(user):
                     con.close()
                     continue
 
+                # Checked under the locks, so PT bookings for this room or
+                # trainer wait until the class is saved
+                lock_booking_resources(cur, room_id, trainer_id)
                 room_ok = check_room_available_excluding_class(
                     cur, room_id, scheduled_at, duration_minutes, exclude_class_id=class_id
                 )
@@ -1741,6 +4612,25 @@ def admin_manage_classes(user):
                     con.close()
                     continue
 
+                # Registered members who are booked elsewhere at the new time
+                if scheduled_at != old_scheduled_at or duration_minutes != old_duration:
+                    impact = class_reschedule_impact(
+                        cur, class_id, old_scheduled_at, scheduled_at, duration_minutes
+                    )
+                    if impact:
+                        action = prompt_reschedule_impact(impact)
+                        if action is None:
+                            print("Update cancelled.")
+                            cur.close()
+                            con.close()
+                            continue
+                        affected = sorted({row[0] for row in impact})
+                        resolve_reschedule_impact(
+                            cur, class_id, old_scheduled_at, scheduled_at, affected, action
+                        )
+                        if action == "drop":
+                            print(f"Dropped {len(affected)} registrations.")
+
                 cur.execute(
                     "UPDATE GroupClass "
                     "SET class_name = %s, trainer_id = %s, room_id = %s, "
@@ -1748,7 +4638,15 @@ def admin_manage_classes(user):
                     "WHERE class_id = %s;",
                     (name, trainer_id, room_id, scheduled_at, capacity, duration_minutes, class_id)
                 )
+                record_event(cur, "GroupClass", class_id, "group_class.updated", {
+                    "class_name": name, "trainer_id": trainer_id, "room_id": room_id,
+                    "scheduled_at": scheduled_at, "capacity": capacity,
+                    "duration_minutes": duration_minutes,
+                    "old_scheduled_at": old_scheduled_at, "old_room_id": old_room_id,
+                    "old_trainer_id": old_trainer_id,
+                })
                 con.commit()
+                remember_write(cur, user["user_id"])
                 cur.close()
                 con.close()
                 print("Class updated.")
@@ -1763,73 +4661,1678 @@ def admin_manage_classes(user):
             print("4. By room")
             sub = input("Choose: ").strip()
 
-            try:
-                con = get_connection()
-                cur = con.cursor()
+            if sub == "1":
+                class_filter, filter_value = "all", None
+            elif sub == "2":
+                class_filter, filter_value = "upcoming", None
+            elif sub == "3":
+                trainer_id = resolve_id("trainer", input("Trainer ID (or name to search): "))
+                if trainer_id is None:
+                    print("Invalid trainer id.")
+                    continue
+                class_filter, filter_value = "trainer", trainer_id
+            elif sub == "4":
+                room_id = resolve_id("room", input("Room ID (or name to search): "))
+                if room_id is None:
+                    print("Invalid room id.")
+                    continue
+                class_filter, filter_value = "room", room_id
+            else:
+                print("Invalid choice.")
+                continue
 
-                if sub == "1":
-                    cur.execute(
-                        "SELECT class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes "
-                        "FROM GroupClass ORDER BY scheduled_at;"
-                    )
-                    rows = cur.fetchall()
-                elif sub == "2":
-                    cur.execute(
-                        "SELECT class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes "
-                        "FROM GroupClass WHERE scheduled_at >= NOW() ORDER BY scheduled_at;"
-                    )
-                    rows = cur.fetchall()
-                elif sub == "3":
-                    t_str = input("Trainer ID: ").strip()
-                    if not t_str.isdigit():
-                        print("Invalid trainer id.")
-                        cur.close()
-                        con.close()
-                        continue
-                    t_id = int(t_str)
-                    cur.execute(
-                        "SELECT class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes "
-                        "FROM GroupClass WHERE trainer_id = %s ORDER BY scheduled_at;",
-                        (t_id,)
-                    )
-                    rows = cur.fetchall()
-                elif sub == "4":
-                    r_str = input("Room ID: ").strip()
-                    if not r_str.isdigit():
-                        print("Invalid room id.")
-                        cur.close()
-                        con.close()
-                        continue
-                    r_id = int(r_str)
-                    cur.execute(
-                        "SELECT class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes "
-                        "FROM GroupClass WHERE room_id = %s ORDER BY scheduled_at;",
-                        (r_id,)
+            browse_class_pages(class_filter, filter_value, user_id=user["user_id"])
+
+        elif choice == "4":
+            admin_generate_timetable(user)
+
+        elif choice == "5":
+            break
+        else:
+            print("Invalid choice.")
+
+
+#----------ADMIN-TIMETABLE GENERATOR------------
+
+# A term timetable is a CSV with one line per weekly class, e.g.
+#
+#   class_name,trainer_id,room_id,weekday,start_time,capacity,duration_minutes,first_date,last_date
+#   Yoga Basics,4,1,Mon,10:00,10,60,2026-01-05,2026-03-30
+#
+# Every line is expanded into one GroupClass per matching weekday between
+# first_date and last_date. All occurrences are checked together against the
+# existing bookings and against each other, and are only created if none of
+# them conflict.
+
+TIMETABLE_COLUMNS = ("class_name", "trainer_id", "room_id", "weekday", "start_time",
+                     "capacity", "duration_minutes", "first_date", "last_date")
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+# One row per (occurrence, problem). The room check mirrors
+# get_available_rooms(): classes and out-of-service tickets block the room,
+# PT sessions only once the most at one moment reaches the room's capacity
+# (found with a running sum over their clipped start/end points).
+TIMETABLE_CONFLICTS_SQL = """
+WITH occ AS (
+    SELECT s.*, s.scheduled_at + make_interval(mins => s.duration_minutes) AS ends_at
+    FROM timetable_staging s
+),
+room_pt AS (
+    SELECT o.occ_no, r.capacity,
+           GREATEST(p.session_at, o.scheduled_at) AS t_start,
+           p.session_at + make_interval(mins => p.duration_minutes) AS t_end
+    FROM occ o
+    JOIN Room r ON r.room_id = o.room_id
+    JOIN PTSession p ON p.room_id = o.room_id
+     AND p.session_at > %(scan_from)s AND p.session_at < %(scan_to)s
+     AND p.session_at > o.scheduled_at - make_interval(mins => %(max_minutes)s)
+     AND p.session_at < o.ends_at
+     AND p.session_at + make_interval(mins => p.duration_minutes) > o.scheduled_at
+),
+room_pt_load AS (
+    SELECT occ_no, capacity,
+           SUM(delta) OVER (PARTITION BY occ_no ORDER BY t, delta) AS in_use
+    FROM (
+        SELECT occ_no, capacity, t_start AS t, 1 AS delta FROM room_pt
+        UNION ALL
+        SELECT occ_no, capacity, t_end, -1 FROM room_pt
+    ) points
+)
+SELECT o.occ_no, 'unknown trainer', NULL
+FROM occ o
+WHERE NOT EXISTS (SELECT 1 FROM Trainer t WHERE t.trainer_id = o.trainer_id)
+UNION ALL
+SELECT o.occ_no, 'unknown room', NULL
+FROM occ o
+WHERE NOT EXISTS (SELECT 1 FROM Room r WHERE r.room_id = o.room_id)
+UNION ALL
+SELECT o.occ_no, 'outside trainer hours',
+       to_char(t.start_time, 'HH24:MI') || '-' || to_char(t.end_time, 'HH24:MI')
+FROM occ o
+JOIN Trainer t ON t.trainer_id = o.trainer_id
+WHERE t.start_time IS NOT NULL AND t.end_time IS NOT NULL
+  AND (o.scheduled_at::time < t.start_time::time OR o.ends_at::time > t.end_time::time)
+UNION ALL
+SELECT o.occ_no, 'room out of service', 'ticket ' || t.ticket_id
+FROM occ o
+JOIN MaintenanceTicket t ON t.room_id = o.room_id
+ AND t.equipment_no IS NULL
+ AND t.blocks_booking
+ AND t.status <> 'CLOSED'
+ AND t.out_of_service_from < o.ends_at
+ AND (t.out_of_service_until IS NULL OR t.out_of_service_until > o.scheduled_at)
+UNION ALL
+SELECT occ_no, 'room full of PT sessions', MAX(in_use) || ' of ' || MIN(capacity)
+FROM room_pt_load
+GROUP BY occ_no
+HAVING MAX(in_use) >= MIN(capacity)
+UNION ALL
+SELECT o.occ_no, 'room has class', 'class ' || g.class_id || ' at ' || g.scheduled_at
+FROM occ o
+JOIN GroupClass g ON g.room_id = o.room_id
+ AND g.scheduled_at > %(scan_from)s AND g.scheduled_at < %(scan_to)s
+ AND g.scheduled_at > o.scheduled_at - make_interval(mins => %(max_minutes)s)
+ AND g.scheduled_at < o.ends_at
+ AND g.scheduled_at + make_interval(mins => g.duration_minutes) > o.scheduled_at
+UNION ALL
+SELECT o.occ_no, 'trainer has class', 'class ' || g.class_id || ' at ' || g.scheduled_at
+FROM occ o
+JOIN GroupClass g ON g.trainer_id = o.trainer_id
+ AND g.scheduled_at > %(scan_from)s AND g.scheduled_at < %(scan_to)s
+ AND g.scheduled_at > o.scheduled_at - make_interval(mins => %(max_minutes)s)
+ AND g.scheduled_at < o.ends_at
+ AND g.scheduled_at + make_interval(mins => g.duration_minutes) > o.scheduled_at
+UNION ALL
+SELECT o.occ_no, 'trainer has PT session', 'session ' || p.session_id || ' at ' || p.session_at
+FROM occ o
+JOIN PTSession p ON p.trainer_id = o.trainer_id
+ AND p.session_at > %(scan_from)s AND p.session_at < %(scan_to)s
+ AND p.session_at > o.scheduled_at - make_interval(mins => %(max_minutes)s)
+ AND p.session_at < o.ends_at
+ AND p.session_at + make_interval(mins => p.duration_minutes) > o.scheduled_at
+UNION ALL
+SELECT b.occ_no,
+       CASE WHEN a.room_id = b.room_id THEN 'room clash in timetable'
+            ELSE 'trainer clash in timetable' END,
+       'line ' || a.line_no || ' at ' || a.scheduled_at
+FROM occ a
+JOIN occ b ON a.occ_no < b.occ_no
+ AND (a.room_id = b.room_id OR a.trainer_id = b.trainer_id)
+ AND a.scheduled_at < b.ends_at
+ AND b.scheduled_at < a.ends_at
+ORDER BY 1, 2;
+"""
+
+
+def _parse_timetable_line(row):
+    """Return (values, None) for a good template line, or (None, reason)."""
+    class_name = (row.get("class_name") or "").strip()
+    if not class_name or len(class_name) > 255:
+        return None, "invalid class name"
+    weekday = WEEKDAYS.get((row.get("weekday") or "").strip().lower()[:3])
+    if weekday is None:
+        return None, "invalid weekday"
+    try:
+        trainer_id = int(row.get("trainer_id") or "")
+        room_id = int(row.get("room_id") or "")
+        capacity = int(row.get("capacity") or "")
+        duration_minutes = int(row.get("duration_minutes") or "")
+    except ValueError:
+        return None, "invalid trainer/room/capacity/duration"
+    try:
+        start_time = datetime.strptime((row.get("start_time") or "").strip(), "%H:%M").time()
+        first_date = datetime.strptime((row.get("first_date") or "").strip(), "%Y-%m-%d").date()
+        last_date = datetime.strptime((row.get("last_date") or "").strip(), "%Y-%m-%d").date()
+    except ValueError:
+        return None, "invalid time or date"
+    if capacity <= 0:
+        return None, "capacity must be positive"
+    if not 0 < duration_minutes <= MAX_BOOKING_MINUTES:
+        return None, f"duration must be between 1 and {MAX_BOOKING_MINUTES} minutes"
+    if last_date < first_date:
+        return None, "last_date is before first_date"
+
+    return (class_name, trainer_id, room_id, weekday, start_time,
+            capacity, duration_minutes, first_date, last_date), None
+
+
+def expand_timetable(rows):
+    """Expand template lines into (occurrences, rejects).
+
+    rows is an iterable of (line_no, dict). Each occurrence is a tuple
+    (line_no, class_name, trainer_id, room_id, scheduled_at, capacity,
+    duration_minutes); each reject is (line_no, reason).
+    """
+    occurrences = []
+    rejects = []
+    for line_no, row in rows:
+        values, reason = _parse_timetable_line(row)
+        if values is None:
+            rejects.append((line_no, reason))
+            continue
+
+        (class_name, trainer_id, room_id, weekday, start_time,
+         capacity, duration_minutes, first_date, last_date) = values
+        day = first_date + timedelta(days=(weekday - first_date.weekday()) % 7)
+        if day > last_date:
+            rejects.append((line_no, "no matching weekday in date range"))
+            continue
+        while day <= last_date:
+            occurrences.append((line_no, class_name, trainer_id, room_id,
+                                datetime.combine(day, start_time), capacity, duration_minutes))
+            day += timedelta(days=7)
+
+    return occurrences, rejects
+
+
+def generate_timetable(template_path, report_path, check_only=False, user_id=None):
+    """Create every class in a timetable template, or none of them.
+
+    Template lines are expanded with expand_timetable(), copied into a temp
+    table and checked in one query (TIMETABLE_CONFLICTS_SQL). If any line is
+    invalid or any occurrence conflicts, nothing is created and the problems
+    are written to report_path. Otherwise all classes and their
+    group_class.created events are inserted in the same transaction, unless
+    check_only is set. Returns a stats dict.
+    """
+    stats = {"lines": 0, "rejected": 0, "occurrences": 0, "conflicts": 0, "created": 0,
+             "seconds": 0.0}
+    started = time.perf_counter()
+
+    with open(template_path, newline="", encoding="utf-8") as src:
+        reader = csv.DictReader(src)
+        missing = [c for c in TIMETABLE_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError("Template is missing required columns: " + ", ".join(missing))
+        # line 1 is the header
+        rows = list(enumerate(reader, start=2))
+
+    stats["lines"] = len(rows)
+    occurrences, rejects = expand_timetable(rows)
+    stats["rejected"] = len(rejects)
+    stats["occurrences"] = len(occurrences)
+    problems = [(line_no, None, reason, "") for line_no, reason in rejects]
+
+    if occurrences and not rejects:
+        if not check_only:
+            ensure_booking_months(min(o[4] for o in occurrences), max(o[4] for o in occurrences))
+        con = get_connection()
+        cur = con.cursor()
+        try:
+            cur.execute(
+                """
+                CREATE TEMP TABLE timetable_staging (
+                    occ_no            INT PRIMARY KEY,
+                    line_no           INT NOT NULL,
+                    class_name        VARCHAR(255) NOT NULL,
+                    trainer_id        INT NOT NULL,
+                    room_id           INT NOT NULL,
+                    scheduled_at      TIMESTAMP NOT NULL,
+                    capacity          INT NOT NULL,
+                    duration_minutes  INT NOT NULL
+                ) ON COMMIT DROP;
+                """
+            )
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for occ_no, occ in enumerate(occurrences):
+                writer.writerow((occ_no,) + occ)
+            buf.seek(0)
+            cur.copy_expert(
+                "COPY timetable_staging (occ_no, line_no, class_name, trainer_id, room_id, "
+                "scheduled_at, capacity, duration_minutes) FROM STDIN WITH (FORMAT csv);",
+                buf
+            )
+            cur.execute("ANALYZE timetable_staging;")
+
+            # Constant bounds over the whole batch let the planner skip
+            # booking partitions outside the term.
+            scan_from, scan_to = overlap_scan_bounds(
+                min(o[4] for o in occurrences),
+                max(o[4] + timedelta(minutes=o[6]) for o in occurrences)
+            )
+            if not check_only:
+                # Every room and trainer in the term, so PT bookings for them
+                # wait until the classes are saved
+                lock_booking_resources(cur, {o[3] for o in occurrences},
+                                       {o[2] for o in occurrences})
+            cur.execute(TIMETABLE_CONFLICTS_SQL, {
+                "scan_from": scan_from, "scan_to": scan_to, "max_minutes": MAX_BOOKING_MINUTES,
+            })
+            conflicts = cur.fetchall()
+            for occ_no, reason, detail in conflicts:
+                occ = occurrences[occ_no]
+                problems.append((occ[0], occ[4], reason, detail or ""))
+            stats["conflicts"] = len({occ_no for occ_no, _r, _d in conflicts})
+
+            if conflicts or check_only:
+                con.rollback()
+            else:
+                cur.execute(
+                    """
+                    WITH created AS (
+                        INSERT INTO GroupClass (class_name, trainer_id, room_id, scheduled_at,
+                                                capacity, duration_minutes)
+                        SELECT class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes
+                        FROM timetable_staging
+                        ORDER BY occ_no
+                        RETURNING *
+                    ),
+                    events AS (
+                        INSERT INTO OutboxEvent (aggregate_type, aggregate_id, event_type, payload)
+                        SELECT 'GroupClass', class_id, 'group_class.created',
+                               jsonb_build_object(
+                                   'class_name', class_name, 'trainer_id', trainer_id,
+                                   'room_id', room_id,
+                                   'scheduled_at', to_char(scheduled_at, 'YYYY-MM-DD HH24:MI:SS'),
+                                   'capacity', capacity, 'duration_minutes', duration_minutes)
+                        FROM created
                     )
-                    rows = cur.fetchall()
-                else:
-                    print("Invalid choice.")
-                    cur.close()
-                    con.close()
-                    continue
+                    SELECT COUNT(*) FROM created;
+                    """
+                )
+                stats["created"] = cur.fetchone()[0]
+                con.commit()
+                remember_write(cur, user_id)
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cur.close()
+            con.close()
 
-                if not rows:
-                    print("No classes found.")
-                else:
-                    for cid, cname, tid, rid, sched, cap, dur in rows:
-                        print(f"[{cid}] {cname} — trainer {tid}, room {rid}, at {sched}, cap {cap}, {dur} min")
+    if problems:
+        with open(report_path, "w", newline="", encoding="utf-8") as rep:
+            report_writer = csv.writer(rep)
+            report_writer.writerow(["line_no", "scheduled_at", "problem", "detail"])
+            for line_no, scheduled_at, reason, detail in sorted(problems, key=lambda p: (p[0], str(p[1]))):
+                report_writer.writerow([
+                    line_no, scheduled_at.strftime(TIME_FORMAT) if scheduled_at else "", reason, detail
+                ])
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def admin_generate_timetable(user):
+    print("\n=== Generate Timetable ===")
+    print("Template header must include: " + ",".join(TIMETABLE_COLUMNS))
+    template_path = input("Template file path: ").strip()
+    if not template_path:
+        print("File path required.")
+        return
+    report_path = input("Conflict report path (default: timetable_conflicts.csv): ").strip() \
+        or "timetable_conflicts.csv"
+    check_only = input("Only check for conflicts? (y/n): ").strip().lower() == "y"
 
-                cur.close()
-                con.close()
-            except Exception as e:
-                print("Error loading classes:", e)
+    try:
+        stats = generate_timetable(template_path, report_path, check_only, user["user_id"])
+    except Exception as e:
+        print("Error generating timetable:", e)
+        return
+
+    print(f"{stats['lines']} template lines, {stats['occurrences']} classes "
+          f"({stats['seconds']:.1f}s).")
+    if stats["created"]:
+        print(f"Created {stats['created']} classes.")
+    elif stats["rejected"] or stats["conflicts"]:
+        print(f"Nothing was created: {stats['rejected']} invalid lines, "
+              f"{stats['conflicts']} conflicting classes. See {report_path} for details.")
+    elif check_only:
+        print("No conflicts found; nothing was created (check only).")
+    else:
+        print("The template has no classes to create.")
+
+
+#----------ADMIN-CLASS LISTING (KEYSET PAGES)------------
+
+CLASS_PAGE_SIZE = 20
+
+CLASS_LIST_FILTERS = {
+    "all": "TRUE",
+    "upcoming": "scheduled_at >= NOW()",
+    "trainer": "trainer_id = %(value)s",
+    "room": "room_id = %(value)s",
+}
 
+
+def fetch_class_page(class_filter, filter_value=None, after=None, before=None,
+                     page_size=CLASS_PAGE_SIZE, user_id=None):
+    """Return (rows, has_more) for one page of classes ordered by (scheduled_at, class_id).
+
+    after/before are (scheduled_at, class_id) keys from the last/first row of
+    the current page. Each page is a single index range scan of page_size+1
+    rows, so paging deep into history costs the same as the first page.
+    Rows are (class_id, class_name, trainer_id, room_id, scheduled_at,
+    capacity, duration_minutes, registered). Pass user_id so an admin who just
+    changed a class is not sent to a replica that has not seen it yet.
+    """
+    params = {"value": filter_value, "limit": page_size + 1}
+    conditions = [CLASS_LIST_FILTERS[class_filter]]
+    order = "scheduled_at, class_id"
+
+    if after is not None:
+        conditions.append("(scheduled_at, class_id) > (%(key_at)s, %(key_id)s)")
+        params["key_at"], params["key_id"] = after
+    elif before is not None:
+        conditions.append("(scheduled_at, class_id) < (%(key_at)s, %(key_id)s)")
+        params["key_at"], params["key_id"] = before
+        order = "scheduled_at DESC, class_id DESC"
+
+    con = get_read_connection(user_id)
+    cur = con.cursor()
+    cur.execute(
+        f"""
+        SELECT class_id, class_name, trainer_id, room_id, scheduled_at,
+               capacity, duration_minutes, registered_count
+        FROM GroupClass
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {order}
+        LIMIT %(limit)s;
+        """,
+        params
+    )
+    rows = cur.fetchall()
+    cur.close()
+    release_connection(con)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+    return rows, has_more
+
+
+# The member-facing catalog: upcoming classes with any mix of these filters.
+# Seat counts come from GroupClass.registered_count (kept current by a
+# trigger in DDL.sql), so a page is one range scan of the covering index
+# idx_groupclass_scheduled, with no counting.
+CLASS_CATALOG_FILTERS = {
+    "from": "scheduled_at >= %(from)s",
+    "to": "scheduled_at < %(to)s",
+    "trainer_id": "trainer_id = %(trainer_id)s",
+    "room_id": "room_id = %(room_id)s",
+    "name": "class_name ILIKE %(name)s",
+    "has_spots": "registered_count < capacity",
+}
+
+
+def fetch_class_catalog(filters=None, after=None, page_size=CLASS_PAGE_SIZE, user_id=None):
+    """Return (rows, has_more) for one catalog page ordered by (scheduled_at, class_id).
+
+    filters may hold from/to (datetimes), trainer_id, room_id, name (a
+    substring of the class name) and has_spots (True to hide full classes);
+    from defaults to now. after is the (scheduled_at, class_id) key of the
+    last row of the previous page. Rows are shaped like fetch_class_page().
+    """
+    filters = dict(filters or {})
+    filters.setdefault("from", datetime.now())
+    if not filters.get("has_spots"):
+        filters.pop("has_spots", None)
+    params = {k: v for k, v in filters.items() if v is not None}
+    if "name" in params:
+        params["name"] = "%" + params["name"].replace("%", r"\%").replace("_", r"\_") + "%"
+    conditions = [CLASS_CATALOG_FILTERS[k] for k in params]
+    params["limit"] = page_size + 1
+
+    if after is not None:
+        conditions.append("(scheduled_at, class_id) > (%(key_at)s, %(key_id)s)")
+        params["key_at"], params["key_id"] = after
+
+    con = get_read_connection(user_id)
+    try:
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT class_id, class_name, trainer_id, room_id, scheduled_at,
+                   capacity, duration_minutes, registered_count
+            FROM GroupClass
+            WHERE {" AND ".join(conditions)}
+            ORDER BY scheduled_at, class_id
+            LIMIT %(limit)s;
+            """,
+            params
+        )
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        release_connection(con)
+
+    return rows[:page_size], len(rows) > page_size
+
+
+def choose_from_class_catalog(filters=None, user_id=None):
+    """Page through the catalog; returns the class_id the member typed, or None."""
+    pages = [None]  # the after-key of each page seen so far
+
+    while True:
+        try:
+            rows, has_next = fetch_class_catalog(filters, after=pages[-1], user_id=user_id)
+        except Exception as e:
+            print("Error loading classes:", e)
+            return None
+
+        if not rows:
+            print("No upcoming group classes match.")
+            return None
+
+        print(f"\nUpcoming classes (page {len(pages)}):")
+        for cid, cname, tid, rid, sched, cap, dur, registered in rows:
+            print(
+                f"  ID {cid}: {cname} at {sched} ({dur} min), room {rid}, "
+                f"trainer {tid} -> {registered}/{cap} registered, {cap - registered} spots left"
+            )
+
+        options = []
+        if has_next:
+            options.append("n = next")
+        if len(pages) > 1:
+            options.append("p = previous")
+        options.append("class ID to register")
+        options.append("Enter = cancel")
+        answer = input("(" + ", ".join(options) + "): ").strip().lower()
+
+        if answer == "n" and has_next:
+            pages.append((rows[-1][4], rows[-1][0]))
+        elif answer == "p" and len(pages) > 1:
+            pages.pop()
+        elif answer.isdigit():
+            return int(answer)
+        else:
+            return None
+
+
+def prompt_class_catalog_filters():
+    """Ask a member how to narrow the catalog; returns a filters dict."""
+    filters = {}
+    if input("Filter the class list? (y/n): ").strip().lower() != "y":
+        return filters
+    name = input("Class name contains (Enter for any): ").strip()
+    if name:
+        filters["name"] = name
+    for key, label in (("from", "From date"), ("to", "To date")):
+        day_str = input(f"{label} ({DATE_FORMAT}, Enter for any): ").strip()
+        if day_str:
+            try:
+                day = datetime.strptime(day_str, DATE_FORMAT)
+            except ValueError:
+                print("Invalid date; ignored.")
+                continue
+            filters[key] = day + timedelta(days=1) if key == "to" else day
+    trainer_str = input("Trainer ID or name (Enter for any): ").strip()
+    if trainer_str:
+        filters["trainer_id"] = resolve_id("trainer", trainer_str)
+    room_str = input("Room ID or name (Enter for any): ").strip()
+    if room_str:
+        filters["room_id"] = resolve_id("room", room_str)
+    filters["has_spots"] = input("Only classes with spots left? (y/n): ").strip().lower() == "y"
+    return filters
+
+
+def browse_class_pages(class_filter, filter_value=None, user_id=None):
+    """Interactive next/previous paging over a class listing."""
+    after = before = None
+    page_no = 1
+
+    while True:
+        try:
+            rows, has_more = fetch_class_page(class_filter, filter_value, after=after, before=before,
+                                              user_id=user_id)
+        except Exception as e:
+            print("Error loading classes:", e)
+            return
+
+        if not rows:
+            print("No classes found.")
+            return
+
+        if before is not None:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = after is not None, has_more
+
+        print(f"\n--- Page {page_no} ---")
+        for cid, cname, tid, rid, sched, cap, dur, registered in rows:
+            print(f"[{cid}] {cname} — trainer {tid}, room {rid}, at {sched}, "
+                  f"cap {cap}, {dur} min, {registered}/{cap} registered")
+
+        options = []
+        if has_next:
+            options.append("n = next")
+        if has_prev:
+            options.append("p = previous")
+        options.append("Enter = done")
+        nav = input("(" + ", ".join(options) + "): ").strip().lower()
+
+        first_key = (rows[0][4], rows[0][0])
+        last_key = (rows[-1][4], rows[-1][0])
+        if nav == "n" and has_next:
+            after, before = last_key, None
+            page_no += 1
+        elif nav == "p" and has_prev:
+            after, before = None, first_key
+            page_no -= 1
+        else:
+            return
+
+
+#----------ADMIN-TRAINER UTILIZATION REPORTS------------
+
+TRAINER_REPORT_WEEKS = 12
+
+# Bookings count toward the week they start in. in_window_minutes clips each
+# booking to the trainer's daily availability window on its start day, the
+# same time-of-day rule get_available_trainers() applies.
+TRAINER_USAGE_REBUILD_SQL = """
+INSERT INTO TrainerWeeklyUsage (trainer_id, week_start, pt_minutes, class_minutes, in_window_minutes)
+WITH weeks AS (
+    SELECT DISTINCT trainer_id, week_start FROM trainer_usage_refresh
+),
+bookings AS (
+    SELECT w.trainer_id, w.week_start, 1 AS is_pt,
+           p.session_at AS b_start,
+           p.session_at + (p.duration_minutes * INTERVAL '1 minute') AS b_end
+    FROM weeks w
+    JOIN PTSession p
+      ON p.trainer_id = w.trainer_id
+     AND p.session_at >= w.week_start
+     AND p.session_at < w.week_start + INTERVAL '7 days'
+    UNION ALL
+    SELECT w.trainer_id, w.week_start, 0 AS is_pt,
+           g.scheduled_at,
+           g.scheduled_at + (g.duration_minutes * INTERVAL '1 minute')
+    FROM weeks w
+    JOIN GroupClass g
+      ON g.trainer_id = w.trainer_id
+     AND g.scheduled_at >= w.week_start
+     AND g.scheduled_at < w.week_start + INTERVAL '7 days'
+)
+SELECT b.trainer_id, b.week_start,
+       COALESCE(SUM(EXTRACT(EPOCH FROM b.b_end - b.b_start) / 60) FILTER (WHERE b.is_pt = 1), 0),
+       COALESCE(SUM(EXTRACT(EPOCH FROM b.b_end - b.b_start) / 60) FILTER (WHERE b.is_pt = 0), 0),
+       COALESCE(SUM(GREATEST(0, EXTRACT(EPOCH FROM
+           LEAST(b.b_end, b.b_start::date + t.end_time::time)
+           - GREATEST(b.b_start, b.b_start::date + t.start_time::time)) / 60)), 0)
+FROM bookings b
+JOIN Trainer t ON t.trainer_id = b.trainer_id
+GROUP BY b.trainer_id, b.week_start;
+"""
+
+
+def refresh_trainer_usage(backfill=False):
+    """Apply queued booking/availability changes to TrainerWeeklyUsage.
+
+    Returns the number of trainer-weeks rebuilt. backfill=True queues every
+    week that has a booking first.
+    """
+    con = get_connection()
+    cur = con.cursor()
+
+    if backfill:
+        cur.execute(
+            """
+            INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+            SELECT trainer_id, date_trunc('week', session_at)::date FROM PTSession
+            UNION
+            SELECT trainer_id, date_trunc('week', scheduled_at)::date FROM GroupClass;
+            """
+        )
+
+    cur.execute("CREATE TEMP TABLE trainer_usage_refresh (trainer_id INT, week_start DATE) ON COMMIT DROP;")
+    cur.execute(
+        """
+        WITH consumed AS (
+            DELETE FROM TrainerUsageDirtyWeek RETURNING trainer_id, week_start
+        )
+        INSERT INTO trainer_usage_refresh SELECT DISTINCT trainer_id, week_start FROM consumed;
+        """
+    )
+    weeks = cur.rowcount
+
+    if weeks:
+        cur.execute(
+            """
+            DELETE FROM TrainerWeeklyUsage u
+            USING trainer_usage_refresh w
+            WHERE u.trainer_id = w.trainer_id AND u.week_start = w.week_start;
+            """
+        )
+        cur.execute(TRAINER_USAGE_REBUILD_SQL)
+
+    con.commit()
+    cur.close()
+    con.close()
+    return weeks
+
+
+def trainer_utilization_report(weeks=TRAINER_REPORT_WEEKS, trainer_id=None):
+    """Per-trainer weekly workload for the last `weeks` weeks (current week included).
+
+    Reads at most `weeks` rollup rows per trainer by primary key, so the cost
+    does not depend on how much booking history there is. Rows are
+    (trainer_id, name, week_start, pt_minutes, class_minutes,
+    in_window_minutes, window_minutes).
+    """
+    trainer_filter = "WHERE t.trainer_id = %(trainer_id)s" if trainer_id is not None else ""
+
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute(
+        f"""
+        SELECT t.trainer_id, t.name, wk.week_start::date,
+               COALESCE(u.pt_minutes, 0),
+               COALESCE(u.class_minutes, 0),
+               COALESCE(u.in_window_minutes, 0),
+               7 * GREATEST(0, EXTRACT(EPOCH FROM t.end_time::time - t.start_time::time) / 60)
+        FROM Trainer t
+        CROSS JOIN generate_series(
+            date_trunc('week', CURRENT_DATE) - (%(weeks)s - 1) * INTERVAL '7 days',
+            date_trunc('week', CURRENT_DATE),
+            INTERVAL '7 days'
+        ) AS wk(week_start)
+        LEFT JOIN TrainerWeeklyUsage u
+          ON u.trainer_id = t.trainer_id AND u.week_start = wk.week_start::date
+        {trainer_filter}
+        ORDER BY t.trainer_id, wk.week_start;
+        """,
+        {"weeks": weeks, "trainer_id": trainer_id}
+    )
+    rows = cur.fetchall()
+    cur.close()
+    con.close()
+    return rows
+
+
+def admin_trainer_utilization(user):
+    print("\n=== Trainer Utilization ===")
+    weeks_str = input(f"Number of weeks (default {TRAINER_REPORT_WEEKS}): ").strip()
+    if weeks_str and not weeks_str.isdigit():
+        print("Invalid number of weeks.")
+        return
+    weeks = int(weeks_str) if weeks_str else TRAINER_REPORT_WEEKS
+    if weeks <= 0:
+        print("Number of weeks must be positive.")
+        return
+    show_weeks = input("Show week-by-week breakdown? (y/n): ").strip().lower() == "y"
+
+    try:
+        refresh_trainer_usage()
+        rows = trainer_utilization_report(weeks)
+    except Exception as e:
+        print("Error loading trainer utilization:", e)
+        return
+
+    if not rows:
+        print("No trainers found.")
+        return
+
+    by_trainer = {}
+    for row in rows:
+        by_trainer.setdefault((row[0], row[1]), []).append(row[2:])
+
+    for (t_id, t_name), week_rows in by_trainer.items():
+        pt_total = sum(float(r[1]) for r in week_rows)
+        class_total = sum(float(r[2]) for r in week_rows)
+        in_window = sum(float(r[3]) for r in week_rows)
+        window = sum(float(r[4]) for r in week_rows)
+        booked = pt_total + class_total
+        idle = max(0.0, window - in_window)
+
+        print(f"\n--- Trainer {t_id}: {t_name} (last {weeks} weeks) ---")
+        print(
+            f"Booked {booked / 60:.1f} h ({booked / 60 / weeks:.1f} h/week): "
+            f"PT {pt_total / 60:.1f} h, classes {class_total / 60:.1f} h"
+        )
+        if window:
+            print(f"Idle inside availability window: {idle / 60:.1f} h "
+                  f"({in_window / window:.0%} of window booked)")
+        else:
+            print("No availability window set.")
+
+        if show_weeks:
+            for week_start, pt_min, class_min, in_win, win in week_rows:
+                week_idle = max(0.0, float(win) - float(in_win))
+                print(
+                    f"  week of {week_start}: PT {float(pt_min) / 60:.1f} h, "
+                    f"classes {float(class_min) / 60:.1f} h, idle {week_idle / 60:.1f} h"
+                )
+
+
+#----------ADMIN-ROOM UTILIZATION REPORTS------------
+
+# Rebuilds RoomHourlyUsage for the queued (room, day) pairs. Each day is
+# swept once: +1/-1 events at booking edges plus a 0 marker at every hour
+# start, so a running SUM gives the exact number of bookings active in each
+# segment and no segment crosses an hour boundary.
+ROOM_USAGE_REBUILD_SQL = """
+INSERT INTO RoomHourlyUsage (room_id, usage_date, usage_hour, booked_minutes, pt_minutes,
+                             class_minutes, peak_pt_sessions, class_capacity, class_registrations)
+WITH days AS (
+    SELECT DISTINCT room_id, usage_date FROM room_usage_refresh
+),
+bookings AS (
+    SELECT d.room_id, d.usage_date, 1 AS is_pt,
+           GREATEST(p.session_at, d.usage_date::timestamp) AS b_start,
+           LEAST(p.session_at + (p.duration_minutes * INTERVAL '1 minute'),
+                 d.usage_date + INTERVAL '1 day') AS b_end
+    FROM days d
+    JOIN PTSession p
+      ON p.room_id = d.room_id
+     AND p.session_at < d.usage_date + INTERVAL '1 day'
+     AND p.session_at + (p.duration_minutes * INTERVAL '1 minute') > d.usage_date
+    UNION ALL
+    SELECT d.room_id, d.usage_date, 0 AS is_pt,
+           GREATEST(g.scheduled_at, d.usage_date::timestamp),
+           LEAST(g.scheduled_at + (g.duration_minutes * INTERVAL '1 minute'),
+                 d.usage_date + INTERVAL '1 day')
+    FROM days d
+    JOIN GroupClass g
+      ON g.room_id = d.room_id
+     AND g.scheduled_at < d.usage_date + INTERVAL '1 day'
+     AND g.scheduled_at + (g.duration_minutes * INTERVAL '1 minute') > d.usage_date
+),
+events AS (
+    SELECT room_id, usage_date, b_start AS ts, 1 AS d_all, is_pt AS d_pt FROM bookings
+    UNION ALL
+    SELECT room_id, usage_date, b_end, -1, -is_pt FROM bookings
+    UNION ALL
+    SELECT d.room_id, d.usage_date, d.usage_date + h * INTERVAL '1 hour', 0, 0
+    FROM days d CROSS JOIN generate_series(0, 23) AS h
+    UNION ALL
+    SELECT room_id, usage_date, usage_date + INTERVAL '1 day', 0, 0 FROM days
+),
+running AS (
+    -- ends sort before hour markers before starts at the same instant
+    SELECT room_id, usage_date, ts,
+           SUM(d_all) OVER w AS active_all,
+           SUM(d_pt) OVER w AS active_pt,
+           LEAD(ts) OVER w AS next_ts
+    FROM events
+    WINDOW w AS (PARTITION BY room_id, usage_date ORDER BY ts, d_all
+                 ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+),
+hour_stats AS (
+    SELECT room_id, usage_date, EXTRACT(HOUR FROM ts)::smallint AS usage_hour,
+           SUM(EXTRACT(EPOCH FROM next_ts - ts) / 60) FILTER (WHERE active_all > 0) AS booked_minutes,
+           SUM(active_pt * EXTRACT(EPOCH FROM next_ts - ts) / 60) AS pt_minutes,
+           SUM((active_all - active_pt) * EXTRACT(EPOCH FROM next_ts - ts) / 60) AS class_minutes,
+           MAX(active_pt) AS peak_pt_sessions
+    FROM running
+    WHERE ts < usage_date + INTERVAL '1 day'
+    GROUP BY room_id, usage_date, EXTRACT(HOUR FROM ts)
+),
+class_fill AS (
+    SELECT d.room_id, d.usage_date, EXTRACT(HOUR FROM g.scheduled_at)::smallint AS usage_hour,
+           SUM(g.capacity) AS class_capacity,
+           SUM(g.registered_count) AS class_registrations
+    FROM days d
+    JOIN GroupClass g
+      ON g.room_id = d.room_id
+     AND g.scheduled_at >= d.usage_date
+     AND g.scheduled_at < d.usage_date + INTERVAL '1 day'
+    GROUP BY d.room_id, d.usage_date, EXTRACT(HOUR FROM g.scheduled_at)
+)
+SELECT h.room_id, h.usage_date, h.usage_hour,
+       COALESCE(h.booked_minutes, 0), h.pt_minutes, h.class_minutes, h.peak_pt_sessions,
+       COALESCE(c.class_capacity, 0), COALESCE(c.class_registrations, 0)
+FROM hour_stats h
+LEFT JOIN class_fill c
+  ON c.room_id = h.room_id AND c.usage_date = h.usage_date AND c.usage_hour = h.usage_hour
+WHERE COALESCE(h.booked_minutes, 0) > 0 OR c.class_capacity IS NOT NULL;
+"""
+
+
+def refresh_room_usage(backfill=False):
+    """Apply queued booking changes to RoomHourlyUsage. Returns the number of room-days rebuilt.
+
+    Only (room, day) pairs queued by the booking triggers are recomputed, so a
+    refresh costs about as much as the bookings that changed. backfill=True
+    queues every day that has a booking first (for databases created before
+    the rollup existed).
+    """
+    con = get_connection()
+    cur = con.cursor()
+
+    if backfill:
+        cur.execute(
+            """
+            SELECT mark_room_usage_dirty(room_id, session_at, duration_minutes) FROM PTSession;
+            SELECT mark_room_usage_dirty(room_id, scheduled_at, duration_minutes) FROM GroupClass;
+            """
+        )
+
+    cur.execute("CREATE TEMP TABLE room_usage_refresh (room_id INT, usage_date DATE) ON COMMIT DROP;")
+    # Only queue rows visible to this snapshot are consumed; anything a
+    # concurrent booking adds stays queued for the next refresh.
+    cur.execute(
+        """
+        WITH consumed AS (
+            DELETE FROM RoomUsageDirtyDay RETURNING room_id, usage_date
+        )
+        INSERT INTO room_usage_refresh SELECT DISTINCT room_id, usage_date FROM consumed;
+        """
+    )
+    days = cur.rowcount
+
+    if days:
+        cur.execute(
+            """
+            DELETE FROM RoomHourlyUsage u
+            USING room_usage_refresh d
+            WHERE u.room_id = d.room_id AND u.usage_date = d.usage_date;
+            """
+        )
+        cur.execute(ROOM_USAGE_REBUILD_SQL)
+
+    con.commit()
+    cur.close()
+    con.close()
+    return days
+
+
+def room_utilization_report(start_date, end_date, room_id=None, group_by="day"):
+    """Read room utilization from the hourly rollup (end_date exclusive).
+
+    group_by="day" gives one row per room per date, "hour" one row per room
+    per hour of day across the whole range. Rows are (room_id, room_name,
+    capacity, bucket, booked_minutes, pt_minutes, peak_pt_sessions,
+    class_capacity, class_registrations).
+    """
+    bucket = "u.usage_date" if group_by == "day" else "u.usage_hour"
+    room_filter = "AND u.room_id = %(room_id)s" if room_id is not None else ""
+
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute(
+        f"""
+        SELECT u.room_id, r.name, r.capacity, {bucket},
+               SUM(u.booked_minutes), SUM(u.pt_minutes), MAX(u.peak_pt_sessions),
+               SUM(u.class_capacity), SUM(u.class_registrations)
+        FROM RoomHourlyUsage u
+        JOIN Room r ON r.room_id = u.room_id
+        WHERE u.usage_date >= %(start)s AND u.usage_date < %(end)s
+          {room_filter}
+        GROUP BY u.room_id, r.name, r.capacity, {bucket}
+        ORDER BY u.room_id, {bucket};
+        """,
+        {"start": start_date, "end": end_date, "room_id": room_id}
+    )
+    rows = cur.fetchall()
+    cur.close()
+    con.close()
+    return rows
+
+
+def admin_room_utilization(user):
+    print("\n=== Room Utilization ===")
+    print(f"Date range (format {DATE_FORMAT}); the end date is exclusive.")
+    try:
+        start_date = datetime.strptime(input("From date: ").strip(), DATE_FORMAT).date()
+        end_date = datetime.strptime(input("To date: ").strip(), DATE_FORMAT).date()
+    except ValueError:
+        print("Invalid date format.")
+        return
+
+    room_str = input("Room ID or name (press Enter for all rooms): ").strip()
+    room_id = resolve_id("room", room_str) if room_str else None
+    if room_str and room_id is None:
+        print("Invalid room id.")
+        return
+
+    group_by = "hour" if input("Group by (day/hour, default day): ").strip().lower() == "hour" else "day"
+
+    try:
+        refresh_room_usage()
+        rows = room_utilization_report(start_date, end_date, room_id, group_by)
+    except Exception as e:
+        print("Error loading room utilization:", e)
+        return
+
+    if not rows:
+        print("No bookings in that range.")
+        return
+
+    current_room = None
+    for (r_id, r_name, capacity, bucket, booked, pt_min, peak_pt,
+         class_cap, class_reg) in rows:
+        if r_id != current_room:
+            current_room = r_id
+            print(f"\n--- Room {r_id}: {r_name} (capacity {capacity}) ---")
+        label = f"{bucket:02d}:00" if group_by == "hour" else str(bucket)
+        fill = f"{class_reg}/{class_cap} seats ({class_reg / class_cap:.0%})" if class_cap else "no classes"
+        print(
+            f"{label}: booked {float(booked) / 60:.1f} h, PT {float(pt_min) / 60:.1f} session-h, "
+            f"peak PT {peak_pt}/{capacity}, classes {fill}"
+        )
+
+
+def admin_reports(user):
+    while True:
+        print("\n=== Reports ===")
+        print("1. Room utilization")
+        print("2. Trainer utilization")
+        print("3. All locations summary")
+        print("4. Room occupancy profile")
+        print("5. Schedule integrity scan")
+        print("6. Back")
+        choice = input("Choose: ").strip()
+
+        if choice == "1":
+            admin_room_utilization(user)
+        elif choice == "2":
+            admin_trainer_utilization(user)
+        elif choice == "3":
+            admin_global_summary(user)
         elif choice == "4":
+            admin_room_occupancy(user)
+        elif choice == "5":
+            admin_integrity_scan(user)
+        elif choice == "6":
             break
         else:
             print("Invalid choice.")
 
 
+#----------ADMIN-ROOM OCCUPANCY PROFILE------------
+
+def room_occupancy_profile(room_id, day, location_id=None):
+    """How full a room is over one day, as consecutive pieces of time.
+
+    Returns a list of dicts with start, end, pt_sessions (in progress
+    throughout the piece), class_running, out_of_service, capacity and
+    headroom (PT places still free; 0 while a class runs or the room is out
+    of service). Returns None if the room does not exist.
+    """
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    scan_from, scan_to = overlap_scan_bounds(day_start, day_end)
+
+    con = get_read_connection(location_id=location_id)
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT capacity FROM Room WHERE room_id = %s;", (room_id,))
+        row = cur.fetchone()
+        if row is None:
+            cur.close()
+            return None
+        capacity = row[0]
+
+        cur.execute(
+            "SELECT session_at, session_at + duration_minutes * INTERVAL '1 minute' FROM PTSession "
+            "WHERE room_id = %s AND session_at > %s AND session_at < %s;",
+            (room_id, scan_from, scan_to)
+        )
+        pt_sessions = cur.fetchall()
+        cur.execute(
+            "SELECT scheduled_at, scheduled_at + duration_minutes * INTERVAL '1 minute' FROM GroupClass "
+            "WHERE room_id = %s AND scheduled_at > %s AND scheduled_at < %s;",
+            (room_id, scan_from, scan_to)
+        )
+        classes = cur.fetchall()
+        cur.execute(
+            """
+            SELECT out_of_service_from, COALESCE(out_of_service_until, %s)
+            FROM MaintenanceTicket
+            WHERE room_id = %s AND equipment_no IS NULL
+              AND blocks_booking AND status <> 'CLOSED'
+              AND out_of_service_from < %s
+              AND (out_of_service_until IS NULL OR out_of_service_until > %s);
+            """,
+            (day_end, room_id, day_end, day_start)
+        )
+        outages = cur.fetchall()
+        cur.close()
+    finally:
+        release_connection(con)
+
+    profile = []
+    for seg_start, seg_end, (pt, cls, out) in occupancy_segments(
+            day_start, day_end, pt_sessions, classes, outages):
+        blocked = cls > 0 or out > 0
+        profile.append({
+            "start": seg_start,
+            "end": seg_end,
+            "pt_sessions": pt,
+            "class_running": cls > 0,
+            "out_of_service": out > 0,
+            "capacity": capacity,
+            "headroom": 0 if blocked else max(0, capacity - pt),
+        })
+    return profile
+
+
+def admin_room_occupancy(user):
+    print("\n=== Room Occupancy Profile ===")
+    room_id = resolve_id("room", input("Room ID (or name to search): "))
+    if room_id is None:
+        print("Invalid room id.")
+        return
+    day_str = input(f"Day ({DATE_FORMAT}, Enter for today): ").strip()
+    try:
+        day = datetime.strptime(day_str, DATE_FORMAT).date() if day_str else datetime.now().date()
+    except ValueError:
+        print("Invalid date.")
+        return
+
+    try:
+        profile = room_occupancy_profile(room_id, day)
+    except psycopg2.Error as e:
+        print("Error loading occupancy:", e)
+        return
+    if profile is None:
+        print("Room not found.")
+        return
+
+    print(f"\nRoom {room_id} on {day.strftime(DATE_FORMAT)} (capacity {profile[0]['capacity']})")
+    for seg in profile:
+        if seg["out_of_service"]:
+            what = "out of service"
+        elif seg["class_running"]:
+            what = "group class"
+        else:
+            what = f"{seg['pt_sessions']} PT session(s)"
+        print(f"  {seg['start']:%H:%M}-{seg['end']:%H:%M}  {what:<18} headroom {seg['headroom']}")
+
+
+#----------ADMIN-SCHEDULE INTEGRITY SCAN------------
+
+# The booking flows take lock_booking_resources() before their conflict
+# check, so two bookings made through the app at the same moment cannot both
+# get through. This scan finds what the app never checked: legacy data from
+# before the locks, bulk imports, and writes made directly in the database
+# or by other tools that bypass the app. Each check is a single sort-and-sweep:
+# bookings are ordered per resource and a window function carries the
+# latest-ending earlier booking along (as ARRAY[end epoch, kind, id], whose
+# MAX is the one ending last), so a booking conflicts when it starts before
+# that end. One sort per check, no pairwise joins.
+#
+#   python project.py integrity [report.csv] [location_id]
+#
+# Archived months are not scanned.
+
+INTEGRITY_FETCH_SIZE = 2000
+
+# kind_code 0 = PT session, 1 = class
+_TRAINER_BOOKINGS = """
+    SELECT trainer_id AS resource_id, 0 AS kind_code, session_id AS booking_id,
+           session_at AS starts_at, session_at + make_interval(mins => duration_minutes) AS ends_at
+    FROM PTSession
+    WHERE session_at >= %(range_start)s AND session_at < %(range_end)s
+    UNION ALL
+    SELECT trainer_id, 1, class_id,
+           scheduled_at, scheduled_at + make_interval(mins => duration_minutes)
+    FROM GroupClass
+    WHERE scheduled_at >= %(range_start)s AND scheduled_at < %(range_end)s
+"""
+
+_MEMBER_BOOKINGS = """
+    SELECT member_id AS resource_id, 0 AS kind_code, session_id AS booking_id,
+           session_at AS starts_at, session_at + make_interval(mins => duration_minutes) AS ends_at
+    FROM PTSession
+    WHERE session_at >= %(range_start)s AND session_at < %(range_end)s
+    UNION ALL
+    SELECT cr.member_id, 1, g.class_id,
+           g.scheduled_at, g.scheduled_at + make_interval(mins => g.duration_minutes)
+    FROM ClassRegistration cr
+    JOIN GroupClass g ON g.class_id = cr.class_id AND g.scheduled_at = cr.scheduled_at
+    WHERE cr.scheduled_at >= %(range_start)s AND cr.scheduled_at < %(range_end)s
+"""
+
+_ROOM_BOOKINGS = _TRAINER_BOOKINGS.replace("trainer_id", "room_id")
+
+_SWEEP_WINDOW = """
+    PARTITION BY resource_id ORDER BY starts_at, kind_code, booking_id
+    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+"""
+
+# Rows from every check:
+# (check, resource_id, kind_code, booking_id, start, end, other_kind_code, other_id, detail)
+DOUBLE_BOOKING_SQL = """
+SELECT %(check)s, resource_id, kind_code, booking_id, starts_at, ends_at,
+       prior[2]::int, prior[3]::int,
+       'overlaps until ' || ('epoch'::timestamp + prior[1] * INTERVAL '1 second')
+FROM (
+    SELECT b.*,
+           MAX(ARRAY[EXTRACT(EPOCH FROM ends_at), kind_code, booking_id]) OVER w AS prior
+    FROM ({bookings}) b
+    WINDOW w AS ({window})
+) swept
+WHERE prior[1] > EXTRACT(EPOCH FROM starts_at)
+"""
+
+# Classes take the whole room: a class clashes with anything in the room
+# before it that is still running, and anything clashes with a class before
+# it that is still running. (PT sessions only clash with each other through
+# room capacity, below.)
+ROOM_CLASH_SQL = """
+SELECT 'room_clash', resource_id, kind_code, booking_id, starts_at, ends_at,
+       other[2]::int, other[3]::int,
+       'overlaps until ' || ('epoch'::timestamp + other[1] * INTERVAL '1 second')
+FROM (
+    SELECT s.*,
+           CASE WHEN prior_class[1] > EXTRACT(EPOCH FROM starts_at) THEN prior_class
+                ELSE prior_any END AS other
+    FROM (
+        SELECT b.*,
+               MAX(ARRAY[EXTRACT(EPOCH FROM ends_at), kind_code, booking_id]) OVER w AS prior_any,
+               MAX(CASE WHEN kind_code = 1
+                        THEN ARRAY[EXTRACT(EPOCH FROM ends_at), kind_code, booking_id] END) OVER w
+                   AS prior_class
+        FROM ({bookings}) b
+        WINDOW w AS ({window})
+    ) s
+    WHERE prior_class[1] > EXTRACT(EPOCH FROM starts_at)
+       OR (kind_code = 1 AND prior_any[1] > EXTRACT(EPOCH FROM starts_at))
+) swept
+"""
+
+# Running count of PT sessions per room over their start (+1) and end (-1)
+# points; ends sort before starts at the same instant.
+ROOM_CAPACITY_SQL = """
+SELECT 'room_over_capacity', room_id, NULL::int, NULL::int, t, next_t, NULL::int, NULL::int,
+       in_use || ' PT sessions, capacity ' || capacity
+FROM (
+    SELECT room_id, capacity, t,
+           SUM(delta) OVER w AS in_use,
+           LEAD(t) OVER w AS next_t
+    FROM (
+        SELECT p.room_id, r.capacity, p.session_at AS t, 1 AS delta
+        FROM PTSession p JOIN Room r ON r.room_id = p.room_id
+        WHERE p.session_at >= %(range_start)s AND p.session_at < %(range_end)s
+        UNION ALL
+        SELECT p.room_id, r.capacity, p.session_at + make_interval(mins => p.duration_minutes), -1
+        FROM PTSession p JOIN Room r ON r.room_id = p.room_id
+        WHERE p.session_at >= %(range_start)s AND p.session_at < %(range_end)s
+    ) points
+    WINDOW w AS (PARTITION BY room_id ORDER BY t, delta ROWS UNBOUNDED PRECEDING)
+) counted
+WHERE in_use > capacity AND next_t > t
+"""
+
+INTEGRITY_CHECKS = {
+    "trainer_double_booking": DOUBLE_BOOKING_SQL.format(bookings=_TRAINER_BOOKINGS, window=_SWEEP_WINDOW),
+    "member_double_booking": DOUBLE_BOOKING_SQL.format(bookings=_MEMBER_BOOKINGS, window=_SWEEP_WINDOW),
+    "room_over_capacity": ROOM_CAPACITY_SQL,
+    "room_clash": ROOM_CLASH_SQL.format(bookings=_ROOM_BOOKINGS, window=_SWEEP_WINDOW),
+}
+_KIND_NAMES = {0: "PT session", 1: "class", None: None}
+
+
+def scan_schedule_integrity(checks=None, range_start=None, range_end=None, location_id=None):
+    """Yield every scheduling conflict in the location's bookings, check by check.
+
+    checks is a list of INTEGRITY_CHECKS names (default: all of them); the
+    range limits the scan to bookings starting in [range_start, range_end).
+    Each problem is a dict (check, resource_id, kind, booking_id, start,
+    end, other_kind, other_id, detail) and is yielded as soon as the server
+    produces it. Runs on a replica when one is available.
+    """
+    params = {
+        "range_start": range_start or datetime(1900, 1, 1),
+        "range_end": range_end or datetime(9999, 1, 1),
+    }
+    con = get_read_connection(location_id=location_id)
+    try:
+        for check in checks or INTEGRITY_CHECKS:
+            cur = con.cursor(name="integrity_" + check)
+            cur.itersize = INTEGRITY_FETCH_SIZE
+            cur.execute(INTEGRITY_CHECKS[check], dict(params, check=check))
+            for row in cur:
+                yield {
+                    "check": row[0], "resource_id": row[1], "kind": _KIND_NAMES[row[2]],
+                    "booking_id": row[3], "start": row[4], "end": row[5],
+                    "other_kind": _KIND_NAMES[row[6]], "other_id": row[7], "detail": row[8],
+                }
+            cur.close()
+            con.commit()
+    finally:
+        release_connection(con)
+
+
+def _describe_problem(p):
+    resource = "room" if p["check"].startswith("room") else p["check"].split("_")[0]
+    if p["kind"] is None:
+        return f"{p['check']}: {resource} {p['resource_id']} {p['start']} - {p['end']}: {p['detail']}"
+    return (f"{p['check']}: {resource} {p['resource_id']} {p['kind']} {p['booking_id']} "
+            f"at {p['start']} clashes with {p['other_kind']} {p['other_id']} ({p['detail']})")
+
+
+def write_integrity_report(report_path, location_id=None, echo=True, **scan_args):
+    """Run the scan, writing each problem to a CSV as it arrives; returns counts per check."""
+    counts = dict.fromkeys(scan_args.get("checks") or INTEGRITY_CHECKS, 0)
+    started = time.perf_counter()
+    columns = ["check", "resource_id", "kind", "booking_id", "start", "end",
+               "other_kind", "other_id", "detail"]
+    with open(report_path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        for problem in scan_schedule_integrity(location_id=location_id, **scan_args):
+            writer.writerow(problem)
+            counts[problem["check"]] += 1
+            if echo:
+                print(" ", _describe_problem(problem))
+    if echo:
+        for check, n in counts.items():
+            print(f"{check}: {n}")
+        print(f"Scan took {time.perf_counter() - started:.1f}s; report written to {report_path}")
+    return counts
+
+
+def admin_integrity_scan(user):
+    print("\n=== Schedule Integrity Scan ===")
+    from_str = input(f"From ({DATE_FORMAT}, Enter for all): ").strip()
+    to_str = input(f"To ({DATE_FORMAT}, Enter for all): ").strip()
+    try:
+        range_start = datetime.strptime(from_str, DATE_FORMAT) if from_str else None
+        range_end = datetime.strptime(to_str, DATE_FORMAT) + timedelta(days=1) if to_str else None
+    except ValueError:
+        print("Invalid date.")
+        return
+    report_path = input("Report file (default: integrity_report.csv): ").strip() \
+        or "integrity_report.csv"
+
+    try:
+        write_integrity_report(report_path, range_start=range_start, range_end=range_end)
+    except (psycopg2.Error, OSError) as e:
+        print("Error scanning schedule:", e)
+
+
+#----------ADMIN-BULK MEMBER IMPORT------------
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_COLUMNS = ("email", "password", "name", "dob", "gender", "phone", "address")
+
+
+def _validate_import_row(row):
+    """Return (clean_values, None) for a good CSV row, or (None, reason)."""
+    email = (row.get("email") or "").strip().lower()
+    password = (row.get("password") or "").strip()
+    name = (row.get("name") or "").strip()
+    dob = (row.get("dob") or "").strip() or None
+    gender = (row.get("gender") or "").strip() or None
+    phone = (row.get("phone") or "").strip() or None
+    address = (row.get("address") or "").strip() or None
+
+    if not email or "@" not in email or len(email) > 255:
+        return None, "invalid email"
+    if not password:
+        return None, "missing password"
+    if not name:
+        return None, "missing name"
+    if len(name) > 255 or (address and len(address) > 255) or (phone and len(phone) > 30):
+        return None, "field too long"
+    if dob:
+        try:
+            datetime.strptime(dob, "%Y-%m-%d")
+        except ValueError:
+            return None, "invalid date of birth"
+
+    return (email, password, name, dob, gender, phone, address), None
+
+
+def _flush_import_batch(con, cur, batch, reject_writer):
+    """COPY one batch into staging and insert UserAccount + Member set-wise.
+
+    batch maps line_no -> (clean_values, raw_row). Returns (imported, rejected).
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line_no, (values, _raw) in batch.items():
+        writer.writerow((line_no,) + tuple("" if v is None else v for v in values))
+    buf.seek(0)
+
+    try:
+        cur.copy_expert(
+            "COPY member_import_staging "
+            "(line_no, email, password, name, dob, gender, phone, address) "
+            "FROM STDIN WITH (FORMAT csv, NULL '');",
+            buf
+        )
+
+        # Emails already in UserAccount are skipped by ON CONFLICT against its
+        # unique index and come back from the final SELECT as rejects.
+        # (new_members runs even though the SELECT does not read it.)
+        cur.execute(
+            """
+            WITH new_accounts AS (
+                INSERT INTO UserAccount (email, password, role_type)
+                SELECT s.email, s.password, 'MEMBER'::user_role
+                FROM member_import_staging s
+                ORDER BY s.line_no
+                ON CONFLICT (email) DO NOTHING
+                RETURNING user_id, email
+            ),
+            new_members AS (
+                INSERT INTO Member (member_id, name, dob, gender, phone, address)
+                SELECT a.user_id, s.name, s.dob, s.gender, s.phone, s.address
+                FROM new_accounts a
+                JOIN member_import_staging s ON s.email = a.email
+                RETURNING member_id
+            )
+            SELECT 'REJECT', s.line_no
+            FROM member_import_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM new_accounts a WHERE a.email = s.email)
+            UNION ALL
+            SELECT 'NEW', a.user_id
+            FROM new_accounts a;
+            """
+        )
+        results = cur.fetchall()
+        duplicate_lines = sorted(v for kind, v in results if kind == "REJECT")
+        new_user_ids = [v for kind, v in results if kind == "NEW"]
+        con.commit()
+    except psycopg2.Error as e:
+        con.rollback()
+        for line_no, (_values, raw) in batch.items():
+            reject_writer.writerow([line_no, f"database error: {e.pgerror or e}".strip()] +
+                                   [raw.get(c, "") for c in IMPORT_COLUMNS])
+        return 0, len(batch)
+
+    try:
+        sync_accounts_to_shards(new_user_ids)
+    except Exception as e:
+        print("Error copying imported accounts to other locations:", e)
+
+    for line_no in duplicate_lines:
+        raw = batch[line_no][1]
+        reject_writer.writerow([line_no, "email already registered"] +
+                               [raw.get(c, "") for c in IMPORT_COLUMNS])
+
+    return len(batch) - len(duplicate_lines), len(duplicate_lines)
+
+
+def import_members_csv(csv_path, reject_path, batch_size=IMPORT_BATCH_SIZE):
+    """Stream a member CSV export into UserAccount + Member.
+
+    The file needs a header row with the IMPORT_COLUMNS names. Rows are
+    validated and deduped in batches of batch_size, so memory stays bounded
+    no matter how large the file is. Bad rows go to reject_path with a reason.
+    Returns a stats dict.
+    """
+    stats = {"read": 0, "imported": 0, "rejected": 0, "seconds": 0.0}
+    started = time.perf_counter()
+
+    con = get_home_connection()
+    cur = con.cursor()
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS member_import_staging (
+            line_no   INT NOT NULL,
+            email     VARCHAR(255) NOT NULL,
+            password  VARCHAR(255) NOT NULL,
+            name      VARCHAR(255) NOT NULL,
+            dob       DATE,
+            gender    TEXT,
+            phone     VARCHAR(30),
+            address   VARCHAR(255)
+        ) ON COMMIT DELETE ROWS;
+        """
+    )
+    con.commit()
+
+    with open(csv_path, newline="", encoding="utf-8") as src, \
+            open(reject_path, "w", newline="", encoding="utf-8") as rej:
+        reader = csv.DictReader(src)
+        missing = [c for c in ("email", "password", "name") if c not in (reader.fieldnames or [])]
+        if missing:
+            cur.close()
+            con.close()
+            raise ValueError("CSV is missing required columns: " + ", ".join(missing))
+
+        reject_writer = csv.writer(rej)
+        reject_writer.writerow(["line_no", "reason"] + list(IMPORT_COLUMNS))
+
+        batch = {}
+        batch_emails = set()
+        # line 1 is the header
+        for line_no, raw in enumerate(reader, start=2):
+            stats["read"] += 1
+            values, reason = _validate_import_row(raw)
+            if values is not None and values[0] in batch_emails:
+                values, reason = None, "duplicate email in file"
+            if values is None:
+                reject_writer.writerow([line_no, reason] + [raw.get(c, "") for c in IMPORT_COLUMNS])
+                stats["rejected"] += 1
+                continue
+
+            batch[line_no] = (values, raw)
+            batch_emails.add(values[0])
+
+            if len(batch) >= batch_size:
+                imported, rejected = _flush_import_batch(con, cur, batch, reject_writer)
+                stats["imported"] += imported
+                stats["rejected"] += rejected
+                batch = {}
+                batch_emails = set()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  {stats['read']} rows read, {stats['imported']} imported, "
+                    f"{stats['rejected']} rejected ({stats['read'] / elapsed:.0f} rows/s)"
+                )
+
+        if batch:
+            imported, rejected = _flush_import_batch(con, cur, batch, reject_writer)
+            stats["imported"] += imported
+            stats["rejected"] += rejected
+
+    cur.close()
+    con.close()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def admin_bulk_import_members(user):
+    print("\n=== Bulk Import Members ===")
+    print("CSV header must include: " + ",".join(IMPORT_COLUMNS))
+    csv_path = input("CSV file path: ").strip()
+    if not csv_path:
+        print("File path required.")
+        return
+    reject_path = input("Reject file path (default: rejects.csv): ").strip() or "rejects.csv"
+
+    try:
+        stats = import_members_csv(csv_path, reject_path)
+    except Exception as e:
+        print("Error importing members:", e)
+        return
+
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    print(
+        f"Done: {stats['read']} rows read, {stats['imported']} imported, "
+        f"{stats['rejected']} rejected in {stats['seconds']:.1f}s ({rate:.0f} rows/s)."
+    )
+    if stats["rejected"]:
+        print("Rejected rows written to", reject_path)
+
+
+#----------ADMIN-BOOKING ARCHIVE------------
+
+# PTSession, GroupClass and ClassRegistration are partitioned by month (see
+# DDL.sql). This job keeps BOOKING_MONTHS_AHEAD months of empty partitions
+# ready for new bookings, and moves months older than keep_months onto the
+# *Archive tables, where only MemberFullScheduleView and reports still read
+# them. Archived partitions are frozen (no more vacuum work) and can be moved
+# to a cheaper tablespace by setting ARCHIVE_TABLESPACE.
+#
+#   python project.py archive [keep_months] [location_id]
+
+BOOKING_MONTHS_AHEAD = 24
+ARCHIVE_KEEP_MONTHS = 3
+ARCHIVE_TABLESPACE = None
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def ensure_booking_partitions(months_ahead=BOOKING_MONTHS_AHEAD, location_id=None):
+    """Create any missing monthly partitions up to months_ahead; returns how many were made."""
+    this_month = datetime.now().date().replace(day=1)
+    con = get_connection(location_id)
+    cur = con.cursor()
+    cur.execute(
+        "SELECT create_booking_partitions(%s, %s);",
+        (this_month, _add_months(this_month, months_ahead))
+    )
+    created = cur.fetchone()[0]
+    con.commit()
+    cur.close()
+    con.close()
+    return created
+
+
+# (location_id, month) pairs whose partitions this process knows exist
+_partitioned_months = set()
+_partitioned_months_lock = threading.Lock()
+
+
+def ensure_booking_months(first, last=None, location_id=None):
+    """Create the monthly booking partitions from first's month to last's, if missing.
+
+    Booking paths call this before their own transaction, so a booking past
+    the prepared range (or an old one being entered) still has a partition
+    without waiting for the archive job. It runs in a short transaction of
+    its own: creating a partition locks the parent table, which must not
+    happen while a booking transaction holds locks on it.
+    """
+    if location_id is None:
+        location_id = _active_location
+    first_month = first.date().replace(day=1)
+    last_month = (last or first).date().replace(day=1)
+
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = _add_months(month, 1)
+    with _partitioned_months_lock:
+        missing = [m for m in months if (location_id, m) not in _partitioned_months]
+    if not missing:
+        return
+
+    con = get_pooled_connection("primary", location_id)
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT create_booking_partitions(%s, %s);", (missing[0], missing[-1]))
+        con.commit()
+        cur.close()
+    finally:
+        release_connection(con)
+    with _partitioned_months_lock:
+        _partitioned_months.update((location_id, m) for m in missing)
+
+
+def archive_old_bookings(keep_months=ARCHIVE_KEEP_MONTHS, location_id=None):
+    """Archive every live booking month that ended more than keep_months ago.
+
+    Each month is detached and re-attached in its own short transaction.
+    Returns the list of archived months.
+    """
+    if keep_months < 1:
+        raise ValueError("keep_months must be at least 1")
+    cutoff = _add_months(datetime.now().date().replace(day=1), -keep_months)
+
+    con = get_connection(location_id)
+    cur = con.cursor()
+    cur.execute(
+        """
+        SELECT to_date(substring(c.relname FROM '_p(\\d{4}_\\d{2})$'), 'YYYY_MM') AS month
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'groupclass'::regclass
+        ORDER BY 1;
+        """
+    )
+    months = [r[0] for r in cur.fetchall() if r[0] is not None and r[0] < cutoff]
+
+    archived = []
+    for month in months:
+        cur.execute("SELECT archive_booking_month(%s);", (month,))
+        if cur.fetchone()[0]:
+            archived.append(month)
+            # Availability is never asked for archived days
+            for table in ("RoomDayOccupancy", "TrainerDayOccupancy"):
+                cur.execute(
+                    f"DELETE FROM {table} WHERE day >= %s AND day < %s;",
+                    (month, _add_months(month, 1))
+                )
+        con.commit()
+
+    # VACUUM and SET TABLESPACE cannot run inside a transaction block.
+    con.autocommit = True
+    for month in archived:
+        for table in ("ptsession", "groupclass", "classregistration"):
+            part = f"{table}_p{month.strftime('%Y_%m')}"
+            if ARCHIVE_TABLESPACE:
+                cur.execute(f"ALTER TABLE {part} SET TABLESPACE {ARCHIVE_TABLESPACE};")
+            cur.execute(f"VACUUM (FREEZE, ANALYZE) {part};")
+    cur.close()
+    con.close()
+    return archived
+
+
+def admin_archive_bookings(user):
+    print("\n=== Archive Old Bookings ===")
+    keep_str = input(f"Months of history to keep live (Enter for {ARCHIVE_KEEP_MONTHS}): ").strip()
+    try:
+        keep_months = int(keep_str) if keep_str else ARCHIVE_KEEP_MONTHS
+        created = ensure_booking_partitions()
+        archived = archive_old_bookings(keep_months)
+    except ValueError as e:
+        print("Invalid input:", e)
+        return
+    except psycopg2.Error as e:
+        print("Error archiving bookings:", e)
+        return
+
+    print(f"Created {created} new monthly partition(s).")
+    if archived:
+        print("Archived:", ", ".join(m.strftime("%Y-%m") for m in archived))
+    else:
+        print("Nothing old enough to archive.")
+
+
 # ---------- MENUS ----------
 
 def member_menu(user):
@@ -1842,7 +6345,8 @@ def member_menu(user):
         print("5. Schedule PT session")
         print("6. Reschedule PT session")
         print("7. Register for group class")
-        print("8. Logout")
+        print("8. Export schedule")
+        print("9. Logout")
         choice = input("Choose: ").strip()
 
         if choice == "1":
@@ -1860,6 +6364,8 @@ def member_menu(user):
         elif choice == "7":
             register_group_class(user)
         elif choice == "8":
+            member_export_schedule(user)
+        elif choice == "9":
             break
         else:
             print("Invalid choice.")
@@ -1870,13 +6376,19 @@ def trainer_menu(user):
         print("\n=== Trainer Menu ===")
         print("1. View schedule")
         print("2. Set availability")
-        print("3. Logout")
+        print("3. Export schedule")
+        print("4. Live schedule")
+        print("5. Logout")
         choice = input("Choose: ").strip()
         if choice == "1":
             trainer_schedule_view(user)
         elif choice == "2":
             set_trainer_availability(user)
         elif choice == "3":
+            trainer_export_schedule(user)
+        elif choice == "4":
+            trainer_live_schedule(user)
+        elif choice == "5":
             break
         else:
             print("Invalid choice.")
@@ -1888,7 +6400,13 @@ def admin_menu(user):
         print("1. Equipment maintenance")
         print("2. Book room")
         print("3. Manage group classes")
-        print("4. Logout")
+        print("4. Bulk import members")
+        print("5. Export schedules")
+        print("6. Reports")
+        print("7. Prepared statement statistics")
+        print("8. Archive old bookings")
+        print("9. Find member or trainer")
+        print("10. Logout")
         choice = input("Choose: ").strip()
         if choice == "1":
             admin_equipment_maintenance(user)
@@ -1897,6 +6415,18 @@ def admin_menu(user):
         elif choice == "3":
             admin_manage_classes(user)
         elif choice == "4":
+            admin_bulk_import_members(user)
+        elif choice == "5":
+            admin_export_schedules(user)
+        elif choice == "6":
+            admin_reports(user)
+        elif choice == "7":
+            admin_prepared_statement_stats(user)
+        elif choice == "8":
+            admin_archive_bookings(user)
+        elif choice == "9":
+            admin_find_people(user)
+        elif choice == "10":
             break
         else:
             print("Invalid choice.")
@@ -1923,12 +6453,14 @@ def main():
         elif choice == "4":
             user = authenticate_user()
             if user:
-                if user["role_type"] == "MEMBER":
+                choose_location()
+                if user["role_type"] == Role.MEMBER:
                     member_menu(user)
-                elif user["role_type"] == "TRAINER":
+                elif user["role_type"] == Role.TRAINER:
                     trainer_menu(user)
-                elif user["role_type"] == "ADMIN":
+                elif user["role_type"] == Role.ADMIN:
                     admin_menu(user)
+                set_active_location(HOME_LOCATION_ID)
         elif choice == "5":
             print("Exiting...")
             break
@@ -1937,4 +6469,27 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["live-server"]:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else LIVE_HTTP_PORT
+        location_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        run_live_schedule_server(port, location_id)
+    elif sys.argv[1:2] == ["archive"]:
+        keep_months = int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_KEEP_MONTHS
+        location_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        print("Created", ensure_booking_partitions(location_id=location_id), "partition(s)")
+        print("Archived", archive_old_bookings(keep_months, location_id))
+    elif sys.argv[1:2] == ["simulate"]:
+        kind = sys.argv[2] if len(sys.argv) > 2 else "room"
+        runs = int(sys.argv[3]) if len(sys.argv) > 3 else SIM_RUNS
+        synthetic = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        run_schedule_simulation(kind, runs, synthetic=synthetic)
+    elif sys.argv[1:2] == ["integrity"]:
+        report_path = sys.argv[2] if len(sys.argv) > 2 else "integrity_report.csv"
+        location_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        write_integrity_report(report_path, location_id)
+    elif sys.argv[1:2] == ["reminders"]:
+        out_path = sys.argv[2] if len(sys.argv) > 2 else "reminders.jsonl"
+        location_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        run_reminder_worker(FileReminderSender(out_path), location_id=location_id)
+    else:
+        main()
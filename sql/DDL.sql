@@ -1,13 +1,23 @@
+--Trigram indexes (front desk search by name, email or phone)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+--Small fixed value sets are enums: 4 bytes per row instead of a repeated string.
+--ticket_priority is declared most urgent first, which is also its sort order.
+CREATE TYPE user_role AS ENUM ('MEMBER', 'TRAINER', 'ADMIN');
+CREATE TYPE ticket_priority AS ENUM ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW');
+CREATE TYPE ticket_status AS ENUM ('OPEN', 'IN_PROGRESS', 'CLOSED');
+
 CREATE TABLE UserAccount (
     user_id      INT GENERATED ALWAYS AS IDENTITY,
     email        VARCHAR(255) NOT NULL UNIQUE,
     password     VARCHAR(255) NOT NULL,
-    role_type    TEXT NOT NULL,
+    role_type    user_role NOT NULL,
     is_active    BOOLEAN NOT NULL DEFAULT TRUE,
-    PRIMARY KEY (user_id),
-    CHECK (role_type IN ('MEMBER', 'TRAINER', 'ADMIN'))
+    PRIMARY KEY (user_id)
 );
 
+CREATE INDEX idx_useraccount_email_trgm ON UserAccount USING GIN (email gin_trgm_ops);
+
 CREATE TABLE Member (
     member_id          INT PRIMARY KEY,
     name               VARCHAR(255) NOT NULL,
@@ -20,6 +30,8 @@ CREATE TABLE Member (
 );
 
 CREATE INDEX idx_member_member_id ON Member(member_id);
+CREATE INDEX idx_member_name_trgm ON Member USING GIN (name gin_trgm_ops);
+CREATE INDEX idx_member_phone_trgm ON Member USING GIN (phone gin_trgm_ops);
 
 CREATE TABLE Trainer (
     trainer_id   INT PRIMARY KEY,
@@ -30,6 +42,8 @@ CREATE TABLE Trainer (
     CHECK (end_time > start_time)
 );
 
+CREATE INDEX idx_trainer_name_trgm ON Trainer USING GIN (name gin_trgm_ops);
+
 CREATE TABLE FitnessGoal (
 	goal_id			INT GENERATED ALWAYS AS IDENTITY,
 	member_id		INT NOT NULL,
@@ -52,11 +66,20 @@ CREATE TABLE HealthMetric (
 	FOREIGN KEY		(member_id) REFERENCES Member(member_id)
 );
 
+--One row per club location; each location's shard holds its own rooms
+CREATE TABLE Location (
+	location_id		INT NOT NULL,
+	name			VARCHAR(255) NOT NULL,
+	PRIMARY KEY		(location_id)
+);
+
 CREATE TABLE Room (
 	room_id			INT GENERATED ALWAYS AS IDENTITY,
+	location_id		INT NOT NULL DEFAULT 1,
 	name			VARCHAR(255) NOT NULL,
 	capacity		INT NOT NULL,
-	PRIMARY KEY		(room_id)
+	PRIMARY KEY		(room_id),
+	FOREIGN KEY		(location_id) REFERENCES Location(location_id)
 );
 
 CREATE TABLE Equipment (
@@ -73,55 +96,199 @@ CREATE TABLE MaintenanceTicket (
 	room_id			INT,
 	equipment_no		INT,
 	issue			VARCHAR(255) NOT NULL,
-	priority		VARCHAR(50) NOT NULL,
-	status			VARCHAR(50) NOT NULL DEFAULT 'OPEN',
+	priority		ticket_priority NOT NULL DEFAULT 'MEDIUM',
+	status			ticket_status NOT NULL DEFAULT 'OPEN',
+	blocks_booking		BOOLEAN NOT NULL DEFAULT FALSE,
+	out_of_service_from	TIMESTAMP,
+	out_of_service_until	TIMESTAMP,
+	created_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	claimed_by		INT,
+	claim_expires_at	TIMESTAMP,
 	PRIMARY KEY		(ticket_id),
 	FOREIGN KEY		(room_id) REFERENCES Room(room_id),
+	FOREIGN KEY		(claimed_by) REFERENCES UserAccount(user_id),
 	FOREIGN KEY		(room_id, equipment_no) REFERENCES Equipment(room_id, equipment_no),
 	CHECK (
 		(room_id IS NOT NULL AND equipment_no IS NULL)
 		OR
 		(room_id IS NOT NULL AND equipment_no IS NOT NULL)
+	),
+	CHECK (
+		NOT blocks_booking
+		OR (out_of_service_from IS NOT NULL
+			AND (out_of_service_until IS NULL OR out_of_service_until > out_of_service_from))
 	)
 );
 
+--Open tickets that take a room or piece of equipment out of service.
+--Small (only blocking, unresolved tickets) and probed once per room by availability checks.
+CREATE INDEX idx_ticket_out_of_service ON MaintenanceTicket(room_id, equipment_no, out_of_service_from)
+	WHERE blocks_booking AND status <> 'CLOSED';
+
+--Technician work queue: unresolved tickets, most urgent and oldest first.
+CREATE INDEX idx_ticket_queue ON MaintenanceTicket(priority, created_at, ticket_id)
+	WHERE status <> 'CLOSED';
+
+--Bookings are range partitioned by month on their start time so conflict
+--checks only touch current months; old months are moved to the *Archive
+--tables by archive_booking_month(). Partitioned tables cannot have identity
+--columns, so ids come from plain sequences, and every key includes the
+--start time. Needs PostgreSQL 15+ (cross-partition updates under FKs).
+CREATE SEQUENCE groupclass_class_id_seq AS INT;
+
 CREATE TABLE GroupClass (
-	class_id		INT GENERATED ALWAYS AS IDENTITY,
+	class_id		INT NOT NULL DEFAULT nextval('groupclass_class_id_seq'),
 	class_name		VARCHAR(255) NOT NULL,
 	trainer_id		INT NOT NULL,
 	room_id			INT NOT NULL,
 	scheduled_at		TIMESTAMP NOT NULL,
 	capacity		INT NOT NULL,
 	duration_minutes	INT NOT NULL,
-	PRIMARY KEY		(class_id),
+	registered_count	INT NOT NULL DEFAULT 0,
+	PRIMARY KEY		(class_id, scheduled_at),
 	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id),
-	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
-);
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id),
+	CHECK			(duration_minutes > 0 AND duration_minutes <= 480)
+) PARTITION BY RANGE (scheduled_at);
+
+ALTER SEQUENCE groupclass_class_id_seq OWNED BY GroupClass.class_id;
+
+--Keyset pagination indexes for class listings (scheduled_at, class_id).
+--idx_groupclass_scheduled covers the class catalog, so a page of it is an
+--index-only scan.
+CREATE INDEX idx_groupclass_scheduled ON GroupClass(scheduled_at, class_id)
+	INCLUDE (class_name, trainer_id, room_id, capacity, duration_minutes, registered_count);
+CREATE INDEX idx_groupclass_trainer_scheduled ON GroupClass(trainer_id, scheduled_at, class_id);
+CREATE INDEX idx_groupclass_room_scheduled ON GroupClass(room_id, scheduled_at, class_id);
+CREATE INDEX idx_groupclass_name_trgm ON GroupClass USING GIN (class_name gin_trgm_ops);
+
+--scheduled_at is a copy of the class's start time so registrations live in
+--the same month partition as their class; ON UPDATE CASCADE keeps it in step.
+CREATE SEQUENCE classregistration_registration_id_seq AS INT;
 
 CREATE TABLE ClassRegistration (
-	registration_id		INT GENERATED ALWAYS AS IDENTITY,
+	registration_id		INT NOT NULL DEFAULT nextval('classregistration_registration_id_seq'),
 	class_id		INT NOT NULL,
 	member_id		INT NOT NULL,
-	PRIMARY KEY		(registration_id),
-	FOREIGN KEY		(class_id) REFERENCES GroupClass(class_id),
+	scheduled_at		TIMESTAMP NOT NULL,
+	PRIMARY KEY		(registration_id, scheduled_at),
+	CONSTRAINT fk_classregistration_class
+		FOREIGN KEY	(class_id, scheduled_at) REFERENCES GroupClass(class_id, scheduled_at)
+		ON UPDATE CASCADE,
 	FOREIGN KEY		(member_id) REFERENCES Member(member_id),
-	UNIQUE			(class_id, member_id)
-);
+	UNIQUE			(class_id, scheduled_at, member_id)
+) PARTITION BY RANGE (scheduled_at);
+
+ALTER SEQUENCE classregistration_registration_id_seq OWNED BY ClassRegistration.registration_id;
+
+CREATE INDEX idx_classregistration_member ON ClassRegistration(member_id, scheduled_at);
+
+CREATE SEQUENCE ptsession_session_id_seq AS INT;
 
 CREATE TABLE PTSession (
-	session_id		INT GENERATED ALWAYS AS IDENTITY,
+	session_id		INT NOT NULL DEFAULT nextval('ptsession_session_id_seq'),
 	member_id		INT NOT NULL,
 	trainer_id		INT NOT NULL,
 	room_id			INT NOT NULL,
 	session_at		TIMESTAMP NOT NULL,
 	duration_minutes	INT NOT NULL,
-	PRIMARY KEY		(session_id),
+	PRIMARY KEY		(session_id, session_at),
 	FOREIGN KEY		(member_id) REFERENCES Member(member_id),
 	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id),
-	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
-);
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id),
+	CHECK			(duration_minutes > 0 AND duration_minutes <= 480)
+) PARTITION BY RANGE (session_at);
+
+ALTER SEQUENCE ptsession_session_id_seq OWNED BY PTSession.session_id;
+
+CREATE INDEX idx_ptsession_session_at ON PTSession(session_at);
+CREATE INDEX idx_ptsession_room_at ON PTSession(room_id, session_at);
+CREATE INDEX idx_ptsession_trainer_at ON PTSession(trainer_id, session_at);
+CREATE INDEX idx_ptsession_member_at ON PTSession(member_id, session_at);
+
+--Archived months: same columns, no keys or triggers, read only in practice.
+CREATE TABLE GroupClassArchive (LIKE GroupClass) PARTITION BY RANGE (scheduled_at);
+CREATE TABLE ClassRegistrationArchive (LIKE ClassRegistration) PARTITION BY RANGE (scheduled_at);
+CREATE TABLE PTSessionArchive (LIKE PTSession) PARTITION BY RANGE (session_at);
+
+--Creates the missing monthly partitions of PTSession, GroupClass and
+--ClassRegistration for from_month through to_month. Months that were already
+--archived keep their partition name, so they are not created again. The
+--booking paths call it for their own month, so two sessions may race to
+--create the same partition; the loser just skips it.
+CREATE OR REPLACE FUNCTION create_booking_partitions(from_month DATE, to_month DATE)
+RETURNS INT
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    m       DATE := date_trunc('month', from_month)::date;
+    t       TEXT;
+    part    TEXT;
+    created INT := 0;
+BEGIN
+    WHILE m <= to_month LOOP
+        FOREACH t IN ARRAY ARRAY['ptsession', 'groupclass', 'classregistration'] LOOP
+            part := t || '_p' || to_char(m, 'YYYY_MM');
+            IF to_regclass(part) IS NULL THEN
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        part, t, m, (m + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                EXCEPTION WHEN duplicate_table OR unique_violation THEN
+                    NULL;
+                END;
+            END IF;
+        END LOOP;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+--Moves one month of bookings from the live tables to the *Archive tables.
+--Registrations go first and drop their FK to GroupClass (a class month can
+--only be detached once nothing live references it). Returns FALSE if the
+--month is not a live partition.
+CREATE OR REPLACE FUNCTION archive_booking_month(month DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    lo     DATE := date_trunc('month', month)::date;
+    hi     DATE := (date_trunc('month', month) + INTERVAL '1 month')::date;
+    suffix TEXT := '_p' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass('groupclass' || suffix)
+          AND inhparent = 'groupclass'::regclass
+    ) THEN
+        RETURN FALSE;
+    END IF;
 
---View for complete Member schedule (group classes + PT sessions)
+    EXECUTE format('ALTER TABLE ClassRegistration DETACH PARTITION %I', 'classregistration' || suffix);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT IF EXISTS fk_classregistration_class',
+                   'classregistration' || suffix);
+    EXECUTE format('ALTER TABLE GroupClass DETACH PARTITION %I', 'groupclass' || suffix);
+    EXECUTE format('ALTER TABLE PTSession DETACH PARTITION %I', 'ptsession' || suffix);
+
+    EXECUTE format('ALTER TABLE ClassRegistrationArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'classregistration' || suffix, lo, hi);
+    EXECUTE format('ALTER TABLE GroupClassArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'groupclass' || suffix, lo, hi);
+    EXECUTE format('ALTER TABLE PTSessionArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'ptsession' || suffix, lo, hi);
+    RETURN TRUE;
+END;
+$$;
+
+SELECT create_booking_partitions('2025-01-01', '2027-12-01');
+
+--View for complete Member schedule (group classes + PT sessions), including archived months
 CREATE VIEW MemberFullScheduleView AS
 SELECT
     'PT'::text AS schedule_type,
@@ -134,8 +301,13 @@ SELECT
     p.room_id,
     r.name AS room_name,
     NULL::int  AS class_id,
-    NULL::text AS class_name
-FROM PTSession p
+    NULL::text AS class_name,
+    p.session_id
+FROM (
+    SELECT session_id, member_id, trainer_id, room_id, session_at, duration_minutes FROM PTSession
+    UNION ALL
+    SELECT session_id, member_id, trainer_id, room_id, session_at, duration_minutes FROM PTSessionArchive
+) p
 JOIN Trainer t ON t.trainer_id = p.trainer_id
 JOIN Room    r ON r.room_id = p.room_id
 
@@ -152,9 +324,18 @@ SELECT
     g.room_id,
     r.name AS room_name,
     g.class_id,
-    g.class_name
-FROM ClassRegistration cr
-JOIN GroupClass g ON g.class_id = cr.class_id
+    g.class_name,
+    NULL::int AS session_id
+FROM (
+    SELECT class_id, member_id, scheduled_at FROM ClassRegistration
+    UNION ALL
+    SELECT class_id, member_id, scheduled_at FROM ClassRegistrationArchive
+) cr
+JOIN (
+    SELECT class_id, class_name, trainer_id, room_id, scheduled_at, duration_minutes FROM GroupClass
+    UNION ALL
+    SELECT class_id, class_name, trainer_id, room_id, scheduled_at, duration_minutes FROM GroupClassArchive
+) g ON g.class_id = cr.class_id AND g.scheduled_at = cr.scheduled_at
 JOIN Trainer   t ON t.trainer_id = g.trainer_id
 JOIN Room      r ON r.room_id   = g.room_id;
 
@@ -172,6 +353,7 @@ BEGIN
     INTO v_capacity
     FROM GroupClass
     WHERE class_id = NEW.class_id
+      AND scheduled_at = NEW.scheduled_at
     FOR UPDATE;
 
     IF v_capacity IS NULL THEN
@@ -180,7 +362,8 @@ BEGIN
     SELECT COUNT(*)
     INTO v_count
     FROM ClassRegistration
-    WHERE class_id = NEW.class_id;
+    WHERE class_id = NEW.class_id
+      AND scheduled_at = NEW.scheduled_at;
     v_count := v_count + 1;
 
     IF v_count > v_capacity THEN
@@ -201,3 +384,529 @@ FOR EACH ROW
 EXECUTE PROCEDURE
 check_class_capacity();
 
+--Keeps GroupClass.registered_count equal to the class's registrations, so
+--listings read seat counts without counting. Recounting (rather than +1/-1)
+--stays right when moving a class to another month moves its registrations
+--to another partition, which fires their DELETE and INSERT triggers.
+CREATE OR REPLACE FUNCTION refresh_class_registered_count()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_class_id      INT;
+    v_scheduled_at  TIMESTAMP;
+    v_count         INT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_class_id := OLD.class_id;
+        v_scheduled_at := OLD.scheduled_at;
+    ELSE
+        v_class_id := NEW.class_id;
+        v_scheduled_at := NEW.scheduled_at;
+    END IF;
+
+    --Same row lock as check_class_capacity, so concurrent registrations count in turn
+    PERFORM 1
+    FROM GroupClass
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at
+    FOR UPDATE;
+
+    SELECT COUNT(*)
+    INTO v_count
+    FROM ClassRegistration
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at;
+
+    UPDATE GroupClass
+    SET registered_count = v_count
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at
+      AND registered_count <> v_count;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_class_registered_count
+AFTER INSERT OR DELETE
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+refresh_class_registered_count();
+
+--Hourly room utilization rollup. Rows are rebuilt per (room, day) by the
+--application's refresh job for days queued in RoomUsageDirtyDay.
+CREATE TABLE RoomHourlyUsage (
+	room_id			INT NOT NULL,
+	usage_date		DATE NOT NULL,
+	usage_hour		SMALLINT NOT NULL,
+	booked_minutes		NUMERIC NOT NULL DEFAULT 0,
+	pt_minutes		NUMERIC NOT NULL DEFAULT 0,
+	class_minutes		NUMERIC NOT NULL DEFAULT 0,
+	peak_pt_sessions	INT NOT NULL DEFAULT 0,
+	class_capacity		INT NOT NULL DEFAULT 0,
+	class_registrations	INT NOT NULL DEFAULT 0,
+	PRIMARY KEY		(room_id, usage_date, usage_hour),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
+);
+
+CREATE INDEX idx_roomhourlyusage_date ON RoomHourlyUsage(usage_date);
+
+--Append-only queue of (room, day) pairs whose bookings changed
+CREATE TABLE RoomUsageDirtyDay (
+	dirty_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	room_id			INT NOT NULL,
+	usage_date		DATE NOT NULL,
+	PRIMARY KEY		(dirty_id)
+);
+
+--Queue every day touched by a booking of p_minutes starting at p_start
+CREATE OR REPLACE FUNCTION mark_room_usage_dirty(p_room_id INT, p_start TIMESTAMP, p_minutes INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    INSERT INTO RoomUsageDirtyDay (room_id, usage_date)
+    SELECT p_room_id, d::date
+    FROM generate_series(
+        p_start::date,
+        (p_start + (GREATEST(p_minutes, 1) * INTERVAL '1 minute') - INTERVAL '1 microsecond')::date,
+        INTERVAL '1 day'
+    ) AS d;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION room_usage_dirty_pt()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM mark_room_usage_dirty(OLD.room_id, OLD.session_at, OLD.duration_minutes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_room_usage_dirty(NEW.room_id, NEW.session_at, NEW.duration_minutes);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION room_usage_dirty_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM mark_room_usage_dirty(OLD.room_id, OLD.scheduled_at, OLD.duration_minutes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_room_usage_dirty(NEW.room_id, NEW.scheduled_at, NEW.duration_minutes);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+--Registrations only change the fill rate of the class's start hour
+CREATE OR REPLACE FUNCTION room_usage_dirty_registration()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_class_id      INT;
+    v_scheduled_at  TIMESTAMP;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_class_id := OLD.class_id;
+        v_scheduled_at := OLD.scheduled_at;
+    ELSE
+        v_class_id := NEW.class_id;
+        v_scheduled_at := NEW.scheduled_at;
+    END IF;
+
+    PERFORM mark_room_usage_dirty(g.room_id, g.scheduled_at, 0)
+    FROM GroupClass g
+    WHERE g.class_id = v_class_id
+      AND g.scheduled_at = v_scheduled_at;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_room_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_pt();
+
+CREATE TRIGGER trg_room_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_class();
+
+CREATE TRIGGER trg_room_usage_dirty_registration
+AFTER INSERT OR DELETE
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_registration();
+
+--Weekly trainer workload rollup, rebuilt per (trainer, week) by the
+--application's refresh job for weeks queued in TrainerUsageDirtyWeek.
+--in_window_minutes is booked time inside the trainer's daily availability window.
+CREATE TABLE TrainerWeeklyUsage (
+	trainer_id		INT NOT NULL,
+	week_start		DATE NOT NULL,
+	pt_minutes		NUMERIC NOT NULL DEFAULT 0,
+	class_minutes		NUMERIC NOT NULL DEFAULT 0,
+	in_window_minutes	NUMERIC NOT NULL DEFAULT 0,
+	PRIMARY KEY		(trainer_id, week_start),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id)
+);
+
+CREATE TABLE TrainerUsageDirtyWeek (
+	dirty_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	trainer_id		INT NOT NULL,
+	week_start		DATE NOT NULL,
+	PRIMARY KEY		(dirty_id)
+);
+
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_pt()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (OLD.trainer_id, date_trunc('week', OLD.session_at)::date);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (NEW.trainer_id, date_trunc('week', NEW.session_at)::date);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (OLD.trainer_id, date_trunc('week', OLD.scheduled_at)::date);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (NEW.trainer_id, date_trunc('week', NEW.scheduled_at)::date);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+--A new availability window changes in_window_minutes for every week already rolled up
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_window()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF NEW.start_time::time IS DISTINCT FROM OLD.start_time::time
+       OR NEW.end_time::time IS DISTINCT FROM OLD.end_time::time THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        SELECT trainer_id, week_start
+        FROM TrainerWeeklyUsage
+        WHERE trainer_id = NEW.trainer_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_trainer_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_pt();
+
+CREATE TRIGGER trg_trainer_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_class();
+
+CREATE TRIGGER trg_trainer_usage_dirty_window
+AFTER UPDATE OF start_time, end_time
+ON Trainer
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_window();
+
+--Transactional outbox: booking/class/ticket writes add an event here in the
+--same transaction. tx_id lets consumers skip events of still-running transactions.
+CREATE TABLE OutboxEvent (
+	event_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	tx_id			BIGINT NOT NULL DEFAULT txid_current(),
+	aggregate_type		VARCHAR(50) NOT NULL,
+	aggregate_id		INT NOT NULL,
+	event_type		VARCHAR(100) NOT NULL,
+	payload			JSONB NOT NULL DEFAULT '{}',
+	created_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(event_id)
+);
+
+CREATE INDEX idx_outboxevent_tx_event ON OutboxEvent(tx_id, event_id);
+
+CREATE TABLE OutboxCheckpoint (
+	consumer_name		VARCHAR(100) NOT NULL,
+	last_tx_id		BIGINT NOT NULL DEFAULT 0,
+	last_event_id		BIGINT NOT NULL DEFAULT 0,
+	updated_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(consumer_name)
+);
+
+--Live schedule push: booking changes NOTIFY the schedule_changes channel with
+--the trainer, room and day they touch. Notifications are sent on commit, and
+--identical payloads within one transaction are only delivered once.
+CREATE OR REPLACE FUNCTION notify_schedule_change(kind TEXT, t_id INT, r_id INT, start_at TIMESTAMP)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    PERFORM pg_notify('schedule_changes', json_build_object(
+        'kind', kind,
+        'trainer_id', t_id,
+        'room_id', r_id,
+        'day', start_at::date
+    )::text);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notify_pt_session_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM notify_schedule_change('pt_session', OLD.trainer_id, OLD.room_id, OLD.session_at);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM notify_schedule_change('pt_session', NEW.trainer_id, NEW.room_id, NEW.session_at);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notify_group_class_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM notify_schedule_change('group_class', OLD.trainer_id, OLD.room_id, OLD.scheduled_at);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM notify_schedule_change('group_class', NEW.trainer_id, NEW.room_id, NEW.scheduled_at);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_notify_pt_session_change
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_pt_session_change();
+
+CREATE TRIGGER trg_notify_group_class_change
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_group_class_change();
+
+--Reminders already sent, one row per booking, member and start time.
+CREATE TABLE ReminderLedger (
+	booking_kind		VARCHAR(10) NOT NULL,
+	booking_id		INT NOT NULL,
+	member_id		INT NOT NULL,
+	starts_at		TIMESTAMP NOT NULL,
+	sent_at			TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(booking_kind, booking_id, member_id, starts_at),
+	CHECK			(booking_kind IN ('PT', 'CLASS'))
+);
+
+CREATE INDEX idx_reminderledger_starts_at ON ReminderLedger(starts_at);
+
+--Every ticket status change. changed_by comes from the app.actor setting,
+--which the application sets per transaction.
+CREATE TABLE TicketStatusHistory (
+	history_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	ticket_id		INT NOT NULL,
+	old_status		ticket_status,
+	new_status		ticket_status NOT NULL,
+	changed_by		INT,
+	changed_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(history_id),
+	FOREIGN KEY		(ticket_id) REFERENCES MaintenanceTicket(ticket_id) ON DELETE CASCADE,
+	FOREIGN KEY		(changed_by) REFERENCES UserAccount(user_id)
+);
+
+CREATE INDEX idx_ticketstatushistory_ticket ON TicketStatusHistory(ticket_id, changed_at);
+
+CREATE OR REPLACE FUNCTION log_ticket_status_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.status IS DISTINCT FROM OLD.status THEN
+        INSERT INTO TicketStatusHistory (ticket_id, old_status, new_status, changed_by)
+        VALUES (
+            NEW.ticket_id,
+            CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+            NEW.status,
+            NULLIF(current_setting('app.actor', true), '')::int
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_ticket_status_history
+AFTER INSERT OR UPDATE OF status
+ON MaintenanceTicket
+FOR EACH ROW
+EXECUTE PROCEDURE
+log_ticket_status_change();
+
+--Occupancy index: per room and per trainer, per day, how many bookings
+--cover each 5-minute slot (288 slots, slot 1 = 00:00-00:05). Bookings are
+--rounded out to whole slots, so a slot counts a booking that covers any
+--part of it. Kept up to date by triggers on PTSession and GroupClass;
+--availability lookups read a slice of these arrays instead of bookings.
+CREATE TABLE RoomDayOccupancy (
+	room_id			INT NOT NULL,
+	day			DATE NOT NULL,
+	pt_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	class_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	PRIMARY KEY		(day, room_id),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
+);
+
+CREATE TABLE TrainerDayOccupancy (
+	trainer_id		INT NOT NULL,
+	day			DATE NOT NULL,
+	busy_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	PRIMARY KEY		(day, trainer_id),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id)
+);
+
+--Adds p_delta to the slots covered by one booking, day by day
+CREATE OR REPLACE FUNCTION add_occupancy(p_table TEXT, p_key TEXT, p_column TEXT, p_id INT,
+                                         p_start TIMESTAMP, p_minutes INT, p_delta INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_end    TIMESTAMP := p_start + make_interval(mins => p_minutes);
+    v_day    DATE := p_start::date;
+    v_first  INT;
+    v_last   INT;
+BEGIN
+    WHILE v_day < v_end LOOP
+        v_first := FLOOR(EXTRACT(EPOCH FROM GREATEST(p_start, v_day) - v_day) / 300)::int + 1;
+        v_last := CEIL(EXTRACT(EPOCH FROM LEAST(v_end, v_day + 1) - v_day) / 300)::int;
+
+        EXECUTE format('INSERT INTO %I (%I, day) VALUES ($1, $2) ON CONFLICT DO NOTHING',
+                       p_table, p_key)
+        USING p_id, v_day;
+        EXECUTE format(
+            'UPDATE %1$I SET %3$I = ('
+            '    SELECT array_agg(CASE WHEN i BETWEEN $3 AND $4 THEN (c + $5)::smallint ELSE c END'
+            '                     ORDER BY i)'
+            '    FROM unnest(%3$I) WITH ORDINALITY AS u(c, i))'
+            ' WHERE %2$I = $1 AND day = $2',
+            p_table, p_key, p_column)
+        USING p_id, v_day, v_first, v_last, p_delta;
+
+        v_day := v_day + 1;
+    END LOOP;
+END;
+$$;
+
+--A booking moved to another month is deleted and re-inserted (partition
+--row movement), which fires the DELETE and INSERT branches; that is fine
+--because they undo and redo its slots.
+CREATE OR REPLACE FUNCTION occupancy_pt_session()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'pt_slots',
+                              OLD.room_id, OLD.session_at, OLD.duration_minutes, -1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              OLD.trainer_id, OLD.session_at, OLD.duration_minutes, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'pt_slots',
+                              NEW.room_id, NEW.session_at, NEW.duration_minutes, 1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              NEW.trainer_id, NEW.session_at, NEW.duration_minutes, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION occupancy_group_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'class_slots',
+                              OLD.room_id, OLD.scheduled_at, OLD.duration_minutes, -1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              OLD.trainer_id, OLD.scheduled_at, OLD.duration_minutes, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'class_slots',
+                              NEW.room_id, NEW.scheduled_at, NEW.duration_minutes, 1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              NEW.trainer_id, NEW.scheduled_at, NEW.duration_minutes, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_occupancy_pt_session
+AFTER INSERT OR DELETE OR UPDATE OF room_id, trainer_id, session_at, duration_minutes
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+occupancy_pt_session();
+
+CREATE TRIGGER trg_occupancy_group_class
+AFTER INSERT OR DELETE OR UPDATE OF room_id, trainer_id, scheduled_at, duration_minutes
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+occupancy_group_class();
@@ -28,6 +28,9 @@ INSERT INTO HealthMetric (member_id, measured_at, height, weight, bfp, heart_rat
 (1, '2025-12-09 10:00:00', 165, 76, 20.0, 70),
 (2, '2025-11-01 14:00:00', 180, 85, 22.0, 90);
 
+INSERT INTO Location (location_id, name) VALUES
+(1, 'Main Club');
+
 INSERT INTO Room (name, capacity) VALUES
 ('Room A', 20),
 ('Room B', 10),
@@ -41,19 +44,19 @@ INSERT INTO Equipment (room_id, equipment_no, name, type) VALUES
 (3, 1, 'Resistance Bands', 'Strength');
 
 INSERT INTO MaintenanceTicket (room_id, equipment_no, issue, priority, status) VALUES
-(1, 1, 'Treadmill belt is slipping', 'High', 'OPEN'),
-(1, 2, 'Exercise bike makes noise', 'Medium', 'OPEN'),
-(3, NULL, 'AC is not working', 'Low', 'OPEN');
+(1, 1, 'Treadmill belt is slipping', 'HIGH', 'OPEN'),
+(1, 2, 'Exercise bike makes noise', 'MEDIUM', 'OPEN'),
+(3, NULL, 'AC is not working', 'LOW', 'OPEN');
 
 INSERT INTO GroupClass (class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes) VALUES
 ('Yoga Basics', 4, 1, '2025-11-30 10:00:00', 10, 60),
 ('Pushup Competition', 5, 2, '2025-11-30 14:00:00', 15, 45),
 ('Pilates', 6, 4, '2025-12-03 08:30:00', 25, 60);
 
-INSERT INTO ClassRegistration (class_id, member_id) VALUES
-(1, 1),
-(2, 2),
-(3, 3);
+INSERT INTO ClassRegistration (class_id, member_id, scheduled_at) VALUES
+(1, 1, '2025-11-30 10:00:00'),
+(2, 2, '2025-11-30 14:00:00'),
+(3, 3, '2025-12-03 08:30:00');
 
 INSERT INTO PTSession (member_id, trainer_id, room_id, session_at, duration_minutes) VALUES
 (1, 4, 1, '2025-12-05 11:00:00', 60),
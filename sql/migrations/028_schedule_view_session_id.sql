@@ -0,0 +1,41 @@
+--Migration: add session_id to MemberFullScheduleView for the schedule export.
+--Run once against each location database created from the baseline DDL.sql.
+--The new column goes last, so the view can be replaced in place.
+
+CREATE OR REPLACE VIEW MemberFullScheduleView AS
+SELECT
+    'PT'::text AS schedule_type,
+    p.member_id,
+    p.session_at AS start_time,
+    p.session_at
+        + (p.duration_minutes * INTERVAL '1 minute') AS end_time,
+    p.trainer_id,
+    t.name AS trainer_name,
+    p.room_id,
+    r.name AS room_name,
+    NULL::int  AS class_id,
+    NULL::text AS class_name,
+    p.session_id
+FROM PTSession p
+JOIN Trainer t ON t.trainer_id = p.trainer_id
+JOIN Room    r ON r.room_id = p.room_id
+
+UNION ALL
+
+SELECT
+    'CLASS'::text AS schedule_type,
+    cr.member_id,
+    g.scheduled_at AS start_time,
+    g.scheduled_at
+        + (g.duration_minutes * INTERVAL '1 minute') AS end_time,
+    g.trainer_id,
+    t.name AS trainer_name,
+    g.room_id,
+    r.name AS room_name,
+    g.class_id,
+    g.class_name,
+    NULL::int AS session_id
+FROM ClassRegistration cr
+JOIN GroupClass g ON g.class_id = cr.class_id
+JOIN Trainer   t ON t.trainer_id = g.trainer_id
+JOIN Room      r ON r.room_id   = g.room_id;
@@ -0,0 +1,8 @@
+--Migration: keyset pagination indexes for the admin class listings.
+--Run once against each location database after 028.
+
+CREATE INDEX IF NOT EXISTS idx_groupclass_scheduled ON GroupClass(scheduled_at, class_id);
+CREATE INDEX IF NOT EXISTS idx_groupclass_trainer_scheduled ON GroupClass(trainer_id, scheduled_at, class_id);
+CREATE INDEX IF NOT EXISTS idx_groupclass_room_scheduled ON GroupClass(room_id, scheduled_at, class_id);
+
+ANALYZE GroupClass;
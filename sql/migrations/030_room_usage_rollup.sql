@@ -0,0 +1,129 @@
+--Migration: hourly room utilization rollup (RoomHourlyUsage) and the
+--triggers that queue changed (room, day) pairs in RoomUsageDirtyDay.
+--Run once against each location database after 029. Every day that
+--already has a booking is queued, so the next refresh builds the history.
+
+BEGIN;
+
+--Hourly room utilization rollup. Rows are rebuilt per (room, day) by the
+--application's refresh job for days queued in RoomUsageDirtyDay.
+CREATE TABLE RoomHourlyUsage (
+	room_id			INT NOT NULL,
+	usage_date		DATE NOT NULL,
+	usage_hour		SMALLINT NOT NULL,
+	booked_minutes		NUMERIC NOT NULL DEFAULT 0,
+	pt_minutes		NUMERIC NOT NULL DEFAULT 0,
+	class_minutes		NUMERIC NOT NULL DEFAULT 0,
+	peak_pt_sessions	INT NOT NULL DEFAULT 0,
+	class_capacity		INT NOT NULL DEFAULT 0,
+	class_registrations	INT NOT NULL DEFAULT 0,
+	PRIMARY KEY		(room_id, usage_date, usage_hour),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
+);
+
+CREATE INDEX idx_roomhourlyusage_date ON RoomHourlyUsage(usage_date);
+
+--Append-only queue of (room, day) pairs whose bookings changed
+CREATE TABLE RoomUsageDirtyDay (
+	dirty_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	room_id			INT NOT NULL,
+	usage_date		DATE NOT NULL,
+	PRIMARY KEY		(dirty_id)
+);
+
+--Queue every day touched by a booking of p_minutes starting at p_start
+CREATE OR REPLACE FUNCTION mark_room_usage_dirty(p_room_id INT, p_start TIMESTAMP, p_minutes INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    INSERT INTO RoomUsageDirtyDay (room_id, usage_date)
+    SELECT p_room_id, d::date
+    FROM generate_series(
+        p_start::date,
+        (p_start + (GREATEST(p_minutes, 1) * INTERVAL '1 minute') - INTERVAL '1 microsecond')::date,
+        INTERVAL '1 day'
+    ) AS d;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION room_usage_dirty_pt()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM mark_room_usage_dirty(OLD.room_id, OLD.session_at, OLD.duration_minutes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_room_usage_dirty(NEW.room_id, NEW.session_at, NEW.duration_minutes);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION room_usage_dirty_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM mark_room_usage_dirty(OLD.room_id, OLD.scheduled_at, OLD.duration_minutes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_room_usage_dirty(NEW.room_id, NEW.scheduled_at, NEW.duration_minutes);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+--Registrations only change the fill rate of the class's start hour
+CREATE OR REPLACE FUNCTION room_usage_dirty_registration()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_class_id  INT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_class_id := OLD.class_id;
+    ELSE
+        v_class_id := NEW.class_id;
+    END IF;
+
+    PERFORM mark_room_usage_dirty(g.room_id, g.scheduled_at, 0)
+    FROM GroupClass g
+    WHERE g.class_id = v_class_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_room_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_pt();
+
+CREATE TRIGGER trg_room_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_class();
+
+CREATE TRIGGER trg_room_usage_dirty_registration
+AFTER INSERT OR DELETE
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_registration();
+
+SELECT mark_room_usage_dirty(room_id, session_at, duration_minutes) FROM PTSession;
+SELECT mark_room_usage_dirty(room_id, scheduled_at, duration_minutes) FROM GroupClass;
+
+COMMIT;
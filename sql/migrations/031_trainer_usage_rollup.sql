@@ -0,0 +1,108 @@
+--Migration: weekly trainer workload rollup (TrainerWeeklyUsage) and the
+--triggers that queue changed (trainer, week) pairs in TrainerUsageDirtyWeek.
+--Run once against each location database after 030. Every week that
+--already has a booking is queued, so the next refresh builds the history.
+
+BEGIN;
+
+--Weekly trainer workload rollup, rebuilt per (trainer, week) by the
+--application's refresh job for weeks queued in TrainerUsageDirtyWeek.
+--in_window_minutes is booked time inside the trainer's daily availability window.
+CREATE TABLE TrainerWeeklyUsage (
+	trainer_id		INT NOT NULL,
+	week_start		DATE NOT NULL,
+	pt_minutes		NUMERIC NOT NULL DEFAULT 0,
+	class_minutes		NUMERIC NOT NULL DEFAULT 0,
+	in_window_minutes	NUMERIC NOT NULL DEFAULT 0,
+	PRIMARY KEY		(trainer_id, week_start),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id)
+);
+
+CREATE TABLE TrainerUsageDirtyWeek (
+	dirty_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	trainer_id		INT NOT NULL,
+	week_start		DATE NOT NULL,
+	PRIMARY KEY		(dirty_id)
+);
+
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_pt()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (OLD.trainer_id, date_trunc('week', OLD.session_at)::date);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (NEW.trainer_id, date_trunc('week', NEW.session_at)::date);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (OLD.trainer_id, date_trunc('week', OLD.scheduled_at)::date);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        VALUES (NEW.trainer_id, date_trunc('week', NEW.scheduled_at)::date);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+--A new availability window changes in_window_minutes for every week already rolled up
+CREATE OR REPLACE FUNCTION trainer_usage_dirty_window()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF NEW.start_time::time IS DISTINCT FROM OLD.start_time::time
+       OR NEW.end_time::time IS DISTINCT FROM OLD.end_time::time THEN
+        INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+        SELECT trainer_id, week_start
+        FROM TrainerWeeklyUsage
+        WHERE trainer_id = NEW.trainer_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_trainer_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_pt();
+
+CREATE TRIGGER trg_trainer_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_class();
+
+CREATE TRIGGER trg_trainer_usage_dirty_window
+AFTER UPDATE OF start_time, end_time
+ON Trainer
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_window();
+
+INSERT INTO TrainerUsageDirtyWeek (trainer_id, week_start)
+SELECT trainer_id, date_trunc('week', session_at)::date FROM PTSession
+UNION
+SELECT trainer_id, date_trunc('week', scheduled_at)::date FROM GroupClass;
+
+COMMIT;
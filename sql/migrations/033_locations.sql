@@ -0,0 +1,23 @@
+--Migration: Location table and Room.location_id for location shards.
+--Run once against each location database after 031. Existing rooms are
+--assigned to location 1; on the shard of another location, change the
+--id and name in the INSERT and the UPDATE before running.
+
+BEGIN;
+
+--One row per club location; each location's shard holds its own rooms
+CREATE TABLE Location (
+	location_id		INT NOT NULL,
+	name			VARCHAR(255) NOT NULL,
+	PRIMARY KEY		(location_id)
+);
+
+INSERT INTO Location (location_id, name) VALUES
+(1, 'Main Club');
+
+ALTER TABLE Room ADD COLUMN location_id INT NOT NULL DEFAULT 1;
+UPDATE Room SET location_id = 1;
+ALTER TABLE Room
+	ADD FOREIGN KEY (location_id) REFERENCES Location(location_id);
+
+COMMIT;
@@ -0,0 +1,29 @@
+--Migration: transactional outbox tables (OutboxEvent, OutboxCheckpoint).
+--Run once against each location database after 033.
+
+BEGIN;
+
+--Transactional outbox: booking/class/ticket writes add an event here in the
+--same transaction. tx_id lets consumers skip events of still-running transactions.
+CREATE TABLE OutboxEvent (
+	event_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	tx_id			BIGINT NOT NULL DEFAULT txid_current(),
+	aggregate_type		VARCHAR(50) NOT NULL,
+	aggregate_id		INT NOT NULL,
+	event_type		VARCHAR(100) NOT NULL,
+	payload			JSONB NOT NULL DEFAULT '{}',
+	created_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(event_id)
+);
+
+CREATE INDEX idx_outboxevent_tx_event ON OutboxEvent(tx_id, event_id);
+
+CREATE TABLE OutboxCheckpoint (
+	consumer_name		VARCHAR(100) NOT NULL,
+	last_tx_id		BIGINT NOT NULL DEFAULT 0,
+	last_event_id		BIGINT NOT NULL DEFAULT 0,
+	updated_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(consumer_name)
+);
+
+COMMIT;
@@ -0,0 +1,70 @@
+--Migration: NOTIFY schedule_changes when PT sessions or group classes change.
+--Run once against each location database after 034.
+
+BEGIN;
+
+--Live schedule push: booking changes NOTIFY the schedule_changes channel with
+--the trainer, room and day they touch. Notifications are sent on commit, and
+--identical payloads within one transaction are only delivered once.
+CREATE OR REPLACE FUNCTION notify_schedule_change(kind TEXT, t_id INT, r_id INT, start_at TIMESTAMP)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    PERFORM pg_notify('schedule_changes', json_build_object(
+        'kind', kind,
+        'trainer_id', t_id,
+        'room_id', r_id,
+        'day', start_at::date
+    )::text);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notify_pt_session_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM notify_schedule_change('pt_session', OLD.trainer_id, OLD.room_id, OLD.session_at);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM notify_schedule_change('pt_session', NEW.trainer_id, NEW.room_id, NEW.session_at);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notify_group_class_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM notify_schedule_change('group_class', OLD.trainer_id, OLD.room_id, OLD.scheduled_at);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM notify_schedule_change('group_class', NEW.trainer_id, NEW.room_id, NEW.scheduled_at);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_notify_pt_session_change
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_pt_session_change();
+
+CREATE TRIGGER trg_notify_group_class_change
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_group_class_change();
+
+COMMIT;
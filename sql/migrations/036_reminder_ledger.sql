@@ -0,0 +1,21 @@
+--Migration: reminder ledger and the PTSession start time index used by the
+--reminder worker. Run once against each location database after 035.
+
+BEGIN;
+
+CREATE INDEX idx_ptsession_session_at ON PTSession(session_at);
+
+--Reminders already sent, one row per booking, member and start time.
+CREATE TABLE ReminderLedger (
+	booking_kind		VARCHAR(10) NOT NULL,
+	booking_id		INT NOT NULL,
+	member_id		INT NOT NULL,
+	starts_at		TIMESTAMP NOT NULL,
+	sent_at			TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(booking_kind, booking_id, member_id, starts_at),
+	CHECK			(booking_kind IN ('PT', 'CLASS'))
+);
+
+CREATE INDEX idx_reminderledger_starts_at ON ReminderLedger(starts_at);
+
+COMMIT;
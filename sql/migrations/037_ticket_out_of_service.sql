@@ -0,0 +1,22 @@
+--Migration: maintenance tickets that take a room or piece of equipment out
+--of service for a time window. Run once against each location database
+--after 036. Existing tickets do not block bookings.
+
+BEGIN;
+
+ALTER TABLE MaintenanceTicket
+	ADD COLUMN blocks_booking BOOLEAN NOT NULL DEFAULT FALSE,
+	ADD COLUMN out_of_service_from TIMESTAMP,
+	ADD COLUMN out_of_service_until TIMESTAMP,
+	ADD CHECK (
+		NOT blocks_booking
+		OR (out_of_service_from IS NOT NULL
+			AND (out_of_service_until IS NULL OR out_of_service_until > out_of_service_from))
+	);
+
+--Open tickets that take a room or piece of equipment out of service.
+--Small (only blocking, unresolved tickets) and probed once per room by availability checks.
+CREATE INDEX idx_ticket_out_of_service ON MaintenanceTicket(room_id, equipment_no, out_of_service_from)
+	WHERE blocks_booking AND status <> 'CLOSED';
+
+COMMIT;
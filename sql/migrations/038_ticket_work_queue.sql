@@ -0,0 +1,91 @@
+--Migration: technician work queue columns, the priority rank trigger and
+--TicketStatusHistory. Run once against each location database after 037.
+--Existing tickets get created_at = now and a rank from their priority.
+
+BEGIN;
+
+ALTER TABLE MaintenanceTicket
+	ADD COLUMN priority_rank SMALLINT NOT NULL DEFAULT 2,
+	ADD COLUMN created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+	ADD COLUMN claimed_by INT,
+	ADD COLUMN claim_expires_at TIMESTAMP,
+	ADD FOREIGN KEY (claimed_by) REFERENCES UserAccount(user_id);
+
+--Technician work queue: unresolved tickets, most urgent (lowest rank) and oldest first.
+CREATE INDEX idx_ticket_queue ON MaintenanceTicket(priority_rank, created_at, ticket_id)
+	WHERE status <> 'CLOSED';
+
+--Ticket priority is free text ('High', 'medium', ...); keep a numeric rank next to it
+--so the work queue sorts by urgency instead of alphabetically.
+CREATE OR REPLACE FUNCTION set_ticket_priority_rank()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    NEW.priority_rank := CASE UPPER(TRIM(NEW.priority))
+        WHEN 'CRITICAL' THEN 0
+        WHEN 'HIGH' THEN 1
+        WHEN 'MEDIUM' THEN 2
+        WHEN 'LOW' THEN 3
+        ELSE 2
+    END;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_ticket_priority_rank
+BEFORE INSERT OR UPDATE OF priority
+ON MaintenanceTicket
+FOR EACH ROW
+EXECUTE PROCEDURE
+set_ticket_priority_rank();
+
+--Every ticket status change. changed_by comes from the app.actor setting,
+--which the application sets per transaction.
+CREATE TABLE TicketStatusHistory (
+	history_id		BIGINT GENERATED ALWAYS AS IDENTITY,
+	ticket_id		INT NOT NULL,
+	old_status		VARCHAR(50),
+	new_status		VARCHAR(50) NOT NULL,
+	changed_by		INT,
+	changed_at		TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY		(history_id),
+	FOREIGN KEY		(ticket_id) REFERENCES MaintenanceTicket(ticket_id) ON DELETE CASCADE,
+	FOREIGN KEY		(changed_by) REFERENCES UserAccount(user_id)
+);
+
+CREATE INDEX idx_ticketstatushistory_ticket ON TicketStatusHistory(ticket_id, changed_at);
+
+CREATE OR REPLACE FUNCTION log_ticket_status_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.status IS DISTINCT FROM OLD.status THEN
+        INSERT INTO TicketStatusHistory (ticket_id, old_status, new_status, changed_by)
+        VALUES (
+            NEW.ticket_id,
+            CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+            NEW.status,
+            NULLIF(current_setting('app.actor', true), '')::int
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_ticket_status_history
+AFTER INSERT OR UPDATE OF status
+ON MaintenanceTicket
+FOR EACH ROW
+EXECUTE PROCEDURE
+log_ticket_status_change();
+
+--Fires trg_ticket_priority_rank for the existing tickets
+UPDATE MaintenanceTicket SET priority = priority;
+
+COMMIT;
+
+ANALYZE MaintenanceTicket;
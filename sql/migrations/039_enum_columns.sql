@@ -0,0 +1,68 @@
+--Migration: store UserAccount.role_type and MaintenanceTicket.priority/status
+--(and TicketStatusHistory statuses) as enums instead of repeated strings.
+--Run once against each location database created from an older DDL.sql.
+--Unrecognised priorities become MEDIUM; unrecognised statuses fail the
+--migration so they can be fixed by hand first.
+
+BEGIN;
+
+CREATE TYPE user_role AS ENUM ('MEMBER', 'TRAINER', 'ADMIN');
+CREATE TYPE ticket_priority AS ENUM ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW');
+CREATE TYPE ticket_status AS ENUM ('OPEN', 'IN_PROGRESS', 'CLOSED');
+
+--UserAccount.role_type
+ALTER TABLE UserAccount DROP CONSTRAINT IF EXISTS useraccount_role_type_check;
+ALTER TABLE UserAccount
+	ALTER COLUMN role_type TYPE user_role USING UPPER(TRIM(role_type))::user_role;
+
+--MaintenanceTicket.priority/status. The numeric rank and its trigger are no
+--longer needed because ticket_priority already sorts most urgent first.
+DROP TRIGGER IF EXISTS trg_ticket_priority_rank ON MaintenanceTicket;
+DROP FUNCTION IF EXISTS set_ticket_priority_rank();
+--Columns used in a trigger definition cannot change type; the status
+--history trigger is created again below.
+DROP TRIGGER IF EXISTS trg_ticket_status_history ON MaintenanceTicket;
+DROP INDEX IF EXISTS idx_ticket_queue;
+DROP INDEX IF EXISTS idx_ticket_out_of_service;
+
+ALTER TABLE MaintenanceTicket ALTER COLUMN status DROP DEFAULT;
+ALTER TABLE MaintenanceTicket
+	ALTER COLUMN priority TYPE ticket_priority USING (
+		CASE UPPER(TRIM(priority))
+			WHEN 'CRITICAL' THEN 'CRITICAL'
+			WHEN 'HIGH' THEN 'HIGH'
+			WHEN 'LOW' THEN 'LOW'
+			ELSE 'MEDIUM'
+		END
+	)::ticket_priority,
+	ALTER COLUMN status TYPE ticket_status
+		USING REPLACE(UPPER(TRIM(status)), ' ', '_')::ticket_status;
+ALTER TABLE MaintenanceTicket
+	ALTER COLUMN priority SET DEFAULT 'MEDIUM',
+	ALTER COLUMN status SET DEFAULT 'OPEN',
+	DROP COLUMN IF EXISTS priority_rank;
+
+CREATE INDEX idx_ticket_out_of_service ON MaintenanceTicket(room_id, equipment_no, out_of_service_from)
+	WHERE blocks_booking AND status <> 'CLOSED';
+CREATE INDEX idx_ticket_queue ON MaintenanceTicket(priority, created_at, ticket_id)
+	WHERE status <> 'CLOSED';
+
+--TicketStatusHistory
+ALTER TABLE TicketStatusHistory
+	ALTER COLUMN old_status TYPE ticket_status
+		USING REPLACE(UPPER(TRIM(old_status)), ' ', '_')::ticket_status,
+	ALTER COLUMN new_status TYPE ticket_status
+		USING REPLACE(UPPER(TRIM(new_status)), ' ', '_')::ticket_status;
+
+CREATE TRIGGER trg_ticket_status_history
+AFTER INSERT OR UPDATE OF status
+ON MaintenanceTicket
+FOR EACH ROW
+EXECUTE PROCEDURE
+log_ticket_status_change();
+
+COMMIT;
+
+ANALYZE UserAccount;
+ANALYZE MaintenanceTicket;
+ANALYZE TicketStatusHistory;
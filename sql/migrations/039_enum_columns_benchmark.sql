@@ -0,0 +1,80 @@
+--Before/after measurement for 039_enum_columns.sql. Builds two scratch copies
+--of a 2 million row ticket table in a throwaway schema, one with the old
+--VARCHAR columns and one with the enum columns, then reports table and index
+--size and times the admin_view_tickets status filter and the work queue scan.
+--Run with: psql -d a1_database -f sql/migrations/039_enum_columns_benchmark.sql
+--(needs the enum types from 039_enum_columns.sql or DDL.sql).
+
+\timing on
+
+DROP SCHEMA IF EXISTS bench_039 CASCADE;
+CREATE SCHEMA bench_039;
+
+CREATE TABLE bench_039.ticket_text (
+	ticket_id	INT PRIMARY KEY,
+	room_id		INT NOT NULL,
+	priority	VARCHAR(50) NOT NULL,
+	status		VARCHAR(50) NOT NULL,
+	created_at	TIMESTAMP NOT NULL
+);
+
+CREATE TABLE bench_039.ticket_enum (
+	ticket_id	INT PRIMARY KEY,
+	room_id		INT NOT NULL,
+	priority	ticket_priority NOT NULL,
+	status		ticket_status NOT NULL,
+	created_at	TIMESTAMP NOT NULL
+);
+
+--Mostly closed history with a small open backlog, like a real ticket table.
+INSERT INTO bench_039.ticket_text
+SELECT g,
+       1 + g % 50,
+       (ARRAY['High', 'Medium', 'Low', 'Critical'])[1 + g % 4],
+       CASE WHEN g % 50 = 0 THEN 'OPEN' WHEN g % 50 = 1 THEN 'IN_PROGRESS' ELSE 'CLOSED' END,
+       TIMESTAMP '2020-01-01' + g * INTERVAL '1 minute'
+FROM generate_series(1, 2000000) g;
+
+INSERT INTO bench_039.ticket_enum
+SELECT ticket_id, room_id, UPPER(priority)::ticket_priority, status::ticket_status, created_at
+FROM bench_039.ticket_text;
+
+CREATE INDEX ticket_text_status ON bench_039.ticket_text(status);
+CREATE INDEX ticket_enum_status ON bench_039.ticket_enum(status);
+CREATE INDEX ticket_text_queue ON bench_039.ticket_text(priority, created_at, ticket_id);
+CREATE INDEX ticket_enum_queue ON bench_039.ticket_enum(priority, created_at, ticket_id);
+
+VACUUM ANALYZE bench_039.ticket_text;
+VACUUM ANALYZE bench_039.ticket_enum;
+
+--Size
+SELECT c.relname,
+       pg_size_pretty(pg_relation_size(c.oid)) AS size,
+       pg_relation_size(c.oid) AS bytes
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'bench_039'
+ORDER BY c.relname;
+
+--Filter speed: admin_view_tickets status filter (run each twice, use the second timing)
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_text WHERE status = 'OPEN';
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_text WHERE status = 'OPEN';
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_enum WHERE status = 'OPEN';
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_enum WHERE status = 'OPEN';
+
+--Full scan filter (no index): priority is not indexed on its own
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_text WHERE priority = 'High' AND status <> 'CLOSED';
+EXPLAIN (ANALYZE, BUFFERS) SELECT count(*) FROM bench_039.ticket_enum WHERE priority = 'HIGH' AND status <> 'CLOSED';
+
+--Work queue order: the text table needs a CASE to sort by urgency, the enum does not
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT ticket_id FROM bench_039.ticket_text WHERE status <> 'CLOSED'
+ORDER BY CASE UPPER(priority) WHEN 'CRITICAL' THEN 0 WHEN 'HIGH' THEN 1 WHEN 'MEDIUM' THEN 2 ELSE 3 END,
+         created_at, ticket_id
+LIMIT 1;
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT ticket_id FROM bench_039.ticket_enum WHERE status <> 'CLOSED'
+ORDER BY priority, created_at, ticket_id
+LIMIT 1;
+
+DROP SCHEMA bench_039 CASCADE;
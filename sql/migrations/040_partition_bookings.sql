@@ -0,0 +1,371 @@
+--Migration: range partition PTSession, GroupClass and ClassRegistration by
+--month and add the archive tables (see DDL.sql). Needs PostgreSQL 15+.
+--The old tables are renamed, copied into the new partitioned ones and
+--dropped, so run it in a maintenance window. Ids are kept and the new
+--sequences continue after the current maximum. Fails if an existing booking
+--is longer than 480 minutes; fix or split those rows first.
+
+BEGIN;
+
+DROP VIEW MemberFullScheduleView;
+
+ALTER TABLE ClassRegistration RENAME TO ClassRegistration_old;
+ALTER TABLE GroupClass RENAME TO GroupClass_old;
+ALTER TABLE PTSession RENAME TO PTSession_old;
+
+--Frees the identity sequence names for the new sequences; the ids themselves are kept
+ALTER TABLE ClassRegistration_old ALTER COLUMN registration_id DROP IDENTITY;
+ALTER TABLE GroupClass_old ALTER COLUMN class_id DROP IDENTITY;
+ALTER TABLE PTSession_old ALTER COLUMN session_id DROP IDENTITY;
+
+DROP INDEX IF EXISTS idx_groupclass_scheduled;
+DROP INDEX IF EXISTS idx_groupclass_trainer_scheduled;
+DROP INDEX IF EXISTS idx_groupclass_room_scheduled;
+DROP INDEX IF EXISTS idx_ptsession_session_at;
+
+CREATE SEQUENCE groupclass_class_id_seq AS INT;
+
+CREATE TABLE GroupClass (
+	class_id		INT NOT NULL DEFAULT nextval('groupclass_class_id_seq'),
+	class_name		VARCHAR(255) NOT NULL,
+	trainer_id		INT NOT NULL,
+	room_id			INT NOT NULL,
+	scheduled_at		TIMESTAMP NOT NULL,
+	capacity		INT NOT NULL,
+	duration_minutes	INT NOT NULL,
+	PRIMARY KEY		(class_id, scheduled_at),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id),
+	CHECK			(duration_minutes > 0 AND duration_minutes <= 480)
+) PARTITION BY RANGE (scheduled_at);
+
+ALTER SEQUENCE groupclass_class_id_seq OWNED BY GroupClass.class_id;
+
+--Keyset pagination indexes for class listings (scheduled_at, class_id)
+CREATE INDEX idx_groupclass_scheduled ON GroupClass(scheduled_at, class_id);
+CREATE INDEX idx_groupclass_trainer_scheduled ON GroupClass(trainer_id, scheduled_at, class_id);
+CREATE INDEX idx_groupclass_room_scheduled ON GroupClass(room_id, scheduled_at, class_id);
+
+--scheduled_at is a copy of the class's start time so registrations live in
+--the same month partition as their class; ON UPDATE CASCADE keeps it in step.
+CREATE SEQUENCE classregistration_registration_id_seq AS INT;
+
+CREATE TABLE ClassRegistration (
+	registration_id		INT NOT NULL DEFAULT nextval('classregistration_registration_id_seq'),
+	class_id		INT NOT NULL,
+	member_id		INT NOT NULL,
+	scheduled_at		TIMESTAMP NOT NULL,
+	PRIMARY KEY		(registration_id, scheduled_at),
+	CONSTRAINT fk_classregistration_class
+		FOREIGN KEY	(class_id, scheduled_at) REFERENCES GroupClass(class_id, scheduled_at)
+		ON UPDATE CASCADE,
+	FOREIGN KEY		(member_id) REFERENCES Member(member_id),
+	UNIQUE			(class_id, scheduled_at, member_id)
+) PARTITION BY RANGE (scheduled_at);
+
+ALTER SEQUENCE classregistration_registration_id_seq OWNED BY ClassRegistration.registration_id;
+
+CREATE INDEX idx_classregistration_member ON ClassRegistration(member_id, scheduled_at);
+
+CREATE SEQUENCE ptsession_session_id_seq AS INT;
+
+CREATE TABLE PTSession (
+	session_id		INT NOT NULL DEFAULT nextval('ptsession_session_id_seq'),
+	member_id		INT NOT NULL,
+	trainer_id		INT NOT NULL,
+	room_id			INT NOT NULL,
+	session_at		TIMESTAMP NOT NULL,
+	duration_minutes	INT NOT NULL,
+	PRIMARY KEY		(session_id, session_at),
+	FOREIGN KEY		(member_id) REFERENCES Member(member_id),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id),
+	CHECK			(duration_minutes > 0 AND duration_minutes <= 480)
+) PARTITION BY RANGE (session_at);
+
+ALTER SEQUENCE ptsession_session_id_seq OWNED BY PTSession.session_id;
+
+CREATE INDEX idx_ptsession_session_at ON PTSession(session_at);
+CREATE INDEX idx_ptsession_room_at ON PTSession(room_id, session_at);
+CREATE INDEX idx_ptsession_trainer_at ON PTSession(trainer_id, session_at);
+CREATE INDEX idx_ptsession_member_at ON PTSession(member_id, session_at);
+
+CREATE TABLE GroupClassArchive (LIKE GroupClass) PARTITION BY RANGE (scheduled_at);
+CREATE TABLE ClassRegistrationArchive (LIKE ClassRegistration) PARTITION BY RANGE (scheduled_at);
+CREATE TABLE PTSessionArchive (LIKE PTSession) PARTITION BY RANGE (session_at);
+
+CREATE OR REPLACE FUNCTION create_booking_partitions(from_month DATE, to_month DATE)
+RETURNS INT
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    m       DATE := date_trunc('month', from_month)::date;
+    t       TEXT;
+    part    TEXT;
+    created INT := 0;
+BEGIN
+    WHILE m <= to_month LOOP
+        FOREACH t IN ARRAY ARRAY['ptsession', 'groupclass', 'classregistration'] LOOP
+            part := t || '_p' || to_char(m, 'YYYY_MM');
+            IF to_regclass(part) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    part, t, m, (m + INTERVAL '1 month')::date
+                );
+                created := created + 1;
+            END IF;
+        END LOOP;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION archive_booking_month(month DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    lo     DATE := date_trunc('month', month)::date;
+    hi     DATE := (date_trunc('month', month) + INTERVAL '1 month')::date;
+    suffix TEXT := '_p' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass('groupclass' || suffix)
+          AND inhparent = 'groupclass'::regclass
+    ) THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('ALTER TABLE ClassRegistration DETACH PARTITION %I', 'classregistration' || suffix);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT IF EXISTS fk_classregistration_class',
+                   'classregistration' || suffix);
+    EXECUTE format('ALTER TABLE GroupClass DETACH PARTITION %I', 'groupclass' || suffix);
+    EXECUTE format('ALTER TABLE PTSession DETACH PARTITION %I', 'ptsession' || suffix);
+
+    EXECUTE format('ALTER TABLE ClassRegistrationArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'classregistration' || suffix, lo, hi);
+    EXECUTE format('ALTER TABLE GroupClassArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'groupclass' || suffix, lo, hi);
+    EXECUTE format('ALTER TABLE PTSessionArchive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'ptsession' || suffix, lo, hi);
+    RETURN TRUE;
+END;
+$$;
+
+--Partitions covering every existing booking plus two years ahead
+SELECT create_booking_partitions(
+	LEAST(
+		(SELECT MIN(session_at) FROM PTSession_old),
+		(SELECT MIN(scheduled_at) FROM GroupClass_old),
+		date_trunc('month', NOW())
+	)::date,
+	(date_trunc('month', NOW()) + INTERVAL '24 months')::date
+);
+SELECT create_booking_partitions(
+	date_trunc('month', NOW())::date,
+	GREATEST(
+		(SELECT MAX(session_at) FROM PTSession_old),
+		(SELECT MAX(scheduled_at) FROM GroupClass_old),
+		date_trunc('month', NOW())
+	)::date
+);
+
+INSERT INTO GroupClass (class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes)
+SELECT class_id, class_name, trainer_id, room_id, scheduled_at, capacity, duration_minutes
+FROM GroupClass_old;
+
+INSERT INTO ClassRegistration (registration_id, class_id, member_id, scheduled_at)
+SELECT cr.registration_id, cr.class_id, cr.member_id, g.scheduled_at
+FROM ClassRegistration_old cr
+JOIN GroupClass_old g ON g.class_id = cr.class_id;
+
+INSERT INTO PTSession (session_id, member_id, trainer_id, room_id, session_at, duration_minutes)
+SELECT session_id, member_id, trainer_id, room_id, session_at, duration_minutes
+FROM PTSession_old;
+
+SELECT setval('groupclass_class_id_seq', COALESCE((SELECT MAX(class_id) FROM GroupClass), 0) + 1, false);
+SELECT setval('classregistration_registration_id_seq',
+              COALESCE((SELECT MAX(registration_id) FROM ClassRegistration), 0) + 1, false);
+SELECT setval('ptsession_session_id_seq', COALESCE((SELECT MAX(session_id) FROM PTSession), 0) + 1, false);
+
+DROP TABLE ClassRegistration_old;
+DROP TABLE GroupClass_old;
+DROP TABLE PTSession_old;
+
+CREATE OR REPLACE FUNCTION check_class_capacity()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_capacity   INT;
+    v_count      INT;
+BEGIN
+    SELECT capacity
+    INTO v_capacity
+    FROM GroupClass
+    WHERE class_id = NEW.class_id
+      AND scheduled_at = NEW.scheduled_at
+    FOR UPDATE;
+
+    IF v_capacity IS NULL THEN
+        RAISE EXCEPTION 'Class % not found or has NULL capacity', NEW.class_id;
+    END IF;
+    SELECT COUNT(*)
+    INTO v_count
+    FROM ClassRegistration
+    WHERE class_id = NEW.class_id
+      AND scheduled_at = NEW.scheduled_at;
+    v_count := v_count + 1;
+
+    IF v_count > v_capacity THEN
+        RAISE EXCEPTION
+            'Class % is full. Capacity=%, registrations_with_new=%',
+            NEW.class_id, v_capacity, v_count;
+    END IF;
+
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION room_usage_dirty_registration()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_class_id      INT;
+    v_scheduled_at  TIMESTAMP;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_class_id := OLD.class_id;
+        v_scheduled_at := OLD.scheduled_at;
+    ELSE
+        v_class_id := NEW.class_id;
+        v_scheduled_at := NEW.scheduled_at;
+    END IF;
+
+    PERFORM mark_room_usage_dirty(g.room_id, g.scheduled_at, 0)
+    FROM GroupClass g
+    WHERE g.class_id = v_class_id
+      AND g.scheduled_at = v_scheduled_at;
+    RETURN NULL;
+END;
+$$;
+
+--Triggers are created after the copy so it does not queue rollup work or notifications
+CREATE TRIGGER trg_check_class_capacity
+BEFORE INSERT
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+check_class_capacity();
+
+CREATE TRIGGER trg_room_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_pt();
+
+CREATE TRIGGER trg_room_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_class();
+
+CREATE TRIGGER trg_room_usage_dirty_registration
+AFTER INSERT OR DELETE
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+room_usage_dirty_registration();
+
+CREATE TRIGGER trg_trainer_usage_dirty_pt
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_pt();
+
+CREATE TRIGGER trg_trainer_usage_dirty_class
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+trainer_usage_dirty_class();
+
+CREATE TRIGGER trg_notify_pt_session_change
+AFTER INSERT OR UPDATE OR DELETE
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_pt_session_change();
+
+CREATE TRIGGER trg_notify_group_class_change
+AFTER INSERT OR UPDATE OR DELETE
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+notify_group_class_change();
+
+CREATE VIEW MemberFullScheduleView AS
+SELECT
+    'PT'::text AS schedule_type,
+    p.member_id,
+    p.session_at AS start_time,
+    p.session_at
+        + (p.duration_minutes * INTERVAL '1 minute') AS end_time,
+    p.trainer_id,
+    t.name AS trainer_name,
+    p.room_id,
+    r.name AS room_name,
+    NULL::int  AS class_id,
+    NULL::text AS class_name,
+    p.session_id
+FROM (
+    SELECT session_id, member_id, trainer_id, room_id, session_at, duration_minutes FROM PTSession
+    UNION ALL
+    SELECT session_id, member_id, trainer_id, room_id, session_at, duration_minutes FROM PTSessionArchive
+) p
+JOIN Trainer t ON t.trainer_id = p.trainer_id
+JOIN Room    r ON r.room_id = p.room_id
+
+UNION ALL
+
+SELECT
+    'CLASS'::text AS schedule_type,
+    cr.member_id,
+    g.scheduled_at AS start_time,
+    g.scheduled_at
+        + (g.duration_minutes * INTERVAL '1 minute') AS end_time,
+    g.trainer_id,
+    t.name AS trainer_name,
+    g.room_id,
+    r.name AS room_name,
+    g.class_id,
+    g.class_name,
+    NULL::int AS session_id
+FROM (
+    SELECT class_id, member_id, scheduled_at FROM ClassRegistration
+    UNION ALL
+    SELECT class_id, member_id, scheduled_at FROM ClassRegistrationArchive
+) cr
+JOIN (
+    SELECT class_id, class_name, trainer_id, room_id, scheduled_at, duration_minutes FROM GroupClass
+    UNION ALL
+    SELECT class_id, class_name, trainer_id, room_id, scheduled_at, duration_minutes FROM GroupClassArchive
+) g ON g.class_id = cr.class_id AND g.scheduled_at = cr.scheduled_at
+JOIN Trainer   t ON t.trainer_id = g.trainer_id
+JOIN Room      r ON r.room_id   = g.room_id;
+
+COMMIT;
+
+ANALYZE GroupClass;
+ANALYZE ClassRegistration;
+ANALYZE PTSession;
@@ -0,0 +1,16 @@
+--Migration: trigram indexes for the front desk search (search_by_name() and
+--resolve_id(), which lets the ID prompts accept a name).
+--Run once against each location database created from an older DDL.sql.
+--Needs the pg_trgm extension (part of the standard contrib package).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_useraccount_email_trgm ON UserAccount USING GIN (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_member_name_trgm ON Member USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_member_phone_trgm ON Member USING GIN (phone gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_trainer_name_trgm ON Trainer USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_groupclass_name_trgm ON GroupClass USING GIN (class_name gin_trgm_ops);
+
+ANALYZE UserAccount;
+ANALYZE Member;
+ANALYZE Trainer;
@@ -0,0 +1,82 @@
+--Migration: cached seat counts for the class catalog.
+--Adds GroupClass.registered_count (kept up to date by a trigger on
+--ClassRegistration) and makes idx_groupclass_scheduled a covering index.
+--Run once against each location database created from an older DDL.sql.
+
+BEGIN;
+
+ALTER TABLE GroupClass ADD COLUMN registered_count INT NOT NULL DEFAULT 0;
+--Archive partitions are attached to these, so they need the same columns
+ALTER TABLE GroupClassArchive ADD COLUMN registered_count INT NOT NULL DEFAULT 0;
+
+UPDATE GroupClass g
+SET registered_count = c.registrations
+FROM (
+	SELECT class_id, scheduled_at, COUNT(*) AS registrations
+	FROM ClassRegistration
+	GROUP BY class_id, scheduled_at
+) c
+WHERE g.class_id = c.class_id AND g.scheduled_at = c.scheduled_at;
+
+UPDATE GroupClassArchive g
+SET registered_count = c.registrations
+FROM (
+	SELECT class_id, scheduled_at, COUNT(*) AS registrations
+	FROM ClassRegistrationArchive
+	GROUP BY class_id, scheduled_at
+) c
+WHERE g.class_id = c.class_id AND g.scheduled_at = c.scheduled_at;
+
+DROP INDEX IF EXISTS idx_groupclass_scheduled;
+CREATE INDEX idx_groupclass_scheduled ON GroupClass(scheduled_at, class_id)
+	INCLUDE (class_name, trainer_id, room_id, capacity, duration_minutes, registered_count);
+
+CREATE OR REPLACE FUNCTION refresh_class_registered_count()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_class_id      INT;
+    v_scheduled_at  TIMESTAMP;
+    v_count         INT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_class_id := OLD.class_id;
+        v_scheduled_at := OLD.scheduled_at;
+    ELSE
+        v_class_id := NEW.class_id;
+        v_scheduled_at := NEW.scheduled_at;
+    END IF;
+
+    PERFORM 1
+    FROM GroupClass
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at
+    FOR UPDATE;
+
+    SELECT COUNT(*)
+    INTO v_count
+    FROM ClassRegistration
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at;
+
+    UPDATE GroupClass
+    SET registered_count = v_count
+    WHERE class_id = v_class_id
+      AND scheduled_at = v_scheduled_at
+      AND registered_count <> v_count;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_class_registered_count
+AFTER INSERT OR DELETE
+ON ClassRegistration
+FOR EACH ROW
+EXECUTE PROCEDURE
+refresh_class_registered_count();
+
+COMMIT;
+
+ANALYZE GroupClass;
@@ -0,0 +1,137 @@
+--Migration: per-day 5-minute occupancy counters for rooms and trainers
+--(RoomDayOccupancy, TrainerDayOccupancy), maintained by triggers and used
+--by the availability lookups. Builds the counters from the live bookings.
+--Run once against each location database created from an older DDL.sql.
+
+BEGIN;
+
+--Occupancy index: per room and per trainer, per day, how many bookings
+--cover each 5-minute slot (288 slots, slot 1 = 00:00-00:05). Bookings are
+--rounded out to whole slots, so a slot counts a booking that covers any
+--part of it. Kept up to date by triggers on PTSession and GroupClass;
+--availability lookups read a slice of these arrays instead of bookings.
+CREATE TABLE RoomDayOccupancy (
+	room_id			INT NOT NULL,
+	day			DATE NOT NULL,
+	pt_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	class_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	PRIMARY KEY		(day, room_id),
+	FOREIGN KEY		(room_id) REFERENCES Room(room_id)
+);
+
+CREATE TABLE TrainerDayOccupancy (
+	trainer_id		INT NOT NULL,
+	day			DATE NOT NULL,
+	busy_slots		SMALLINT[] NOT NULL DEFAULT array_fill(0::smallint, ARRAY[288]),
+	PRIMARY KEY		(day, trainer_id),
+	FOREIGN KEY		(trainer_id) REFERENCES Trainer(trainer_id)
+);
+
+--Adds p_delta to the slots covered by one booking, day by day
+CREATE OR REPLACE FUNCTION add_occupancy(p_table TEXT, p_key TEXT, p_column TEXT, p_id INT,
+                                         p_start TIMESTAMP, p_minutes INT, p_delta INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    v_end    TIMESTAMP := p_start + make_interval(mins => p_minutes);
+    v_day    DATE := p_start::date;
+    v_first  INT;
+    v_last   INT;
+BEGIN
+    WHILE v_day < v_end LOOP
+        v_first := FLOOR(EXTRACT(EPOCH FROM GREATEST(p_start, v_day) - v_day) / 300)::int + 1;
+        v_last := CEIL(EXTRACT(EPOCH FROM LEAST(v_end, v_day + 1) - v_day) / 300)::int;
+
+        EXECUTE format('INSERT INTO %I (%I, day) VALUES ($1, $2) ON CONFLICT DO NOTHING',
+                       p_table, p_key)
+        USING p_id, v_day;
+        EXECUTE format(
+            'UPDATE %1$I SET %3$I = ('
+            '    SELECT array_agg(CASE WHEN i BETWEEN $3 AND $4 THEN (c + $5)::smallint ELSE c END'
+            '                     ORDER BY i)'
+            '    FROM unnest(%3$I) WITH ORDINALITY AS u(c, i))'
+            ' WHERE %2$I = $1 AND day = $2',
+            p_table, p_key, p_column)
+        USING p_id, v_day, v_first, v_last, p_delta;
+
+        v_day := v_day + 1;
+    END LOOP;
+END;
+$$;
+
+--A booking moved to another month is deleted and re-inserted (partition
+--row movement), which fires the DELETE and INSERT branches; that is fine
+--because they undo and redo its slots.
+CREATE OR REPLACE FUNCTION occupancy_pt_session()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'pt_slots',
+                              OLD.room_id, OLD.session_at, OLD.duration_minutes, -1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              OLD.trainer_id, OLD.session_at, OLD.duration_minutes, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'pt_slots',
+                              NEW.room_id, NEW.session_at, NEW.duration_minutes, 1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              NEW.trainer_id, NEW.session_at, NEW.duration_minutes, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION occupancy_group_class()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'class_slots',
+                              OLD.room_id, OLD.scheduled_at, OLD.duration_minutes, -1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              OLD.trainer_id, OLD.scheduled_at, OLD.duration_minutes, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM add_occupancy('roomdayoccupancy', 'room_id', 'class_slots',
+                              NEW.room_id, NEW.scheduled_at, NEW.duration_minutes, 1);
+        PERFORM add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots',
+                              NEW.trainer_id, NEW.scheduled_at, NEW.duration_minutes, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_occupancy_pt_session
+AFTER INSERT OR DELETE OR UPDATE OF room_id, trainer_id, session_at, duration_minutes
+ON PTSession
+FOR EACH ROW
+EXECUTE PROCEDURE
+occupancy_pt_session();
+
+CREATE TRIGGER trg_occupancy_group_class
+AFTER INSERT OR DELETE OR UPDATE OF room_id, trainer_id, scheduled_at, duration_minutes
+ON GroupClass
+FOR EACH ROW
+EXECUTE PROCEDURE
+occupancy_group_class();
+
+--Backfill from the live (not archived) bookings
+SELECT add_occupancy('roomdayoccupancy', 'room_id', 'pt_slots', room_id, session_at, duration_minutes, 1),
+       add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots', trainer_id, session_at, duration_minutes, 1)
+FROM PTSession;
+
+SELECT add_occupancy('roomdayoccupancy', 'room_id', 'class_slots', room_id, scheduled_at, duration_minutes, 1),
+       add_occupancy('trainerdayoccupancy', 'trainer_id', 'busy_slots', trainer_id, scheduled_at, duration_minutes, 1)
+FROM GroupClass;
+
+COMMIT;
+
+ANALYZE RoomDayOccupancy;
+ANALYZE TrainerDayOccupancy;
@@ -0,0 +1,41 @@
+--Migration: let the booking paths create their month's partitions on demand.
+--Run once against each location database after 050. Replaces
+--create_booking_partitions() with a version that tolerates two sessions
+--creating the same partition at once.
+
+--Creates the missing monthly partitions of PTSession, GroupClass and
+--ClassRegistration for from_month through to_month. Months that were already
+--archived keep their partition name, so they are not created again. The
+--booking paths call it for their own month, so two sessions may race to
+--create the same partition; the loser just skips it.
+CREATE OR REPLACE FUNCTION create_booking_partitions(from_month DATE, to_month DATE)
+RETURNS INT
+LANGUAGE plpgsql
+AS
+$$
+DECLARE
+    m       DATE := date_trunc('month', from_month)::date;
+    t       TEXT;
+    part    TEXT;
+    created INT := 0;
+BEGIN
+    WHILE m <= to_month LOOP
+        FOREACH t IN ARRAY ARRAY['ptsession', 'groupclass', 'classregistration'] LOOP
+            part := t || '_p' || to_char(m, 'YYYY_MM');
+            IF to_regclass(part) IS NULL THEN
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        part, t, m, (m + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                EXCEPTION WHEN duplicate_table OR unique_violation THEN
+                    NULL;
+                END;
+            END IF;
+        END LOOP;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;